@@ -1,6 +1,12 @@
+import os
+import sys
 import plotly.express as px
 import pandas as pd
 
+# Shared chart writer from the scripts folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from figure_renderer import write_figures
+
 # Firstly, we have to Load data
 df = pd.read_csv('../data/dataframes/topic-model/topic-model.csv')
 
@@ -54,4 +60,4 @@ fig.update_layout(
 fig.update_xaxes(tickangle=45)
 
 # save the figure in repository
-fig.write_html("Topic_modeling.html")
+write_figures({"Topic_modeling.html": fig})
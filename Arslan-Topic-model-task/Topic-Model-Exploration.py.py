@@ -1,51 +1,22 @@
+import os
+import sys
 import plotly.express as px
-import pandas as pd
 
-# Firstly we will Load the data
-df = pd.read_csv('../data/dataframes/topic-model/topic-model.csv')
+# Precomputed topic x month cube from the scripts folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from figure_renderer import write_figures
+from topic_cube import load_topic_cube
 
-# then let's see what columns we have
-print("Available columns in the DataFrame:")
-print(df.columns.tolist())
+# Firstly we will open the topic cube (article counts per topic and month, built from topic-model.csv)
+cube = load_topic_cube()
 
-# now we will Filter data and remove unclassified articles if Topic = -1 exists
-if 'Topic' in df.columns:
-    df = df[df["Topic"] != -1].copy()  # Add .copy() to avoid chained assignment
-else:
-    print("'Topic' column not found - skipping filtering")
+# Get the top 5 most frequent topics, leaving out unclassified articles (Topic = -1)
+top_5_topics = cube.top(5)
 
-# Get the top 5 most frequent topics
-top_5_topics = df['Topic'].value_counts().head(5).index.tolist()
-
-# we have to filter dataframe for only these top 5 topics and create a copy
-df_top5 = df[df['Topic'].isin(top_5_topics)].copy()  # Add .copy() here
-
-# Now Prepare keyword data - melt the topic keyword columns
-keyword_cols = ['topic_1', 'topic_2', 'topic_3', 'topic_4']
-melted_keywords = df_top5.melt(id_vars=['Topic'], 
-                              value_vars=keyword_cols, 
-                              var_name='keyword_rank', 
-                              value_name='keyword')
-
-# Count keyword frequencies per topic
-keyword_counts = melted_keywords.groupby(['Topic', 'keyword']).size().reset_index(name='count')
-
-# Get top 3 keywords for each topic
-top_keywords = keyword_counts.sort_values(['Topic', 'count'], ascending=[True, False]) \
-                            .groupby('Topic').head(3)
-
-# Now, we have to Create labels combining topic number with top keywords
-topic_labels = {}
-for topic in top_5_topics:
-    keywords = top_keywords[top_keywords['Topic'] == topic]['keyword'].tolist()[:3]
-    topic_labels[topic] = f"Topic {topic}: " + ", ".join(keywords)
-
-# Apply these labels to our dataframe using .loc
-df_top5.loc[:, 'Topic_Label'] = df_top5['Topic'].map(topic_labels)  # Modified this line
-
-# Count articles per labeled topic
-topic_counts = df_top5['Topic_Label'].value_counts().reset_index()
-topic_counts.columns = ["Topic_Label", "Count"]
+# Now, we have to Create labels combining topic number with its top 3 keywords
+topic_counts = top_5_topics.reset_index()
+topic_counts["Topic_Label"] = [cube.label(topic) for topic in topic_counts["Topic"]]
+topic_counts = topic_counts[["Topic_Label", "Count"]]
 
 # then Create interactive bar chart
 fig = px.bar(topic_counts,
@@ -68,6 +39,6 @@ fig.update_layout(
 )
 
 # Save the figure
-fig.write_html("topic_modeling_with_keywords.html")
+write_figures({"topic_modeling_with_keywords.html": fig})
 
 print("Visualization saved as 'topic_modeling_with_keywords.html'")
@@ -1,41 +1,39 @@
 import os
+import sys
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Step 1: Path to the folder with all article text files
-text_dir = 'C:/Users/DELL/Downloads/FASDH25-portfolio3/data/articles/'
+# Step 1: Use the shared corpus reader from the scripts folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts'))
+from corpus_reader import CorpusScanner, TextCollector
+from similarity import grouped_mean_similarity, top_pairs
 
-# Step 2: Get all .txt filenames from the folder
-all_files = [f for f in os.listdir(text_dir) if f.endswith('.txt')]
-print(f"✅ Found {len(all_files)} article files.")
-
-# Step 3: Read content of each file
-texts = {}
-for fname in all_files:
-    full_path = os.path.join(text_dir, fname)
-    try:
-        with open(full_path, 'r', encoding='utf-8') as file:
-            texts[fname] = file.read()
-    except Exception as e:
-        print(f"❌ Could not read {fname}: {e}")
-        texts[fname] = ""
+# Step 2-3: Read every article file once and keep its text
+scanner = CorpusScanner()
+texts = scanner.add_consumer(TextCollector())
+scanner.run()
+print(f"✅ Found {len(texts.filenames)} article files.")
 
 # Step 4: Prepare the list of filenames and their texts
-filenames = list(texts.keys())
-documents = [texts[f] for f in filenames]
+filenames = texts.filenames
+documents = texts.documents
 
 # Step 5: Apply TF-IDF vectorization
 vectorizer = TfidfVectorizer(stop_words='english')
 tfidf_matrix = vectorizer.fit_transform(documents)
 
-# Step 6: Compute cosine similarity
-cos_sim = cosine_similarity(tfidf_matrix)
+# Step 6: Compute cosine similarity between groups of articles
+# The articles are in date order and cut into 200 runs; each cell is the mean
+# similarity of the article pairs between two runs. This is computed from the
+# sparse matrix, so the dense articles x articles matrix is never built.
+group_sim, groups = grouped_mean_similarity(tfidf_matrix, n_groups=200)
 
-# Step 7: Create similarity DataFrame
-cos_sim_df = pd.DataFrame(cos_sim, index=filenames, columns=filenames)
+# Step 7: Create similarity DataFrame, each run labelled with its first article
+group_labels = [filenames[start] for start in np.searchsorted(groups, np.arange(len(group_sim)))]
+cos_sim_df = pd.DataFrame(group_sim, index=group_labels, columns=group_labels)
 
 # Step 8: Plot heatmap
 plt.figure(figsize=(12, 10))
@@ -47,14 +45,8 @@ plt.tight_layout()
 plt.show()
 
 # Optional: Show top similarity scores (excluding self-similarity = 1.0)
+# The sparse engine only keeps each article's best neighbours instead of listing every pair
 print("\n🔍 Top Similarities Between Different Articles:")
-similarities = []
-for i in range(len(filenames)):
-    for j in range(i+1, len(filenames)):
-        score = cos_sim[i][j]
-        similarities.append((filenames[i], filenames[j], round(score, 3)))
-
-# Sort and print top 5 most similar article pairs
-top_similar = sorted(similarities, key=lambda x: x[2], reverse=True)[:5]
-for a, b, score in top_similar:
-    print(f"{a} <--> {b} → similarity: {score}")
+top_similar = top_pairs(tfidf_matrix, k=5)
+for i, j, score in top_similar:
+    print(f"{filenames[i]} <--> {filenames[j]} → similarity: {round(score, 3)}")
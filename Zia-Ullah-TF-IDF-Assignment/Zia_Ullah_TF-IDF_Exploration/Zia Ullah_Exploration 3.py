@@ -1,12 +1,20 @@
 #import libraries
 #https://chat.deepseek.com/a/chat/s/42f7726a-3b0e-4774-b391-9a39c05e1a90
 #https://www.geeksforgeeks.org/visualizing-tf-idf-scores-a-comprehensive-guide-to-plotting-a-document-tf-idf-2d-graph/
+import os
+import sys
 import pandas as pd
 import plotly.express as px
 import plotly.io as pio
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.decomposition import LatentDirichletAllocation
 
+# Shared heatmap, histogram and chart writer helpers from the scripts folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts'))
+from figure_renderer import write_figures
+from pair_aggregation import month_labels, monthly_pair_matrix
+from plot_helpers import histogram
+
 # Set Plotly to display graphs in the default web browser
 pio.renderers.default = 'browser'
 
@@ -31,14 +39,15 @@ if 'df' in locals(): # Only proceed if the DataFrame 'df' exists
    # Filter out similarity scores below 0.2 (assumed to be noise/irrelevant)
     hist_df = df[df['similarity'] >= 0.2].copy()
 
-    # Create interactive histogram using Plotly Express
-    fig_hist = px.histogram(
-        hist_df,
-        x='similarity', # Column containing similarity scores (TF-IDF-based)
-        title='Article Pair Similarity Distribution (0.2-1.0 Range)',
-        labels={'similarity': 'TF-IDF Similarity Score', 'count': 'Number of Pairs'},
+    # Create interactive histogram from counts binned with NumPy, so the chart
+    # holds 40 bars instead of every similarity score however large the table gets
+    fig_hist = histogram(
+        hist_df['similarity'], # Column containing similarity scores (TF-IDF-based)
         nbins=40,  # More bins for finer granularity
-        color_discrete_sequence=['#3366CC'],
+        range=(0.2, 1.0),  # Bins of 0.02 that line up with the focus range
+        title='Article Pair Similarity Distribution (0.2-1.0 Range)',
+        labels={'x': 'TF-IDF Similarity Score', 'y': 'Number of Pairs'},
+        color='#3366CC',
         opacity=0.8
     )
 
@@ -62,7 +71,7 @@ if 'df' in locals(): # Only proceed if the DataFrame 'df' exists
         annotation_position="top left"               # Position of the label
     )
     
-    fig_hist.write_html("similarity_histogram.html")
+    write_figures({"similarity_histogram.html": fig_hist})
     fig_hist.show()
 
 # heatmap to show the trends according to the similarity score (Monthly view with better labels)
@@ -75,26 +84,9 @@ if 'df' in locals():
         (df['year-2'].between(2021, 2024))
     ].copy()
     
-    # Create month-year labels with actual month names
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-              'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    
-    heatmap_df['period1'] = heatmap_df.apply(
-        lambda x: f"{months[x['month-1']-1]} {x['year-1']}", axis=1)
-    heatmap_df['period2'] = heatmap_df.apply(
-        lambda x: f"{months[x['month-2']-1]} {x['year-2']}", axis=1)
-    
-    # Aggregate and sort chronologically
-    heatmap_data = heatmap_df.groupby(['period1', 'period2'])['similarity'].mean().unstack()
-    
-    # Sort columns and index chronologically
-    month_order = [f"{month} {year}" 
-                  for year in range(2021, 2025) 
-                  for month in months]
-    heatmap_data = heatmap_data.reindex(
-        index=[x for x in month_order if x in heatmap_data.index],
-        columns=[x for x in month_order if x in heatmap_data.columns]
-    )
+    # Mean similarity per (month of article 1, month of article 2), chronologically ordered
+    heatmap_data = monthly_pair_matrix(heatmap_df, 2021, 2024)
+    month_order = month_labels(2021, 2024)
     
     # Create heatmap with improved settings
     fig_heat = px.imshow(
@@ -137,7 +129,7 @@ if 'df' in locals():
         fig_heat.add_shape(type="line", x0=-0.5, y0=pos, x1=len(heatmap_data.columns)-0.5, y1=pos,
                          line=dict(color="white", width=2, dash="dash"))
     
-    fig_heat.write_html("monthly_similarity_heatmap.html")
+    write_figures({"monthly_similarity_heatmap.html": fig_heat})
     fig_heat.show()
 fig.show()
 
@@ -151,24 +143,9 @@ low_sim_df = df[
 ].copy()
 
 # 1. Temporal Heatmap Analysis
-months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-
-# Create period labels
-low_sim_df['period1'] = low_sim_df.apply(
-    lambda x: f"{months[x['month-1']-1]} {x['year-1']}", axis=1)
-low_sim_df['period2'] = low_sim_df.apply(
-    lambda x: f"{months[x['month-2']-1]} {x['year-2']}", axis=1)
-
-# Aggregate data
-heatmap_data = low_sim_df.groupby(['period1', 'period2'])['similarity'].mean().unstack()
-
-# Sort chronologically
-month_order = [f"{month} {year}" for year in range(2021, 2025) for month in months]
-heatmap_data = heatmap_data.reindex(
-    index=[x for x in month_order if x in heatmap_data.index],
-    columns=[x for x in month_order if x in heatmap_data.columns]
-)
+# Mean similarity per (month of article 1, month of article 2), chronologically ordered
+heatmap_data = monthly_pair_matrix(low_sim_df, 2021, 2024)
+month_order = month_labels(2021, 2024)
 
 # Create heatmap
 fig_heat = px.imshow(
@@ -231,8 +208,10 @@ fig_dist = px.imshow(
 )
 
 # Save and show
-fig_heat.write_html("low_similarity_heatmap.html")
-fig_dist.write_html("yearly_distribution.html")
+write_figures({
+    "low_similarity_heatmap.html": fig_heat,
+    "yearly_distribution.html": fig_dist,
+})
 
 fig_heat.show()
 fig_dist.show()
@@ -1,6 +1,8 @@
 #import libraries
 #https://chat.deepseek.com/a/chat/s/42f7726a-3b0e-4774-b391-9a39c05e1a90
 #https://www.geeksforgeeks.org/visualizing-tf-idf-scores-a-comprehensive-guide-to-plotting-a-document-tf-idf-2d-graph/
+import os
+import sys
 import pandas as pd
 import plotly.express as px
 import plotly.io as pio
@@ -10,35 +12,44 @@ from sklearn.decomposition import LatentDirichletAllocation
 # Set Plotly to display graphs in the default web browser
 pio.renderers.default = 'browser'
 
-# # Load a CSV file containing TF-IDF (Term Frequency-Inverse Document Frequency) data
-# File contains words/terms with TF-IDF scores above 0.3 and document length of 200
-file_path = r'C:\Users\DELL\Downloads\FASDH25-portfolio3\data\dataframes\tfidf\tfidf-over-0.3-len200.csv'
+# Shared table loader from the scripts folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts'))
+from corpus_query import c, table
+from figure_renderer import write_figures
+from pair_aggregation import month_labels
+from plot_helpers import histogram
+
+# # Query the TF-IDF (Term Frequency-Inverse Document Frequency) pair table
+# File contains article pairs with similarity scores above 0.3 and document length of 200
+# Nothing is read yet: each chart below adds its own filters and columns to this
+# query and the table is only read (already filtered) when the chart collects it
 try:
     
-    # Attempt to read the CSV file into a pandas DataFrame
-    df = pd.read_csv(file_path)
+    # Attempt to find the table
+    pairs = table('tfidf_len200')
     
      # If successful, print confirmation and show available columns
-    print("Data loaded successfully. Columns:", df.columns.tolist())
+    print("Data loaded successfully. Columns:", pairs.column_names())
 except Exception as e:
     
     # If loading fails, print the error message for debugging
     print("Error loading file:", e)
 
 # Histogram showing counts of articles and similarity score (Exclude 0.1-0.2 range)
-if 'df' in locals(): # Only proceed if the DataFrame 'df' exists
+if 'pairs' in locals(): # Only proceed if the query 'pairs' exists
     
    # Filter out similarity scores below 0.2 (assumed to be noise/irrelevant)
-    hist_df = df[df['similarity'] >= 0.2].copy()
+    hist_df = pairs.where(c.similarity >= 0.2).select('similarity').collect()
 
-    # Create interactive histogram using Plotly Express
-    fig_hist = px.histogram(
-        hist_df,
-        x='similarity', # Column containing similarity scores (TF-IDF-based)
-        title='Article Pair Similarity Distribution (0.2-1.0 Range)',
-        labels={'similarity': 'TF-IDF Similarity Score', 'count': 'Number of Pairs'},
+    # Create interactive histogram from counts binned with NumPy, so the chart
+    # holds 40 bars instead of every similarity score however large the table gets
+    fig_hist = histogram(
+        hist_df['similarity'], # Column containing similarity scores (TF-IDF-based)
         nbins=40,  # More bins for finer granularity
-        color_discrete_sequence=['#3366CC'],
+        range=(0.2, 1.0),  # Bins of 0.02 that line up with the focus range
+        title='Article Pair Similarity Distribution (0.2-1.0 Range)',
+        labels={'x': 'TF-IDF Similarity Score', 'y': 'Number of Pairs'},
+        color='#3366CC',
         opacity=0.8
     )
 
@@ -62,41 +73,23 @@ if 'df' in locals(): # Only proceed if the DataFrame 'df' exists
         annotation_position="top left"               # Position of the label
     )
     
-    fig_hist.write_html("similarity_histogram.html")
+    write_figures({"similarity_histogram.html": fig_hist})
     fig_hist.show()
 
-# First, ensure your dataframe 'df' exists and has the required columns
-if 'df' in locals() or 'df' in globals():
-    # Filter for high-similarity articles (0.4-0.9 range) and recent years
-    high_sim_df = df[
-        (df['similarity'] >= 0.4) & 
-        (df['similarity'] <= 0.9) &
-        (df['year-1'].between(2021, 2024)) & 
-        (df['year-2'].between(2021, 2024))
-    ].copy()
-
-    # Create month-year labels
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-              'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-
-    # Create period columns
-    high_sim_df['period1'] = high_sim_df.apply(
-        lambda x: f"{months[x['month-1']-1]} {x['year-1']}", axis=1)
-    high_sim_df['period2'] = high_sim_df.apply(
-        lambda x: f"{months[x['month-2']-1]} {x['year-2']}", axis=1)
-
-    # Create month order for sorting
-    month_order = [f"{month} {year}" for year in range(2021, 2025) for month in months]
-
-    # Now create the heatmap_data by grouping
-    heatmap_data = high_sim_df.groupby(['period1', 'period2'])['similarity'].mean().unstack()
-
-    # Sort chronologically
-    heatmap_data = heatmap_data.reindex(
-        index=[x for x in month_order if x in heatmap_data.index],
-        columns=[x for x in month_order if x in heatmap_data.columns]
+# First, ensure your query 'pairs' exists
+if 'pairs' in locals() or 'pairs' in globals():
+    # High-similarity articles (0.4-0.9 range) from recent years, with the mean
+    # similarity for every (month of article 1, month of article 2) cell
+    heatmap_data = (
+        pairs.where(c.similarity.between(0.4, 0.9), c.year_1.between(2021, 2024), c.year_2.between(2021, 2024))
+        .groupby_month_pair(2021, 2024)
+        .mean('similarity')
+        .collect()
     )
 
+    # Month order (Jan 2021 ... Dec 2024) for placing the year separators
+    month_order = month_labels(2021, 2024)
+
     # Create heatmap with annotations inside the graph
     fig_heat = px.imshow(
         heatmap_data,
@@ -180,7 +173,7 @@ if 'df' in locals() or 'df' in globals():
         )
 
     # Save and show
-    fig_heat.write_html("compact_high_similarity_heatmap.html")
+    write_figures({"compact_high_similarity_heatmap.html": fig_heat})
     fig_heat.show()
 else:
-    print("Error: DataFrame 'df' not found. Please load your data first.")
+    print("Error: query 'pairs' not found. Please load your data first.")
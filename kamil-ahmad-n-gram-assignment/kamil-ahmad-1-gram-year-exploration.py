@@ -1,37 +1,14 @@
-import pandas as pd
+import os
+import sys
 import plotly.express as px
 
-# Load the dataset
-df = pd.read_csv("../data/dataframes/n-grams/1-gram/1-gram-year.csv")
+# Shared top n-gram cache from the scripts folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from figure_renderer import write_figures
+from ngram_topk import top_ngrams
 
-# Ensure 'year' is treated as an integer
-df['year'] = df['year'].astype(int)
-
-# Define excluded terms
-excluded = set([
-    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself", "yourselves",
-    "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself", "they", "them", "their",
-    "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "these", "those", "am", "is", "are",
-    "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an",
-    "the", "and", "but", "if", "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about",
-    "against", "between", "into", "through", "during", "before", "after", "above", "below", "to", "from", "up",
-    "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "when",
-    "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no",
-    "nor", "not", "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don",
-    "should", "now", "people", "said"
-])
-
-# Filter out excluded terms
-df = df[~df['1-gram'].isin(excluded)]
-
-# Group by 1-gram and compute total frequency
-top_grams = (
-    df.groupby('1-gram')['count-sum']
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-    .reset_index()
-)
+# Top 10 1-grams over all years, stop words left out (cached top lists, see scripts/ngram_topk.py)
+top_grams = top_ngrams(1, k=10).reset_index()
 
 # Plot using Plotly bar chart
 fig = px.bar(
@@ -50,5 +27,5 @@ fig.update_layout(
 )
 
 # Save and display the bar chart
-fig.write_html("kamil-ahmad-1-gram-year-exploration.html")
+write_figures({"kamil-ahmad-1-gram-year-exploration.html": fig})
 fig.show()
@@ -1,26 +1,22 @@
 
-import pandas as pd
+import os
+import sys
 import plotly.express as px
 
-# Load the data
-df = pd.read_csv("../data/dataframes/n-grams/1-gram/1-gram-year.csv")
+# Memory-mapped 1-gram count matrix (1-gram x year) from the scripts folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from figure_renderer import write_figures
+from ngram_matrix import load_ngram_matrix
+
+# Open the count matrix built from 1-gram-year.csv
+matrix = load_ngram_matrix(1, 'year')
 
 # Print basic info
-print(df.head())
-print("Columns:", df.columns.tolist())
-print("Unique 1-grams:", df['1-gram'].nunique())
-print("Years:", sorted(df['year'].unique()))
-
-# Ensure 'year' is treated as integer
-df['year'] = df['year'].astype(int)
-
-# Group by 1-gram and get total count across all years
-top_grams = (
-    df.groupby('1-gram')['count-sum']
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
+print("Unique 1-grams:", len(matrix))
+print("Years:", matrix.labels())
+
+# Total count of every 1-gram across all years, top 10
+top_grams = matrix.top(10)
 
 print("Top 10 most frequent 1-grams:")
 print(top_grams)
@@ -28,8 +24,8 @@ print(top_grams)
 # Select top 5 1-grams for plotting
 top_words = top_grams.index[:5]
 
-# Filter data to only include top 1-grams
-df_top = df[df['1-gram'].isin(top_words)]
+# Year, 1-gram and count-sum rows for the top 1-grams (one matrix row each)
+df_top = matrix.long_frame(top_words)
 
 # Plot using Plotly
 fig = px.line(
@@ -51,7 +47,7 @@ fig.update_layout(
 )
 
 # Save the interactive plot as HTML
-fig.write_html("kamil-ahmad-1-gram-year-exploration2.html")
+write_figures({"kamil-ahmad-1-gram-year-exploration2.html": fig})
 
 # Show the plot
 fig.show()
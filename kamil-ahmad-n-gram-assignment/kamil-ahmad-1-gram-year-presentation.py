@@ -1,23 +1,17 @@
+import os
+import sys
 import pandas as pd
 import plotly.express as px
 
-# Manually defined stop words (from https://gist.github.com/sebleier/554280) + added "people" and "said"
-excluded_words = set([
-    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself", "yourselves",
-    "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself", "they", "them", "their",
-    "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "these", "those", "am", "is", "are",
-    "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an",
-    "the", "and", "but", "if", "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about",
-    "against", "between", "into", "through", "during", "before", "after", "above", "below", "to", "from", "up",
-    "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "when",
-    "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no",
-    "nor", "not", "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don",
-    "should", "now",
-    "people", "said"  # Added words
-])
+# Shared n-gram table loader and top n-gram cache from the scripts folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from figure_renderer import write_figures
+from ngram_topk import top_ngrams
+from stopwords import load_ngram_table
 
-# Load the data
-df = pd.read_csv("../data/dataframes/n-grams/1-gram/1-gram-year.csv")
+# Load the data (only the columns we use, from the Parquet copy of the csv)
+# with stop words (https://gist.github.com/sebleier/554280 + "people" and "said") removed
+df = load_ngram_table("1-gram-year", columns=["year", "1-gram", "count-sum"])
 
 # Print basic info
 print(df.head())
@@ -28,16 +22,8 @@ print("Years:", sorted(df['year'].unique()))
 # Ensure 'year' is treated as integer
 df['year'] = df['year'].astype(int)
 
-# Remove stop words from '1-gram' column
-df = df[~df['1-gram'].isin(excluded_words)]
-
-# Group by 1-gram and get total count across all years
-top_grams = (
-    df.groupby('1-gram')['count-sum']
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
+# Top 10 1-grams by total count across all years (from the cached top lists)
+top_grams = top_ngrams(1, k=10)
 
 print("Top 10 most frequent 1-grams (after stop words removal):")
 print(top_grams)
@@ -68,7 +54,7 @@ fig.update_layout(
 )
 
 # Save the interactive plot as HTML
-fig.write_html("kamil-ahmad-1-gram-presentation-visualization.html")
+write_figures({"kamil-ahmad-1-gram-presentation-visualization.html": fig})
 
 # Show the plot
 fig.show()
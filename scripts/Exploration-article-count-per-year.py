@@ -1,18 +1,12 @@
-import os
 import plotly.express as px
 import pandas as pd
 
-# Folder containing the articles
-folder = '../data/articles'
+from corpus_reader import list_article_files
+from figure_renderer import write_figures
 
-# Get list of files and extract the year
-article_files = os.listdir(folder)
-years = []
-
-for filename in article_files:
-    if filename.endswith('.txt'):
-        year = filename[:4]  # as the format is 'YYYY-MM-DD_XXXX.txt'
-        years.append(year)
+# Get the year of every article from its filename, as the format is
+# 'YYYY-MM-DD_XXXX.txt' (the folder is only listed, no file is opened)
+years = [str(parsed[0]) for _, _, parsed in list_article_files()]
 
 # Create a DataFrame for the list of years
 df = pd.DataFrame({'year': years})
@@ -36,7 +30,6 @@ fig_bar = px.bar(
     labels={'article_count': 'Articles'},
     text='article_count'
 )
-fig_bar.write_html('exploration-article-count-bar.html')
 
 # Line chart to see article trend over time
 fig_line = px.line(
@@ -47,7 +40,9 @@ fig_line = px.line(
     labels={'article_count': 'Articles'},
     markers=True
 )
-fig_line.write_html('exploration-article-count-line.html')
-
-
 
+# Save the bar and line charts
+write_figures({
+    'exploration-article-count-bar.html': fig_bar,
+    'exploration-article-count-line.html': fig_line,
+})
@@ -1,39 +1,13 @@
-import os
-import pandas as pd
 import plotly.express as px
 
-# Path to article folder
-folder = '../data/articles'
+from columnar_store import load_table
+from figure_renderer import write_figures
 
-# Empty dictionary to store word lengths per year
-word_lengths = {}
-
-# Loop through each article file
-for filename in os.listdir(folder):
-    if filename.endswith('.txt'):
-        year = filename[:4]  # Files are saved as 'YYYY-MM-DD-XXXX.txt'
-        file_path = os.path.join(folder, filename)
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            words = f.read().split()
-            word_count = len(words)
-
-        if year not in word_lengths:
-            word_lengths[year] = []
-
-        word_lengths[year].append(word_count)
-
-# Create summary of min and max word lengths per year
-summary = []
-for year, lengths in word_lengths.items():
-    summary.append({
-        'year': int(year),
-        'min_length': min(lengths),
-        'max_length': max(lengths)
-    })
-
-# Convert summary to DataFrame
-df_extremes = pd.DataFrame(summary).sort_values('year')
+# Min and max word lengths per year from the length statistics table
+# (written by length_stats.py from length.csv)
+df_extremes = load_table('length-stats-year', columns=['year', 'length-min', 'length-max'])
+df_extremes = df_extremes.rename(columns={'length-min': 'min_length', 'length-max': 'max_length'})
+df_extremes = df_extremes.sort_values('year')
 
 # dataframe informations
 print("First few rows of extremes DataFrame:\n", df_extremes.head(), "\n")
@@ -49,7 +23,6 @@ fig_line = px.line(
     labels={'value': 'Word Count', 'variable': 'Type'},
     markers=True
 )
-fig_line.write_html('exploration-min-max-lengths-line.html')
 
 # check how bar graph would look like
 df_melted = df_extremes.melt(id_vars='year', value_vars=['min_length', 'max_length'],
@@ -64,4 +37,9 @@ fig_bar = px.bar(
     title='Shortest and Longest Article Lengths Per Year',
     labels={'year': 'Year'}
 )
-fig_bar.write_html('exploration-min-max-lengths-bar.html')
+
+# save the line and bar charts
+write_figures({
+    'exploration-min-max-lengths-line.html': fig_line,
+    'exploration-min-max-lengths-bar.html': fig_bar,
+})
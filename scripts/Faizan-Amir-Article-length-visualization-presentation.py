@@ -1,9 +1,10 @@
-import os
-import pandas as pd
 import plotly.express as px
 
-# Load the CSV file
-df_year = pd.read_csv('../data/dataframes/length/length-year.csv')
+from columnar_store import load_table
+from figure_renderer import write_figures
+
+# Load the length per year table (read from its Parquet copy)
+df_year = load_table('length-year', columns=['year', 'length-sum', 'length-mean'])
 
 # Sort by year to make the line chart 
 df_year = df_year.sort_values('year')
@@ -18,8 +19,6 @@ fig1 = px.line(
     labels={'length-mean': 'Average Words per Article', 'year': 'Year'}
 )
 
- fig1.write_html("Faizan-Amir-average-words-per-article.html")
-
 # Total words in articles per year
 fig2 = px.bar(
     df_year,
@@ -30,4 +29,8 @@ fig2 = px.bar(
     text='length-sum'
 )
 
- fig2.write_html("Faizan-Amir-total-words-published.html")
+# Save both charts
+write_figures({
+    "Faizan-Amir-average-words-per-article.html": fig1,
+    "Faizan-Amir-total-words-published.html": fig2,
+})
@@ -2,6 +2,8 @@ import os
 import pandas as pd
 import plotly.express as px
 
+from figure_renderer import write_figures
+
 # Load the CSV file
 df_year = pd.read_csv('../data/dataframes/length/length-year.csv')
 
@@ -29,7 +31,6 @@ fig = px.line(
     title='Avg Words per Article',
     markers=True
 )
-fig.write_html("exploration-avg-length-line.html")
 
 # explore bar chart 
 figure2 = px.bar(
@@ -41,8 +42,6 @@ figure2 = px.bar(
     text='length-mean'  # Show values on top of bars
 )
 
-figure2.write_html("exploration-avg-length-bar.html")
-
 # total word in article per year graphs
 #exploring bar chart
 figure3 = px.bar(
@@ -53,7 +52,6 @@ figure3 = px.bar(
     labels={'length-sum': 'Total Words', 'year': 'Year'},
     text='length-sum'  # show value on top of bars
 )
-figure3.write_html("exploration-total-length-bar.html")
 
 # exploring histogram
 figure4 = px.histogram(
@@ -64,8 +62,6 @@ figure4 = px.histogram(
     labels={'length-sum': 'Total Words per Year'}
 )
 
-figure4.write_html("exploration-total-length-histo.html")
-
 # exploring line chart
 figure5 = px.line(
     df_year.sort_values('year'),
@@ -76,4 +72,11 @@ figure5 = px.line(
     markers=True
 )
 
-figure5.write_html("exploration-total-length-line.html")
+# save all the charts
+write_figures({
+    "exploration-avg-length-line.html": fig,
+    "exploration-avg-length-bar.html": figure2,
+    "exploration-total-length-bar.html": figure3,
+    "exploration-total-length-histo.html": figure4,
+    "exploration-total-length-line.html": figure5,
+})
@@ -1,18 +1,11 @@
-import os
 import plotly.express as px
 import pandas as pd
 
-# Folder containing the articles
-folder = '../data/articles'
+from corpus_reader import list_article_files
+from figure_renderer import write_figures
 
-# Get list of files and extract the year
-article_files = os.listdir(folder)
-years = []
-
-for filename in article_files:
-    if filename.endswith('.txt'):
-        year = filename[:4]  # as the format is 'YYYY-MM-DD_XXXX.txt'
-        years.append(year)
+# List the article files and take the year from each 'YYYY-MM-DD_XXXX.txt' filename
+years = [str(parsed[0]) for _, _, parsed in list_article_files()]
 
 # Count articles per year
 
@@ -39,4 +32,4 @@ fig = px.bar(
 )
 
 
-fig.write_html('Faizan-Amir-article-count-per-year.html')
+write_figures({'Faizan-Amir-article-count-per-year.html': fig})
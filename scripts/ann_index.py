@@ -0,0 +1,205 @@
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from corpus_reader import DATA_DIR, iter_packed_articles
+from similarity import tfidf_matrix
+
+# Approximate nearest neighbour index for "articles similar to X" lookups.
+# Articles are TF-IDF vectors (see similarity.py). Random hyperplane LSH gives
+# every vector an n_bits signature in each of n_tables hash tables; vectors
+# with a small angle between them usually land in the same bucket. A query
+# collects the articles sharing a bucket with it (also probing the buckets one
+# bit away), then ranks only those candidates by exact cosine similarity.
+#
+# Example:
+#     index = AnnIndex.load()
+#     index.query('2023-10-20_2976.txt', k=10)
+#     index.query('ceasefire talks in Cairo', k=10)
+#     index.add(['2024-06-01_5000.txt'], [text])
+#
+# Usage (from the scripts folder):
+#     python ann_index.py build
+#     python ann_index.py query 2023-10-20_2976.txt -k 10
+#     python ann_index.py benchmark -k 10
+
+INDEX_PATH = os.path.join(DATA_DIR, 'cache', 'ann', 'tfidf-lsh.pkl')
+
+
+class AnnIndex:
+
+    def __init__(self, vectorizer, matrix, filenames, n_tables=32, n_bits=8, seed=0):
+        self.vectorizer = vectorizer
+        self.matrix = matrix.tocsr().astype(np.float32)
+        self.filenames = list(filenames)
+        self.rows = {filename: row for row, filename in enumerate(self.filenames)}
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.seed = seed
+        # the hyperplanes are not saved, they are regenerated from the seed
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((self.matrix.shape[1], n_tables * n_bits), dtype=np.float32)
+        self.bit_values = (1 << np.arange(n_bits)).astype(np.int64)
+        self.codes = self._hash(self.matrix)
+        self._build_buckets()
+
+    # Fit TF-IDF on the documents and index them
+    @classmethod
+    def build(cls, filenames, documents, **options):
+        matrix, vectorizer = tfidf_matrix(documents)
+        return cls(vectorizer, matrix, filenames, **options)
+
+    # Bucket code of every row in every table, shape (rows, n_tables)
+    def _hash(self, matrix):
+        projected = np.asarray(matrix @ self.planes)
+        bits = (projected > 0).reshape(matrix.shape[0], self.n_tables, self.n_bits)
+        return bits.astype(np.int64) @ self.bit_values
+
+    # One dict per table from bucket code to the rows in that bucket
+    def _build_buckets(self):
+        self.buckets = []
+        for table in range(self.n_tables):
+            codes = self.codes[:, table]
+            order = np.argsort(codes, kind='stable')
+            unique, starts = np.unique(codes[order], return_index=True)
+            groups = np.split(order, starts[1:])
+            self.buckets.append(dict(zip(unique.tolist(), groups)))
+
+    def _candidates(self, codes):
+        found = []
+        for table, code in enumerate(codes):
+            buckets = self.buckets[table]
+            # the query's own bucket plus every bucket one bit away
+            for probe in np.concatenate(([code], code ^ self.bit_values)).tolist():
+                rows = buckets.get(probe)
+                if rows is not None:
+                    found.append(rows)
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def _search(self, vector, k, exclude=None):
+        candidates = self._candidates(self._hash(vector)[0])
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if len(candidates) == 0:
+            return []
+        # a dense query vector makes the sparse product a fast matrix-vector multiply
+        scores = self.matrix[candidates] @ vector.toarray().ravel()
+        k = min(k, len(candidates))
+        best = np.argpartition(scores, -k)[-k:]
+        best = best[np.argsort(-scores[best])]
+        return [(self.filenames[candidates[b]], float(scores[b])) for b in best]
+
+    # The k articles most similar to a filename in the index or to a piece of text,
+    # as a list of (filename, similarity), best first
+    def query(self, filename_or_text, k=10):
+        row = self.rows.get(filename_or_text)
+        if row is not None:
+            return self._search(self.matrix[row], k, exclude=row)
+        vector = self.vectorizer.transform([filename_or_text]).astype(np.float32)
+        return self._search(vector, k)
+
+    # Add new articles using the fitted vocabulary; existing ones are replaced
+    def add(self, filenames, documents):
+        vectors = self.vectorizer.transform(documents).astype(np.float32).tocsr()
+        codes = self._hash(vectors)
+        new_rows = []
+        for filename in filenames:
+            if filename in self.rows:
+                self._remove_from_buckets(self.rows[filename])
+            new_rows.append(len(self.filenames))
+            self.rows[filename] = len(self.filenames)
+            self.filenames.append(filename)
+        self.matrix = sp.vstack([self.matrix, vectors], format='csr')
+        self.codes = np.vstack([self.codes, codes])
+        for table in range(self.n_tables):
+            buckets = self.buckets[table]
+            for row, code in zip(new_rows, codes[:, table].tolist()):
+                rows = buckets.get(code)
+                buckets[code] = np.array([row]) if rows is None else np.append(rows, row)
+
+    # An article that was replaced keeps its row in the matrix but leaves every bucket
+    def _remove_from_buckets(self, row):
+        for table, code in enumerate(self.codes[row].tolist()):
+            rows = self.buckets[table].get(code)
+            if rows is not None:
+                self.buckets[table][code] = rows[rows != row]
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        live = sorted(self.rows.values())
+        state = {
+            'vectorizer': self.vectorizer,
+            'matrix': self.matrix[live],
+            'filenames': [self.filenames[row] for row in live],
+            'n_tables': self.n_tables, 'n_bits': self.n_bits, 'seed': self.seed,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        return cls(state['vectorizer'], state['matrix'], state['filenames'],
+                   state['n_tables'], state['n_bits'], state['seed'])
+
+
+# Compare the index with exact cosine search on a sample of articles.
+# Returns the mean recall@k and the mean query time in milliseconds.
+def benchmark(index, k=10, sample=200, seed=0):
+    rng = np.random.default_rng(seed)
+    live = np.array(sorted(index.rows.values()))
+    rows = rng.choice(live, size=min(sample, len(live)), replace=False)
+    exact = (index.matrix[rows] @ index.matrix[live].T).toarray()
+
+    recalls = []
+    elapsed = 0.0
+    for position, row in enumerate(rows):
+        scores = exact[position]
+        scores[live == row] = -1
+        truth = {index.filenames[live[j]] for j in np.argpartition(scores, -k)[-k:]}
+        start = time.perf_counter()
+        found = index.query(index.filenames[row], k)
+        elapsed += time.perf_counter() - start
+        recalls.append(len(truth & {filename for filename, _ in found}) / k)
+    return float(np.mean(recalls)), elapsed / len(rows) * 1000
+
+
+def build_from_corpus(**options):
+    filenames = []
+    documents = []
+    for article in iter_packed_articles():
+        filenames.append(article.filename)
+        documents.append(article.text)
+    return AnnIndex.build(filenames, documents, **options)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Approximate nearest neighbour search over the articles')
+    parser.add_argument('command', choices=['build', 'query', 'benchmark'])
+    parser.add_argument('target', nargs='?', help='filename or text to look up (query)')
+    parser.add_argument('-k', type=int, default=10, help='number of neighbours')
+    parser.add_argument('--tables', type=int, default=32, help='number of hash tables (build)')
+    parser.add_argument('--bits', type=int, default=8, help='bits per hash table (build)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = build_from_corpus(n_tables=args.tables, n_bits=args.bits)
+        index.save()
+        print(f'Indexed {len(index.filenames)} articles into {INDEX_PATH}')
+    elif args.command == 'query':
+        index = AnnIndex.load()
+        for filename, score in index.query(args.target, args.k):
+            print(f'{score:.3f}  {filename}')
+    else:
+        index = AnnIndex.load()
+        recall, latency = benchmark(index, args.k)
+        print(f'recall@{args.k}: {recall:.3f}   mean query time: {latency:.2f} ms')
@@ -0,0 +1,182 @@
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import load_table, table_csv_path
+from corpus_reader import ARTICLES_DIR, DATA_DIR, DATAFRAMES_DIR
+from packed_corpus import INDEX_NAME, load_packed_corpus
+
+# Date-indexed catalog of the articles.
+# Every article is one row of a few parallel arrays sorted by publication date
+# and then by article id: the date as an int32 day number (days since
+# 1970-01-01), the id, the filename, the title (from title.csv) and the byte
+# offset and size of the article in the packed corpus (packed_corpus.py). Because
+# the rows are sorted by day number, the articles of any date range are one
+# contiguous slice that two np.searchsorted calls find, without parsing a date
+# string per article, and the text of an article is read from the memory-mapped
+# packed corpus at its offset.
+#
+# The catalog is saved in data/cache/catalog and built again when title.csv
+# changes or the corpus is packed again.
+#
+# Example:
+#     catalog = load_catalog()
+#     catalog.articles_between('2023-10-07', '2023-10-31')      # DataFrame of the articles
+#     start, end = catalog.positions_between((2023, 10, 7), (2023, 10, 31))
+#     catalog.days[start:end]                                    # their day numbers
+#     catalog.text('2023-10-20_2976.txt')
+#
+# Usage (from the scripts folder):
+#     python article_catalog.py 2023-10-07 2023-10-31
+#     python article_catalog.py --rebuild
+
+CATALOG_PATH = os.path.join(DATA_DIR, 'cache', 'catalog', 'catalog.npz')
+
+
+# Days since 1970-01-01 of a date given as 'YYYY-MM-DD', (year, month, day), a
+# datetime.date or a numpy datetime64
+def day_number(date):
+    if isinstance(date, (tuple, list)):
+        date = datetime.date(*date)
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+# Day numbers of whole year, month and day columns, parsed as numbers
+def day_numbers(years, months, days):
+    dates = pd.to_datetime(pd.DataFrame({'year': np.asarray(years), 'month': np.asarray(months),
+                                         'day': np.asarray(days)}))
+    return dates.to_numpy('datetime64[D]').astype(np.int64).astype(np.int32)
+
+
+# datetime.date of a day number
+def date_of(day):
+    return np.datetime64(int(day), 'D').astype(datetime.date)
+
+
+# Stat of what the catalog is built from: title.csv and the index of the packed corpus
+def source_stats(corpus, base_dir=DATAFRAMES_DIR):
+    stats = {}
+    for path in (table_csv_path('title', base_dir), os.path.join(corpus.directory, INDEX_NAME)):
+        stat = os.stat(path)
+        stats[os.path.basename(path)] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+
+class ArticleCatalog:
+
+    def __init__(self, days, ids, filenames, titles, offsets, sizes, corpus=None, source=None):
+        self.days = days
+        self.ids = ids
+        self.filenames = np.asarray(filenames, dtype=object)
+        self.titles = np.asarray(titles, dtype=object)
+        self.offsets = offsets
+        self.sizes = sizes
+        self.corpus = corpus
+        self.source = source
+        self.positions = {filename: i for i, filename in enumerate(self.filenames)}
+
+    def __len__(self):
+        return len(self.days)
+
+    # Catalog of the articles of a packed corpus with the titles of title.csv
+    @classmethod
+    def build(cls, corpus, base_dir=DATAFRAMES_DIR):
+        source = source_stats(corpus, base_dir)
+        parsed = corpus.parsed
+        days = day_numbers(parsed[:, 0], parsed[:, 1], parsed[:, 2])
+        ids = parsed[:, 3].astype(np.int32)
+        order = np.lexsort((ids, days))
+        filenames = corpus.filenames
+
+        titles = load_table('title', columns=['file', 'title'], base_dir=base_dir)
+        titles = pd.Series(titles['title'].astype(str).to_numpy(), index=titles['file'].astype(str).to_numpy())
+        titles = titles.reindex(filenames[order]).fillna('').to_numpy(dtype=object)
+        return cls(days[order], ids[order], filenames[order], titles, corpus.offsets[order],
+                   corpus.sizes[order].astype(np.int32), corpus, source)
+
+    def save(self, path=CATALOG_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        source = sorted((name, mtime, size) for name, (mtime, size) in self.source.items())
+        np.savez(tmp_path, days=self.days, ids=self.ids, filenames=self.filenames.astype(str),
+                 titles=self.titles.astype(str), offsets=self.offsets, sizes=self.sizes,
+                 source=np.array(source, dtype=object))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CATALOG_PATH, corpus=None):
+        with np.load(path, allow_pickle=True) as data:
+            source = {name: (int(mtime), int(size)) for name, mtime, size in data['source']}
+            return cls(data['days'], data['ids'], data['filenames'], data['titles'], data['offsets'],
+                       data['sizes'], corpus, source)
+
+    # First and last+1 position of the articles published from start to end, both included
+    def positions_between(self, start, end):
+        return (int(np.searchsorted(self.days, day_number(start), side='left')),
+                int(np.searchsorted(self.days, day_number(end), side='right')))
+
+    # Articles published from start to end (both included) as a DataFrame in date order
+    def articles_between(self, start, end):
+        first, last = self.positions_between(start, end)
+        return self.frame(slice(first, last))
+
+    # Rows of the catalog as a DataFrame; rows is anything that indexes a numpy array
+    def frame(self, rows=slice(None)):
+        return pd.DataFrame({
+            'file': self.filenames[rows],
+            'id': self.ids[rows],
+            'date': self.days[rows].astype('datetime64[D]'),
+            'title': self.titles[rows],
+            'offset': self.offsets[rows],
+            'size': self.sizes[rows],
+        })
+
+    # Position of an article in the catalog
+    def position(self, filename):
+        return self.positions[filename]
+
+    # Bytes of the article at a position in the packed corpus, without copying; the
+    # view keeps the map open after the corpus is closed (see PackedCorpus.close)
+    def view(self, position):
+        return self.corpus.slice(self.offsets[position], self.sizes[position])
+
+    # Raw text of the article at a position
+    def read(self, position):
+        return str(self.view(position), 'utf-8')
+
+    def text(self, filename):
+        return self.read(self.position(filename))
+
+
+# Open the saved catalog, building it again when its sources changed. The
+# packed corpus is packed again first when the article files changed.
+def load_catalog(folder=ARTICLES_DIR, base_dir=DATAFRAMES_DIR, path=CATALOG_PATH):
+    corpus = load_packed_corpus(folder)
+    if os.path.exists(path):
+        catalog = ArticleCatalog.load(path, corpus)
+        if catalog.source == source_stats(corpus, base_dir):
+            return catalog
+    catalog = ArticleCatalog.build(corpus, base_dir)
+    catalog.save(path)
+    return catalog
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the article catalog or list the articles of a date range')
+    parser.add_argument('start', nargs='?', help='first date, YYYY-MM-DD')
+    parser.add_argument('end', nargs='?', help='last date, YYYY-MM-DD (default: start)')
+    parser.add_argument('--rebuild', action='store_true', help='build the catalog from scratch')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        catalog = ArticleCatalog.build(load_packed_corpus())
+        catalog.save()
+    else:
+        catalog = load_catalog()
+    print(f'{len(catalog)} articles from {date_of(catalog.days[0])} to {date_of(catalog.days[-1])}')
+    if args.start:
+        articles = catalog.articles_between(args.start, args.end or args.start)
+        print(articles[['date', 'file', 'title']].to_string(index=False))
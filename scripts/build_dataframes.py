@@ -0,0 +1,142 @@
+import argparse
+import os
+from collections import Counter
+
+import pandas as pd
+
+from columnar_store import write_table
+from corpus_reader import ARTICLES_DIR, DATAFRAMES_DIR
+from length_stats import write_length_stats
+from parallel_tokenize import tokenize_corpus
+
+# Rebuilds the length and n-gram tables in data/dataframes from the articles.
+# Tokenization runs in a process pool (see parallel_tokenize.py); the results
+# of every finished shard are merged into per year-month totals straight away,
+# so only the running totals are kept in memory.
+#
+# Usage (from the scripts folder):
+#     python build_dataframes.py --ngrams 1 --workers 4
+
+
+# Path of a table inside data/dataframes, e.g. table_path('length', 'length-year.csv')
+def table_path(*parts, base_dir=DATAFRAMES_DIR):
+    return os.path.join(base_dir, *parts)
+
+
+def ngram_table_path(n, level='year', base_dir=DATAFRAMES_DIR):
+    suffix = '' if level == 'article' else '-' + level
+    return table_path('n-grams', f'{n}-gram', f'{n}-gram{suffix}.csv', base_dir=base_dir)
+
+
+class TableBuilder:
+    # Running totals for the length and n-gram tables.
+    # n-gram counts are kept per (year, month): 'sums' holds the number of mentions
+    # and 'docs' the number of articles mentioning the n-gram, which is what
+    # count-mean is divided by in the existing tables.
+
+    def __init__(self, ngram_sizes=(1,)):
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.articles = []
+        self.sums = {n: {} for n in self.ngram_sizes}
+        self.docs = {n: {} for n in self.ngram_sizes}
+
+    # Merge the per-file results of one shard
+    def add_results(self, results):
+        for result in results:
+            year, month, day, _ = result.parsed
+            self.articles.append((result.filename, year, month, day, result.length))
+            for n in self.ngram_sizes:
+                period = (year, month)
+                self.sums[n].setdefault(period, Counter()).update(result.counts[n])
+                self.docs[n].setdefault(period, Counter()).update(result.counts[n].keys())
+
+    # One row per article, month and day zero padded like the original length.csv
+    def length_table(self):
+        df = pd.DataFrame(self.articles, columns=['file', 'year', 'month', 'day', 'length'])
+        df = df.sort_values('length', kind='mergesort')
+        df['month'] = df['month'].map('{:02d}'.format)
+        df['day'] = df['day'].map('{:02d}'.format)
+        return df[['year', 'month', 'day', 'length']]
+
+    # Length sum and mean per year or year-month, month zero padded like the original tables
+    def length_period_table(self, by):
+        df = pd.DataFrame(self.articles, columns=['file', 'year', 'month', 'day', 'length'])
+        table = df.groupby(by)['length'].agg(['sum', 'mean']).reset_index()
+        table.columns = list(by) + ['length-sum', 'length-mean']
+        if 'month' in by:
+            table['month'] = table['month'].map('{:02d}'.format)
+        return table.sort_values('length-sum', ascending=False, kind='mergesort')
+
+    # Combine the year-month totals of one n size into a table for 'year' or 'year-month'
+    def ngram_table(self, n, level='year'):
+        sums = self.sums[n]
+        docs = self.docs[n]
+        if level == 'year':
+            year_sums = {}
+            year_docs = {}
+            for (year, month), counter in sums.items():
+                year_sums.setdefault(year, Counter()).update(counter)
+                year_docs.setdefault(year, Counter()).update(docs[(year, month)])
+            sums = {(year,): counter for year, counter in year_sums.items()}
+            docs = {(year,): counter for year, counter in year_docs.items()}
+            keys = ['year']
+        else:
+            keys = ['year', 'month']
+
+        frames = []
+        for period in sorted(sums):
+            counter = sums[period]
+            grams = list(counter)
+            frame = pd.DataFrame({
+                f'{n}-gram': grams,
+                'count-sum': [counter[gram] for gram in grams],
+                'articles': [docs[period][gram] for gram in grams],
+            })
+            for key, value in zip(keys, period):
+                frame.insert(keys.index(key), key, value)
+            frames.append(frame)
+
+        table = pd.concat(frames, ignore_index=True)
+        table['count-mean'] = table['count-sum'] / table['articles']
+        table = table.drop(columns='articles')
+        return table.sort_values('count-sum', ascending=False, kind='mergesort')
+
+    def write(self, base_dir=DATAFRAMES_DIR):
+        written = []
+        tables = [
+            (self.length_table(), table_path('length', 'length.csv', base_dir=base_dir)),
+            (self.length_period_table(['year']), table_path('length', 'length-year.csv', base_dir=base_dir)),
+            (self.length_period_table(['year', 'month']),
+             table_path('length', 'length-year-month.csv', base_dir=base_dir)),
+        ]
+        for n in self.ngram_sizes:
+            tables.append((self.ngram_table(n, 'year'), ngram_table_path(n, 'year', base_dir)))
+            tables.append((self.ngram_table(n, 'year-month'), ngram_table_path(n, 'year-month', base_dir)))
+
+        for table, path in tables:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_table(table, path)
+            written.append(path)
+        written.extend(write_length_stats(base_dir))
+        return written
+
+
+# Tokenize the whole corpus in parallel and return the filled TableBuilder
+def build_tables(folder=ARTICLES_DIR, ngram_sizes=(1,), workers=None, shard_size=64):
+    builder = TableBuilder(ngram_sizes)
+    for results in tokenize_corpus(folder, ngram_sizes, workers, shard_size):
+        builder.add_results(results)
+    return builder
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the length and n-gram dataframes')
+    parser.add_argument('--ngrams', type=int, nargs='+', default=[1], help='n-gram sizes to count')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all cores)')
+    parser.add_argument('--shard-size', type=int, default=64, help='articles per worker task')
+    parser.add_argument('--output', default=DATAFRAMES_DIR, help='folder to write the tables to')
+    args = parser.parse_args()
+
+    builder = build_tables(ngram_sizes=args.ngrams, workers=args.workers, shard_size=args.shard_size)
+    for path in builder.write(args.output):
+        print('Written', path)
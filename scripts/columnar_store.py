@@ -0,0 +1,216 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from corpus_reader import DATAFRAMES_DIR
+from schemas import NGRAM_NAME, apply_schema, category_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, we fall back to reading the csv
+    pa = None
+    pc = None
+    pq = None
+
+# Columnar copies of the tables in data/dataframes.
+# Every csv gets a Parquet file next to it (same name, .parquet). The copy is
+# sorted by date and split into row groups, so a loader that only needs a few
+# columns or a range of years reads just those columns and skips the row groups
+# outside the range. The csv stays the source of truth: when it is newer than
+# its Parquet copy, the copy is rewritten on the next load.
+#
+# Loaded tables get the column types from schemas.py unless typed=False.
+#
+# The copies of the n-gram tables also store every n-gram as a tuple of word
+# ids (int32 columns word-1 ... word-n) and keep the vocabulary those ids point
+# into in the file metadata, so word-level filters (see stopwords.py) work on
+# integers. These columns are only returned when they are asked for.
+#
+# Example:
+#     df = load_table('tfidf-over-0.3-len100', columns=['similarity', 'year-1', 'year-2'])
+#     df = load_table('1-gram-year', filters=[('year', '>=', 2023)])
+#
+# Run this file to (re)write the Parquet copy of every csv.
+
+ROW_GROUP_SIZE = 16384
+
+# Metadata key of the vocabulary behind the word id columns
+VOCABULARY_KEY = b'vocabulary'
+
+# Columns the rows are sorted by before writing, so row groups follow the calendar
+SORT_COLUMNS = [['year', 'month', 'day'], ['year-1', 'month-1', 'day-1']]
+
+
+# Map every table name (csv filename without extension) to its csv path
+def find_tables(base_dir=DATAFRAMES_DIR):
+    tables = {}
+    for root, dirs, files in os.walk(base_dir):
+        for file in files:
+            if file.endswith('.csv'):
+                tables[file[:-4]] = os.path.join(root, file)
+    return tables
+
+
+def table_csv_path(name, base_dir=DATAFRAMES_DIR):
+    if name.endswith('.csv') and os.path.exists(name):
+        return name
+    tables = find_tables(base_dir)
+    if name not in tables:
+        raise KeyError(f"No table called '{name}' in {base_dir}")
+    return tables[name]
+
+
+# Column names of a table as written in its csv
+def table_columns(name, base_dir=DATAFRAMES_DIR):
+    return pd.read_csv(table_csv_path(name, base_dir), nrows=0).columns.tolist()
+
+
+def parquet_path(csv_path):
+    return csv_path[:-4] + '.parquet'
+
+
+def read_csv(csv_path, columns=None):
+    # keep_default_na=False: n-gram tables contain real words such as 'null' and 'nan'
+    return pd.read_csv(csv_path, usecols=columns, keep_default_na=False)
+
+
+def is_stale(csv_path):
+    path = parquet_path(csv_path)
+    return not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(csv_path)
+
+
+def _sort_for_row_groups(df):
+    for columns in SORT_COLUMNS:
+        present = [column for column in columns if column in df.columns]
+        if present:
+            return df.sort_values(present, kind='mergesort')
+    return df
+
+
+def word_columns(n):
+    return [f'word-{i}' for i in range(1, n + 1)]
+
+
+# Split n-grams into words and give every distinct word an integer id.
+# Returns (vocabulary, ids) where ids is an int32 array with one row of n word ids per n-gram.
+def encode_ngrams(ngrams, n):
+    ngrams = pd.Series(ngrams).astype(str)
+    if pc is not None:
+        words = pc.split_pattern(pa.array(ngrams), ' ', max_splits=n - 1)
+        if len(ngrams) and pc.min(pc.list_value_length(words)).as_py() < n:
+            raise ValueError(f'Expected {n} words in every {n}-gram')
+        encoded = pc.dictionary_encode(pc.list_flatten(words))
+        vocabulary = np.asarray(encoded.dictionary.to_pylist(), dtype=object)
+        ids = encoded.indices.to_numpy()
+    else:
+        words = ngrams.str.split(' ', n=n - 1, expand=True).reindex(columns=range(n))
+        if words.isna().any(axis=None):
+            raise ValueError(f'Expected {n} words in every {n}-gram')
+        ids, vocabulary = pd.factorize(words.to_numpy().ravel())
+        vocabulary = np.asarray(vocabulary, dtype=object)
+    return vocabulary, ids.astype(np.int32).reshape(len(ngrams), n)
+
+
+# Write df as a Parquet file (through a temporary file so readers never see half a file)
+def write_parquet(df, path):
+    df = _sort_for_row_groups(df)
+    vocabulary = None
+    match = NGRAM_NAME.match(os.path.basename(path)[:-8])
+    if match:
+        n = int(match.group(1))
+        vocabulary, ids = encode_ngrams(df[f'{n}-gram'], n)
+        df = df.assign(**dict(zip(word_columns(n), ids.T)))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if vocabulary is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               VOCABULARY_KEY: '\n'.join(vocabulary).encode('utf-8')})
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+
+
+# Make sure the Parquet copy of a csv exists and is up to date
+def sync_parquet(csv_path, force=False):
+    if pq is None:
+        raise ImportError('pyarrow is needed to write Parquet files (pip install pyarrow)')
+    if force or is_stale(csv_path):
+        write_parquet(read_csv(csv_path), parquet_path(csv_path))
+    return parquet_path(csv_path)
+
+
+def sync_all(base_dir=DATAFRAMES_DIR, force=False):
+    return [sync_parquet(path, force) for path in find_tables(base_dir).values()]
+
+
+# Write a table to its csv and refresh the Parquet copy if the table has one.
+# The copy is made from the csv just written so its column types are the same
+# as for a copy made by sync_parquet.
+def write_table(df, csv_path):
+    df.to_csv(csv_path, index=False)
+    if pq is not None and os.path.exists(parquet_path(csv_path)):
+        write_parquet(read_csv(csv_path), parquet_path(csv_path))
+
+
+# Vocabulary behind the word id columns of an n-gram table's Parquet copy,
+# or None when pyarrow is not installed
+def load_vocabulary(name, base_dir=DATAFRAMES_DIR):
+    if pq is None:
+        return None
+    csv_path = table_csv_path(name, base_dir)
+    metadata = pq.read_schema(sync_parquet(csv_path)).metadata or {}
+    if VOCABULARY_KEY not in metadata:
+        # copy written before the word id columns existed
+        metadata = pq.read_schema(sync_parquet(csv_path, force=True)).metadata or {}
+    if VOCABULARY_KEY not in metadata:
+        raise KeyError(f"'{name}' is not an n-gram table")
+    return np.asarray(metadata[VOCABULARY_KEY].decode('utf-8').split('\n'), dtype=object)
+
+
+# Apply pyarrow style filters, e.g. [('year', '>=', 2021), ('month', 'in', [1, 2])],
+# to a DataFrame; used when the table had to be read from the csv
+def apply_filters(df, filters):
+    operators = {
+        '=': lambda s, v: s == v, '==': lambda s, v: s == v, '!=': lambda s, v: s != v,
+        '<': lambda s, v: s < v, '<=': lambda s, v: s <= v,
+        '>': lambda s, v: s > v, '>=': lambda s, v: s >= v,
+        'in': lambda s, v: s.isin(v), 'not in': lambda s, v: ~s.isin(v),
+    }
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        mask &= operators[op](df[column], value)
+    return df[mask]
+
+
+# Load a table by name with only the requested columns and rows.
+# filters is a list of (column, op, value) tuples that must all hold.
+def load_table(name, columns=None, filters=None, typed=True, base_dir=DATAFRAMES_DIR):
+    csv_path = table_csv_path(name, base_dir)
+    name = os.path.basename(csv_path)[:-4]
+    columns = list(columns) if columns is not None else None
+
+    if pq is not None:
+        if columns is None:
+            columns = table_columns(csv_path)
+        # category columns are read straight from the Parquet dictionary pages
+        read_dictionary = category_columns(name) if typed else None
+        table = pq.read_table(sync_parquet(csv_path), columns=columns, filters=filters or None,
+                              read_dictionary=read_dictionary)
+        df = table.to_pandas()
+    else:
+        filter_columns = [column for column, _, _ in filters or []]
+        read_columns = None if columns is None else list(dict.fromkeys(columns + filter_columns))
+        df = read_csv(csv_path, read_columns)
+        if filters:
+            df = apply_filters(df, filters).reset_index(drop=True)
+        if columns is not None:
+            df = df[columns]
+    return apply_schema(df, name) if typed else df
+
+
+if __name__ == '__main__':
+    for path in sync_all(force=True):
+        csv_size = os.path.getsize(path[:-8] + '.csv') / 1e6
+        print(f'{path}  ({csv_size:.1f} MB csv -> {os.path.getsize(path) / 1e6:.1f} MB parquet)')
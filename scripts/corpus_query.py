@@ -0,0 +1,277 @@
+import numpy as np
+import pandas as pd
+
+from columnar_store import find_tables, load_table, table_columns
+from corpus_reader import DATAFRAMES_DIR
+from pair_aggregation import monthly_pair_matrix
+
+# Lazy queries over the tables in data/dataframes.
+# table() returns a query plan instead of a DataFrame. where(), select(),
+# groupby(), sort() and head() only add steps to the plan; nothing is read until
+# collect(). The filters and the columns the plan needs are then handed to
+# load_table(), which applies them while scanning the Parquet copy (only those
+# columns are read and row groups outside a year range are skipped), so the
+# table is materialized once, already filtered, with no intermediate copies.
+#
+# Columns are referred to through c: c.year_1 is the column 'year-1' (an
+# underscore matches a dash when the table has no column with that exact name).
+#
+# Example:
+#     from corpus_query import c, table
+#     heatmap_data = (table('tfidf_len200')
+#                     .where(c.similarity >= 0.4, c.year_1.between(2021, 2024))
+#                     .groupby_month_pair(2021, 2024)
+#                     .mean('similarity')
+#                     .collect())
+
+# Short names for the tables with long names
+TABLE_ALIASES = {
+    'tfidf': 'tfidf-over-0.3',
+    'tfidf_len100': 'tfidf-over-0.3-len100',
+    'tfidf_len200': 'tfidf-over-0.3-len200',
+    'topics': 'topic-model',
+}
+
+
+class Column:
+    # A column reference; comparisons return conditions for where()
+
+    def __init__(self, name):
+        self.name = name
+
+    def _condition(self, op, value):
+        return Condition([(self.name, op, value)])
+
+    def __eq__(self, value):
+        return self._condition('==', value)
+
+    def __ne__(self, value):
+        return self._condition('!=', value)
+
+    def __lt__(self, value):
+        return self._condition('<', value)
+
+    def __le__(self, value):
+        return self._condition('<=', value)
+
+    def __gt__(self, value):
+        return self._condition('>', value)
+
+    def __ge__(self, value):
+        return self._condition('>=', value)
+
+    __hash__ = object.__hash__
+
+    # Inclusive on both ends, like pandas Series.between
+    def between(self, low, high):
+        return Condition([(self.name, '>=', low), (self.name, '<=', high)])
+
+    def isin(self, values):
+        return self._condition('in', list(values))
+
+    def notin(self, values):
+        return self._condition('not in', list(values))
+
+
+class Condition:
+    # One or more (column, op, value) filters that must all hold
+
+    def __init__(self, filters):
+        self.filters = list(filters)
+
+    def __and__(self, other):
+        return Condition(self.filters + other.filters)
+
+    def __repr__(self):
+        return ' & '.join(f'{column} {op} {value!r}' for column, op, value in self.filters)
+
+
+class _Columns:
+    # c.similarity, c.year_1 or c['year-1']
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Column(name)
+
+    def __getitem__(self, name):
+        return Column(name)
+
+
+c = _Columns()
+
+
+def resolve_table(name, base_dir=DATAFRAMES_DIR):
+    name = TABLE_ALIASES.get(name, name)
+    tables = find_tables(base_dir)
+    if name not in tables and name.replace('_', '-') in tables:
+        name = name.replace('_', '-')
+    if name not in tables:
+        raise KeyError(f"No table called '{name}' in {base_dir}")
+    return name
+
+
+class Query:
+    # A plan: the table, its filters and projection, an optional grouping with
+    # its aggregation, and the sort / limit applied to the result
+
+    def __init__(self, name, base_dir=DATAFRAMES_DIR):
+        self.name = resolve_table(name, base_dir)
+        self.base_dir = base_dir
+        self.filters = []
+        self.columns = None
+        self.group = None
+        self.aggregation = None
+        self.order = None
+        self.limit = None
+        self._table_columns = None
+
+    # Every step returns a new plan, so a base query can be shared
+    def _copy(self, **changes):
+        query = Query.__new__(Query)
+        query.__dict__.update(self.__dict__)
+        query.filters = list(self.filters)
+        query.__dict__.update(changes)
+        return query
+
+    # Column names of the table, read from the csv header once
+    def column_names(self):
+        if self._table_columns is None:
+            self._table_columns = table_columns(self.name, self.base_dir)
+        return list(self._table_columns)
+
+    def _column(self, column):
+        name = column.name if isinstance(column, Column) else column
+        names = self.column_names()
+        if name not in names and name.replace('_', '-') in names:
+            name = name.replace('_', '-')
+        if name not in names:
+            raise KeyError(f"'{self.name}' has no column '{name}'")
+        return name
+
+    def where(self, *conditions):
+        filters = list(self.filters)
+        for condition in conditions:
+            filters.extend((self._column(column), op, value) for column, op, value in condition.filters)
+        return self._copy(filters=filters)
+
+    def select(self, *columns):
+        return self._copy(columns=[self._column(column) for column in columns])
+
+    # Group by columns; follow with count(), sum(), mean(), min() or max()
+    def groupby(self, *columns):
+        return self._copy(group=('columns', [self._column(column) for column in columns]))
+
+    # Group pairs by (month of article 1, month of article 2) into a dense month x
+    # month grid like the similarity heatmaps use; years default to the range in the data
+    def groupby_month_pair(self, start_year=None, end_year=None):
+        keys = [self._column(column) for column in ('year-1', 'month-1', 'year-2', 'month-2')]
+        return self._copy(group=('month-pair', keys, start_year, end_year))
+
+    def _aggregate(self, agg, column=None):
+        if self.group is None:
+            raise ValueError(f'{agg}() needs a groupby first')
+        return self._copy(aggregation=(agg, None if column is None else self._column(column)))
+
+    def count(self):
+        return self._aggregate('count')
+
+    def sum(self, column):
+        return self._aggregate('sum', column)
+
+    def mean(self, column):
+        return self._aggregate('mean', column)
+
+    def min(self, column):
+        return self._aggregate('min', column)
+
+    def max(self, column):
+        return self._aggregate('max', column)
+
+    # Sort rows by columns; a grouped result is sorted by its aggregated values and takes no columns
+    def sort(self, by=None, ascending=True):
+        by = [] if by is None else [by] if isinstance(by, (str, Column)) else list(by)
+        return self._copy(order=([self._column(column) for column in by], ascending))
+
+    def head(self, n):
+        return self._copy(limit=n)
+
+    # Columns that have to be read from storage to answer the plan
+    def needed_columns(self):
+        if self.group is not None:
+            needed = list(self.group[1])
+            if self.aggregation and self.aggregation[1]:
+                needed.append(self.aggregation[1])
+        elif self.columns is not None:
+            needed = list(self.columns)
+        else:
+            return None
+        if self.order and self.group is None:
+            needed += self.order[0]
+        return list(dict.fromkeys(needed))
+
+    def explain(self):
+        lines = [f'scan {self.name}', f'  columns: {self.needed_columns() or "all"}']
+        if self.filters:
+            lines.append(f'  filters: {Condition(self.filters)!r}')
+        if self.group:
+            lines.append(f'group by {self.group[0]} {self.group[1]}')
+        if self.aggregation:
+            lines.append(f'aggregate {self.aggregation[0]} {self.aggregation[1] or ""}'.rstrip())
+        if self.order:
+            lines.append(f'sort by {self.order[0]} ascending={self.order[1]}')
+        if self.limit is not None:
+            lines.append(f'limit {self.limit}')
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f'<Query\n{self.explain()}>'
+
+    # Run the plan and return a DataFrame (or a Series for a grouped aggregation)
+    def collect(self):
+        if self.group is not None and self.aggregation is None:
+            raise ValueError('A grouped query needs an aggregation such as count() or mean()')
+        columns = self.needed_columns()
+        df = load_table(self.name, columns=columns, filters=self.filters or None, base_dir=self.base_dir)
+
+        if self.group is None:
+            result = df
+        elif self.group[0] == 'month-pair':
+            result = self._month_pair(df)
+        else:
+            agg, column = self.aggregation
+            grouped = df.groupby(self.group[1], observed=True, sort=True)
+            result = grouped.size() if agg == 'count' else getattr(grouped[column], agg)()
+
+        if self.order is not None:
+            by, ascending = self.order
+            if self.group is None:
+                result = result.sort_values(by, ascending=ascending, kind='mergesort', ignore_index=True)
+                if self.columns is not None:
+                    result = result[self.columns]
+            else:
+                result = result.sort_values(ascending=ascending, kind='mergesort')
+        if self.limit is not None:
+            result = result.head(self.limit)
+        return result
+
+    def _month_pair(self, df):
+        agg, column = self.aggregation
+        if agg not in ('count', 'sum', 'mean'):
+            raise ValueError('groupby_month_pair() supports count(), sum() and mean()')
+        _, (year_1, _, year_2, _), start_year, end_year = self.group
+        if start_year is None or end_year is None:
+            years = np.concatenate([df[year_1].to_numpy(), df[year_2].to_numpy()])
+            if not len(years):
+                # no rows to take the years from: an empty matrix, or the months of the one year given
+                if start_year is None and end_year is None:
+                    return pd.DataFrame(dtype=np.float64)
+                start_year = end_year if start_year is None else start_year
+                end_year = start_year if end_year is None else end_year
+            start_year = int(years.min()) if start_year is None else start_year
+            end_year = int(years.max()) if end_year is None else end_year
+        return monthly_pair_matrix(df, start_year, end_year, value=column, agg=agg)
+
+
+def table(name, base_dir=DATAFRAMES_DIR):
+    return Query(name, base_dir)
@@ -0,0 +1,175 @@
+import os
+from collections import namedtuple
+
+# Shared reader for the article corpus.
+# Every article in data/articles is named 'YYYY-MM-DD_ID.txt' and holds the title,
+# a line of dashes and then the body text. Instead of each script looping over the
+# folder on its own, the scanner reads every file once and hands the parsed record
+# to all the consumers that were registered, so several summaries share one pass.
+# Scripts that only need the date or id of the articles (e.g. counting articles
+# per year) should use list_article_files() instead, which lists the folder
+# without opening any file.
+#
+# Example:
+#     texts = TextCollector()
+#     scanner = CorpusScanner()
+#     scanner.add_consumer(lambda article: lengths.append(article.length))
+#     scanner.add_consumer(texts)                  # filenames and texts for TF-IDF
+#     scanner.run()
+#
+#     years = [parsed[0] for _, _, parsed in list_article_files()]
+
+# Paths are worked out from this file so the module can be imported from any folder
+DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+ARTICLES_DIR = os.path.join(DATA_DIR, 'articles')
+DATAFRAMES_DIR = os.path.join(DATA_DIR, 'dataframes')
+
+# The title is separated from the body by a line of dashes
+TITLE_SEPARATOR = '\n-----'
+
+# One record per article; text is the raw file content and length is the number
+# of whitespace separated tokens in it (the same count used for length.csv)
+Article = namedtuple('Article', ['filename', 'article_id', 'year', 'month', 'day',
+                                 'title', 'body', 'text', 'length'])
+
+
+# Split 'YYYY-MM-DD_ID.txt' into (year, month, day, id), or None for other files
+def parse_filename(filename):
+    if not filename.endswith('.txt'):
+        return None
+    stem = filename[:-4]
+    date, sep, article_id = stem.partition('_')
+    parts = date.split('-')
+    if not sep or len(parts) != 3:
+        return None
+    try:
+        year, month, day = (int(part) for part in parts)
+        return year, month, day, int(article_id)
+    except ValueError:
+        return None
+
+
+# Split the raw text of an article into its title and body
+def split_article(text):
+    title, sep, body = text.partition(TITLE_SEPARATOR)
+    if not sep:
+        return '', text.strip()
+    # drop the rest of the dashes line before the body starts
+    body = body.lstrip('-')
+    return title.strip(), body.strip()
+
+
+# Turn the raw text of one file into an Article record
+def make_article(filename, text, parsed=None):
+    if parsed is None:
+        parsed = parse_filename(filename)
+    year, month, day, article_id = parsed
+    title, body = split_article(text)
+    return Article(filename, article_id, year, month, day, title, body, text, len(text.split()))
+
+
+# List the article files in the folder (a single os.scandir call), sorted by name
+def list_article_files(folder=ARTICLES_DIR):
+    entries = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            parsed = parse_filename(entry.name)
+            if parsed is not None:
+                entries.append((entry.name, entry.path, parsed))
+    entries.sort()
+    return entries
+
+
+# Yield an Article for every file in the folder
+def iter_articles(folder=ARTICLES_DIR):
+    for filename, path, parsed in list_article_files(folder):
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        yield make_article(filename, text, parsed)
+
+
+# Yield an Article for every file in the folder, in the same order as
+# iter_articles, read from the memory-mapped packed copy of the folder
+# (packed_corpus.py). The folder is packed again first when a file changed.
+def iter_packed_articles(folder=ARTICLES_DIR):
+    from packed_corpus import load_packed_corpus
+    with load_packed_corpus(folder) as corpus:
+        yield from corpus.iter_articles()
+
+
+class CorpusScanner:
+    # Reads the corpus once and feeds every article to all registered consumers.
+    # A consumer is any callable taking an Article; if it also has a finish()
+    # method, that is called once the scan is done. With packed=True the articles
+    # come from the packed copy of the folder instead of the individual files.
+
+    def __init__(self, folder=ARTICLES_DIR, packed=False):
+        self.folder = folder
+        self.packed = packed
+        self.consumers = []
+
+    def add_consumer(self, consumer):
+        self.consumers.append(consumer)
+        return consumer
+
+    def run(self):
+        count = 0
+        articles = iter_packed_articles(self.folder) if self.packed else iter_articles(self.folder)
+        for article in articles:
+            for consumer in self.consumers:
+                consumer(article)
+            count += 1
+        for consumer in self.consumers:
+            finish = getattr(consumer, 'finish', None)
+            if finish is not None:
+                finish()
+        return count
+
+
+# Ready-made consumer: collects the word count of every article grouped by year
+class LengthsByYear:
+
+    def __init__(self):
+        self.lengths = {}
+
+    def __call__(self, article):
+        self.lengths.setdefault(article.year, []).append(article.length)
+
+
+# Ready-made consumer: counts the articles published in each year
+class CountByYear:
+
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, article):
+        self.counts[article.year] = self.counts.get(article.year, 0) + 1
+
+
+# Ready-made consumer: keeps the full text of every article (e.g. for TF-IDF)
+class TextCollector:
+
+    def __init__(self):
+        self.filenames = []
+        self.documents = []
+
+    def __call__(self, article):
+        self.filenames.append(article.filename)
+        self.documents.append(article.text)
+
+
+if __name__ == '__main__':
+    # Quick summary of the corpus using a single pass
+    lengths = LengthsByYear()
+    counts = CountByYear()
+    scanner = CorpusScanner()
+    scanner.add_consumer(lengths)
+    scanner.add_consumer(counts)
+    total = scanner.run()
+
+    print('Articles read:', total)
+    for year in sorted(counts.counts):
+        year_lengths = lengths.lengths[year]
+        print(year, counts.counts[year], 'articles,', min(year_lengths), '-', max(year_lengths), 'words')
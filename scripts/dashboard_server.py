@@ -0,0 +1,465 @@
+import argparse
+import asyncio
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+from article_catalog import load_catalog
+from columnar_store import find_tables, load_table
+from corpus_reader import DATAFRAMES_DIR
+from ngram_topk import ALL_YEARS, TopNgramCache
+from pair_aggregation import monthly_pair_matrix
+from pair_index import load_pair_index
+from topic_cube import load_topic_cube
+
+# Local HTTP server for interactive corpus dashboards.
+# The tables of data/dataframes and the indexes built from them (the top n-gram
+# cache, the topic cube, the pair index, the article catalog and the length
+# statistics) are loaded the first time an endpoint needs them and then stay in
+# memory, so changing a filter on the dashboard is one small JSON request
+# instead of a script re-run.
+# The server runs on asyncio.start_server; the handlers run in a thread pool so
+# a slow first load does not hold up the other requests.
+#
+# Endpoints (GET, JSON):
+#     /api/tables                                       tables found in data/dataframes
+#     /api/ngrams?n=1&period=2023-10&k=10&exclude=gaza  top n-grams of 'all', a year or YYYY-MM
+#     /api/length?level=year&start=2021&end=2024        length statistics per year or year-month
+#     /api/length/histogram?level=year&period=2023      length histogram of a period
+#     /api/topics/top?k=10                              largest topics with their labels
+#     /api/topics/trend?topic=0&topic=3                 articles per month of some topics
+#     /api/topics/themes                                articles per month of every theme
+#     /api/neighbours?file=2023-10-20_2976.txt&k=20     most similar articles of a pair table
+#     /api/articles?start=2023-10-07&end=2023-10-31     articles published in a date range
+#     /api/heatmap?start=2021&end=2024&min=0.4&max=0.9  mean similarity per month pair
+# The pair endpoints take table=tfidf-over-0.3-len100 etc. (default PAIR_TABLE).
+# / is a dashboard page that draws these endpoints with plotly.js.
+#
+# Usage (from the scripts folder):
+#     python dashboard_server.py                  # then open http://127.0.0.1:8050
+#     python dashboard_server.py --port 9000 --preload
+
+HOST = '127.0.0.1'
+
+PORT = 8050
+
+PAIR_TABLE = 'tfidf-over-0.3-len200'
+
+PAIR_COLUMNS = ['year-1', 'month-1', 'year-2', 'month-2', 'similarity']
+
+
+# DataFrame rows as a list of dicts with Python values and None for missing values
+def records(df):
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _floats(values):
+    return [None if np.isnan(value) else value for value in np.asarray(values, dtype=np.float64).tolist()]
+
+
+class CorpusData:
+    # Tables and indexes behind the endpoints, each loaded once on first use
+
+    def __init__(self, base_dir=DATAFRAMES_DIR):
+        self.base_dir = base_dir
+        self.tables = find_tables(base_dir)
+        self._loaded = {}
+        # one lock per key, so a slow load only holds up the requests that need the same thing
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _get(self, key, load):
+        loaded = self._loaded.get(key)
+        if loaded is not None:
+            return loaded
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._loaded:
+                self._loaded[key] = load()
+            return self._loaded[key]
+
+    def _table(self, name, columns=None):
+        if name not in self.tables:
+            raise KeyError(f'No table {name}')
+        # untyped, so the float columns keep the float64 values of the csv
+        return self._get(('table', name), lambda: load_table(name, columns=columns, typed=False,
+                                                             base_dir=self.base_dir))
+
+    def _pair_table(self, table):
+        if not table.startswith('tfidf') or table not in self.tables:
+            raise KeyError(f'No pair table {table}')
+        return table
+
+    def ngram_cache(self):
+        def load():
+            cache = TopNgramCache(base_dir=self.base_dir)
+            cache.refresh()
+            return cache
+        return self._get('ngrams', load)
+
+    def cube(self):
+        return self._get('cube', lambda: load_topic_cube(base_dir=self.base_dir))
+
+    def titles(self):
+        def load():
+            df = load_table('title', columns=['file', 'title'], base_dir=self.base_dir)
+            return pd.Series(df['title'].astype(str).to_numpy(), index=df['file'].astype(str).to_numpy())
+        return self._get('titles', load)
+
+    def catalog(self):
+        return self._get('catalog', lambda: load_catalog(base_dir=self.base_dir))
+
+    def pair_index(self, table):
+        return self._get(('pair-index', table), lambda: load_pair_index(self._pair_table(table), self.base_dir))
+
+    # Month and similarity columns of a pair table as numpy arrays
+    def pair_columns(self, table):
+        def load():
+            df = load_table(self._pair_table(table), columns=PAIR_COLUMNS, base_dir=self.base_dir)
+            return {column: df[column].to_numpy() for column in PAIR_COLUMNS}
+        return self._get(('pair-columns', table), load)
+
+    def list_tables(self):
+        return {'tables': sorted(self.tables)}
+
+    def ngrams(self, n=1, period=ALL_YEARS, k=10, exclude=()):
+        top = self.ngram_cache().top(n, period, k, set(exclude))
+        return {'n': n, 'period': period, 'ngrams': top.index.tolist(), 'counts': top.tolist()}
+
+    def periods(self, n=1):
+        return {'n': n, 'periods': [period if isinstance(period, (str, int)) else f'{period[0]}-{period[1]:02d}'
+                                    for period in self.ngram_cache().periods(n)]}
+
+    def length_stats(self, level='year', start=None, end=None):
+        df = self._table(f'length-stats-{level}')
+        if start is not None:
+            df = df[df['year'] >= start]
+        if end is not None:
+            df = df[df['year'] <= end]
+        return {'level': level, 'rows': records(df)}
+
+    def length_histogram(self, level='year', period=None):
+        df = self._table(f'length-histogram-{level}')
+        if period is not None:
+            parts = [int(part) for part in str(period).split('-')]
+            mask = df['year'] == parts[0]
+            if len(parts) > 1:
+                mask &= df['month'] == parts[1]
+            df = df[mask]
+            df = df.groupby(['bin-start', 'bin-end'], as_index=False)['articles'].sum()
+        return {'level': level, 'period': period, 'rows': records(df)}
+
+    def topic_top(self, k=10):
+        cube = self.cube()
+        top = cube.top(k)
+        return {'topics': [{'topic': topic, 'label': cube.label(topic), 'theme': cube.themes.loc[topic],
+                            'count': count} for topic, count in zip(top.index.tolist(), top.tolist())]}
+
+    def topic_trend(self, topics=None, k=5):
+        cube = self.cube()
+        topics = cube.top(k).index.tolist() if not topics else topics
+        return {'months': cube.labels(),
+                'series': [{'topic': topic, 'label': cube.label(topic), 'counts': cube.sparkline(topic).tolist()}
+                           for topic in topics]}
+
+    def theme_trend(self):
+        matrix = self.cube().theme_matrix()
+        return {'months': matrix.columns.tolist(),
+                'series': [{'theme': theme, 'counts': row.tolist()} for theme, row in matrix.iterrows()]}
+
+    def neighbours(self, file, table=PAIR_TABLE, k=20, min_similarity=0.0):
+        result = self.pair_index(table).neighbours(file)
+        result = result[result['similarity'] >= min_similarity].head(k)
+        # the index keeps float32 similarities; 6 decimals is all they hold
+        result['similarity'] = result['similarity'].astype(np.float64).round(6)
+        result.insert(1, 'title', self.titles().reindex(result['filename']).to_numpy())
+        return {'file': file, 'title': self.titles().get(file), 'table': table, 'rows': records(result)}
+
+    def articles(self, start, end=None, limit=1000):
+        if not start:
+            raise ValueError('start is required')
+        catalog = self.catalog()
+        first, last = catalog.positions_between(start, end or start)
+        rows = catalog.frame(slice(first, min(last, first + limit)))
+        rows['date'] = rows['date'].dt.strftime('%Y-%m-%d')
+        return {'start': start, 'end': end or start, 'total': last - first,
+                'rows': records(rows[['date', 'file', 'title']])}
+
+    def heatmap(self, table=PAIR_TABLE, start=2021, end=2024, low=0.0, high=1.0, agg='mean'):
+        if agg not in ('mean', 'sum', 'count'):
+            raise ValueError(f'Unknown aggregation {agg}')
+        columns = self.pair_columns(table)
+        mask = (columns['similarity'] >= low) & (columns['similarity'] <= high)
+        matrix = monthly_pair_matrix({column: values[mask] for column, values in columns.items()},
+                                     start, end, agg=agg)
+        return {'table': table, 'agg': agg, 'months': matrix.columns.tolist(),
+                'z': [_floats(row) for row in matrix.to_numpy()]}
+
+    # Load everything up front instead of on the first request
+    def preload(self):
+        self.ngram_cache()
+        self.cube()
+        self.titles()
+        self.catalog()
+        for level in ('year', 'year-month'):
+            self._table(f'length-stats-{level}')
+            self._table(f'length-histogram-{level}')
+        if PAIR_TABLE in self.tables:
+            self.pair_index(PAIR_TABLE)
+            self.pair_columns(PAIR_TABLE)
+
+
+def _one(query, name, default=None, convert=str):
+    values = query.get(name)
+    if not values or values[0] == '':
+        return default
+    try:
+        return convert(values[0])
+    except ValueError:
+        raise ValueError(f'Bad value for {name}: {values[0]!r}')
+
+
+def _many(query, name, convert=str):
+    return [convert(value) for values in query.get(name, []) for value in values.split(',') if value]
+
+
+# path -> function(data, query) returning the JSON response
+ROUTES = {
+    '/api/tables': lambda data, q: data.list_tables(),
+    '/api/ngrams': lambda data, q: data.ngrams(_one(q, 'n', 1, int), _one(q, 'period', ALL_YEARS),
+                                               _one(q, 'k', 10, int), _many(q, 'exclude')),
+    '/api/ngrams/periods': lambda data, q: data.periods(_one(q, 'n', 1, int)),
+    '/api/length': lambda data, q: data.length_stats(_one(q, 'level', 'year'), _one(q, 'start', None, int),
+                                                     _one(q, 'end', None, int)),
+    '/api/length/histogram': lambda data, q: data.length_histogram(_one(q, 'level', 'year'), _one(q, 'period')),
+    '/api/topics/top': lambda data, q: data.topic_top(_one(q, 'k', 10, int)),
+    '/api/topics/trend': lambda data, q: data.topic_trend(_many(q, 'topic', int), _one(q, 'k', 5, int)),
+    '/api/topics/themes': lambda data, q: data.theme_trend(),
+    '/api/neighbours': lambda data, q: data.neighbours(_one(q, 'file', ''), _one(q, 'table', PAIR_TABLE),
+                                                       _one(q, 'k', 20, int), _one(q, 'min', 0.0, float)),
+    '/api/articles': lambda data, q: data.articles(_one(q, 'start'), _one(q, 'end'), _one(q, 'limit', 1000, int)),
+    '/api/heatmap': lambda data, q: data.heatmap(_one(q, 'table', PAIR_TABLE), _one(q, 'start', 2021, int),
+                                                 _one(q, 'end', 2024, int), _one(q, 'min', 0.0, float),
+                                                 _one(q, 'max', 1.0, float), _one(q, 'agg', 'mean')),
+}
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+
+class DashboardServer:
+
+    def __init__(self, data=None):
+        self.data = CorpusData() if data is None else data
+        self._plotlyjs = None
+
+    # (status, content type, body bytes) for a GET of target
+    def respond(self, target):
+        url = urlsplit(target)
+        if url.path in ('/', '/index.html'):
+            return 200, 'text/html; charset=utf-8', DASHBOARD_HTML.encode('utf-8')
+        if url.path == '/plotly.min.js':
+            if self._plotlyjs is None:
+                self._plotlyjs = get_plotlyjs().encode('utf-8')
+            return 200, 'application/javascript', self._plotlyjs
+        route = ROUTES.get(url.path)
+        if route is None:
+            return _error(404, f'No endpoint {url.path}')
+        try:
+            result = route(self.data, parse_qs(url.query))
+        except KeyError as e:
+            return _error(404, e.args[0] if e.args else str(e))
+        except ValueError as e:
+            return _error(400, str(e))
+        return 200, 'application/json', json.dumps(result).encode('utf-8')
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            if len(request_line) != 3:
+                status, content_type, body = _error(400, 'Bad request line')
+            elif request_line[0] != 'GET':
+                status, content_type, body = _error(405, 'Only GET is supported')
+            else:
+                loop = asyncio.get_running_loop()
+                try:
+                    status, content_type, body = await loop.run_in_executor(None, self.respond, request_line[1])
+                except Exception as e:
+                    status, content_type, body = _error(500, f'{type(e).__name__}: {e}')
+            head = (f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: {content_type}\r\n'
+                    f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n')
+            writer.write(head.encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def _error(status, message):
+    return status, 'application/json', json.dumps({'error': message}).encode('utf-8')
+
+
+DASHBOARD_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Corpus dashboard</title>
+<script src="/plotly.min.js"></script>
+<style>
+body { font-family: sans-serif; margin: 20px; }
+section { margin-bottom: 30px; }
+label { margin-right: 12px; }
+input { width: 90px; }
+.chart { height: 420px; }
+</style>
+</head>
+<body>
+<h1>Corpus dashboard</h1>
+
+<section>
+<h2>Top n-grams</h2>
+<label>n <input id="ngram-n" type="number" value="1" min="1" max="3"></label>
+<label>period <input id="ngram-period" value="all"></label>
+<label>k <input id="ngram-k" type="number" value="10" min="1"></label>
+<label>exclude <input id="ngram-exclude" style="width: 200px"></label>
+<div id="ngrams" class="chart"></div>
+</section>
+
+<section>
+<h2>Article length</h2>
+<label>level <select id="length-level"><option>year</option><option>year-month</option></select></label>
+<label>histogram period <input id="length-period" value="2023"></label>
+<div id="length" class="chart"></div>
+<div id="length-histogram" class="chart"></div>
+</section>
+
+<section>
+<h2>Topics</h2>
+<label>top k <input id="topic-k" type="number" value="5" min="1"></label>
+<div id="topic-trend" class="chart"></div>
+<div id="themes" class="chart"></div>
+</section>
+
+<section>
+<h2>Monthly similarity</h2>
+<label>table <input id="heat-table" value="tfidf-over-0.3-len200" style="width: 200px"></label>
+<label>from <input id="heat-start" type="number" value="2021"></label>
+<label>to <input id="heat-end" type="number" value="2024"></label>
+<label>min <input id="heat-min" type="number" value="0.4" step="0.05"></label>
+<label>max <input id="heat-max" type="number" value="0.9" step="0.05"></label>
+<div id="heatmap" class="chart" style="height: 800px"></div>
+</section>
+
+<section>
+<h2>Similar articles</h2>
+<label>file <input id="neighbour-file" value="2023-10-20_2976.txt" style="width: 200px"></label>
+<label>min <input id="neighbour-min" type="number" value="0.3" step="0.05"></label>
+<table id="neighbours"></table>
+</section>
+
+<script>
+const value = id => document.getElementById(id).value;
+
+async function api(path, params) {
+  const response = await fetch(path + '?' + new URLSearchParams(params));
+  const result = await response.json();
+  if (!response.ok) throw new Error(result.error);
+  return result;
+}
+
+function show(id, promise) {
+  promise.catch(error => { document.getElementById(id).textContent = error.message; });
+}
+
+function drawNgrams() {
+  show('ngrams', api('/api/ngrams', {n: value('ngram-n'), period: value('ngram-period'), k: value('ngram-k'),
+                                     exclude: value('ngram-exclude')}).then(r => Plotly.react('ngrams',
+    [{type: 'bar', x: r.counts.slice().reverse(), y: r.ngrams.slice().reverse(), orientation: 'h'}],
+    {title: `Top ${r.n}-grams (${r.period})`, margin: {l: 160}})));
+}
+
+function drawLength() {
+  const level = value('length-level');
+  show('length', api('/api/length', {level: level}).then(r => {
+    const x = r.rows.map(row => level === 'year' ? row.year : `${row.year}-${String(row.month).padStart(2, '0')}`);
+    const line = (column, name) => ({type: 'scatter', x: x, y: r.rows.map(row => row[column]), name: name});
+    Plotly.react('length', [line('length-mean', 'mean'), line('length-median', 'median'),
+                            line('length-p90', '90th percentile')], {title: 'Words per article'});
+  }));
+  show('length-histogram', api('/api/length/histogram', {level: level, period: value('length-period')}).then(r =>
+    Plotly.react('length-histogram', [{type: 'bar', x: r.rows.map(row => (row['bin-start'] + row['bin-end']) / 2),
+                                       y: r.rows.map(row => row.articles)}],
+                 {title: `Length distribution (${r.period})`, bargap: 0.05})));
+}
+
+function drawTopics() {
+  show('topic-trend', api('/api/topics/trend', {k: value('topic-k')}).then(r => Plotly.react('topic-trend',
+    r.series.map(s => ({type: 'scatter', x: r.months, y: s.counts, name: s.label})),
+    {title: 'Articles per month of the largest topics'})));
+  show('themes', api('/api/topics/themes', {}).then(r => Plotly.react('themes',
+    r.series.map(s => ({type: 'bar', x: r.months, y: s.counts, name: s.theme})),
+    {title: 'Articles per month by theme', barmode: 'stack'})));
+}
+
+function drawHeatmap() {
+  show('heatmap', api('/api/heatmap', {table: value('heat-table'), start: value('heat-start'),
+                                       end: value('heat-end'), min: value('heat-min'),
+                                       max: value('heat-max')}).then(r => Plotly.react('heatmap',
+    [{type: 'heatmap', x: r.months, y: r.months, z: r.z, colorscale: 'RdYlBu', reversescale: true}],
+    {title: 'Mean similarity per month pair', yaxis: {autorange: 'reversed'}})));
+}
+
+function drawNeighbours() {
+  show('neighbours', api('/api/neighbours', {file: value('neighbour-file'), table: value('heat-table'),
+                                             min: value('neighbour-min')}).then(r => {
+    const table = document.getElementById('neighbours');
+    table.innerHTML = '<tr><th>similarity</th><th>file</th><th>title</th></tr>';
+    for (const row of r.rows) {
+      const tr = table.insertRow();
+      for (const text of [row.similarity.toFixed(3), row.filename, row.title || '']) {
+        tr.insertCell().textContent = text;
+      }
+    }
+  }));
+}
+
+const redraw = {'ngram': drawNgrams, 'length': drawLength, 'topic': drawTopics, 'heat': drawHeatmap,
+                'neighbour': drawNeighbours};
+document.querySelectorAll('input, select').forEach(input => input.addEventListener('change', () => {
+  redraw[input.id.split('-')[0]]();
+}));
+Object.values(redraw).forEach(draw => draw());
+</script>
+</body>
+</html>
+'''
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the corpus tables as JSON endpoints and a dashboard page')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--preload', action='store_true', help='load every table and index before serving')
+    args = parser.parse_args()
+
+    data = CorpusData()
+    if args.preload:
+        data.preload()
+    print(f'Serving the dashboard on http://{args.host}:{args.port}')
+    try:
+        asyncio.run(DashboardServer(data).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+from corpus_reader import ARTICLES_DIR, DATA_DIR, list_article_files, make_article
+
+# Sentence embeddings of the articles, cached by content.
+# topic-model.csv was made with BERTopic on all-MiniLM-L6-v2 embeddings
+# (sequence length 512). Embedding the corpus is by far the slowest part of a
+# refit, so the vectors are kept on disk: one float16 row per distinct article
+# text in vectors.bin (read back as a numpy.memmap) and an index mapping the
+# sha1 of the text to its row. Every filename also remembers the mtime, size
+# and sha1 of the file it was read from, so an update only reads the files that
+# changed and only embeds texts the cache has not seen before.
+#
+# Texts to embed are sorted by length and cut into batches, so the documents of
+# a batch have similar lengths and the model pads them as little as possible.
+# The model runs on the CPU.
+#
+# Example:
+#     cache = EmbeddingCache()
+#     cache.update()                              # embed new or changed articles
+#     filenames, vectors = cache.vectors()        # float32 array, one row per article
+#     cache.update(embed=my_model.encode)         # any callable: list of texts -> 2-D array
+#
+# Usage (from the scripts folder):
+#     python embedding_cache.py --batch-size 32
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+MAX_SEQ_LENGTH = 512
+
+BATCH_SIZE = 32
+
+EMBEDDINGS_DIR = os.path.join(DATA_DIR, 'cache', 'embeddings')
+
+
+def text_sha1(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+# Embedding function of a sentence-transformers model, loaded on first use.
+# sentence-transformers is only needed when something has to be embedded.
+def sentence_transformer(model_name=MODEL_NAME, max_seq_length=MAX_SEQ_LENGTH, batch_size=BATCH_SIZE):
+    model = None
+
+    def embed(texts):
+        nonlocal model
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name, device='cpu')
+            model.max_seq_length = max_seq_length
+        return model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+    return embed
+
+
+# Split positions 0..len(lengths)-1 into batches of documents of similar length
+def length_sorted_batches(lengths, batch_size=BATCH_SIZE):
+    order = np.argsort(np.asarray(lengths), kind='stable')
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class EmbeddingCache:
+
+    def __init__(self, model_name=MODEL_NAME, directory=None):
+        self.model_name = model_name
+        self.directory = directory or os.path.join(EMBEDDINGS_DIR, model_name)
+        self.index_path = os.path.join(self.directory, 'index.pkl')
+        self.vectors_path = os.path.join(self.directory, 'vectors.bin')
+        # dim: vector size; keys: sha1 -> row; files: filename -> (mtime_ns, size, sha1)
+        self.index = {'model': model_name, 'dim': None, 'keys': {}, 'files': {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                self.index = pickle.load(f)
+
+    def __len__(self):
+        return len(self.index['keys'])
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+
+    # All stored rows as a read-only float16 memmap
+    def matrix(self):
+        rows, dim = len(self), self.index['dim']
+        if not rows:
+            return np.empty((0, dim or 0), dtype=np.float16)
+        return np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(rows, dim))
+
+    # Append new rows; rows written by a run that stopped before saving the index are overwritten
+    def _append(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if self.index['dim'] is None:
+            self.index['dim'] = vectors.shape[1]
+        elif vectors.shape[1] != self.index['dim']:
+            raise ValueError(f"Expected {self.index['dim']} dimensions, got {vectors.shape[1]}")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(len(self) * self.index['dim'] * 2)
+            f.seek(0, os.SEEK_END)
+            f.write(vectors.tobytes())
+
+    # Bring the cache up to date with the folder and return what was done.
+    # embed is a callable taking a list of texts and returning one row per text
+    # (default: the sentence-transformers model). Texts are embedded batch by
+    # batch and written straight away, so an interrupted run keeps its work.
+    def update(self, folder=ARTICLES_DIR, embed=None, batch_size=BATCH_SIZE):
+        old_files = self.index['files']
+        files = {}
+        pending = {}
+        summary = {'unchanged': 0, 'reused': 0, 'embedded': 0, 'removed': 0}
+        for filename, path, parsed in list_article_files(folder):
+            stat = os.stat(path)
+            old = old_files.get(filename)
+            if old and old[:2] == (stat.st_mtime_ns, stat.st_size) and old[2] in self.index['keys']:
+                files[filename] = old
+                summary['unchanged'] += 1
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            sha1 = text_sha1(text)
+            files[filename] = (stat.st_mtime_ns, stat.st_size, sha1)
+            if sha1 in self.index['keys']:
+                summary['reused'] += 1
+            elif sha1 not in pending:
+                pending[sha1] = embedding_text(make_article(filename, text, parsed))
+        summary['removed'] = len(set(old_files) - set(files))
+
+        if pending:
+            embed = embed or sentence_transformer(self.model_name, batch_size=batch_size)
+            keys = list(pending)
+            texts = [pending[key] for key in keys]
+            for batch in length_sorted_batches([len(text) for text in texts], batch_size):
+                vectors = embed([texts[i] for i in batch])
+                self._append(vectors)
+                for i in batch:
+                    self.index['keys'][keys[i]] = len(self.index['keys'])
+                self.save()
+                summary['embedded'] += len(batch)
+
+        self.index['files'] = files
+        self.save()
+        return summary
+
+    # (filenames, float32 vectors) of the articles in the cache, sorted by filename
+    def vectors(self, filenames=None):
+        files = self.index['files']
+        filenames = sorted(files) if filenames is None else list(filenames)
+        rows = np.array([self.index['keys'][files[filename][2]] for filename in filenames], dtype=np.int64)
+        return filenames, np.asarray(self.matrix()[rows], dtype=np.float32)
+
+
+# The text given to the model for an article: the title and the body
+def embedding_text(article):
+    return f'{article.title}\n{article.body}' if article.title else article.body
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Embed new or changed articles into the embedding cache')
+    parser.add_argument('--model', default=MODEL_NAME, help='sentence-transformers model name')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--folder', default=ARTICLES_DIR)
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.model)
+    summary = cache.update(args.folder, batch_size=args.batch_size)
+    print(f"{summary['embedded']} embedded, {summary['reused']} reused, {summary['unchanged']} unchanged, "
+          f"{summary['removed']} removed; {len(cache)} vectors of {cache.index['dim']} dimensions")
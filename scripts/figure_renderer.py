@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import plotly
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+# Writes plotly figures as small html files that share one copy of plotly.js.
+# fig.write_html() puts the whole plotly.js library (about 3.5 MB) into every
+# file. Here the library is written once per output folder as plotly.min.js and
+# every html file only links to it, so a chart is a few kB.
+#
+# The sha1 of every figure's JSON (its data and layout) is kept in
+# figure-hashes.json in the output folder. A figure whose JSON did not change
+# since the last run is not written again, so re-running a script whose data is
+# the same touches no files. The figures that did change are rendered in a
+# thread pool.
+#
+# Example:
+#     write_figures({'avg-length.html': fig1, 'total-length.html': fig2})
+#     write_figures({'avg-length.html': fig1}, output_dir='report', formats=('html', 'json'))
+
+PLOTLYJS_NAME = 'plotly.min.js'
+
+MANIFEST_NAME = 'figure-hashes.json'
+
+
+def figure_hash(spec):
+    return hashlib.sha1(f'{plotly.__version__}\n{spec}'.encode('utf-8')).hexdigest()
+
+
+def _write_text(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class FigureRenderer:
+
+    def __init__(self, output_dir='.', workers=None, formats=('html',)):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.formats = tuple(formats)
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    # Write plotly.min.js next to the figures unless this plotly version's copy is already there
+    def write_plotlyjs(self):
+        path = os.path.join(self.output_dir, PLOTLYJS_NAME)
+        if os.path.exists(path) and self.manifest.get(PLOTLYJS_NAME) == plotly.__version__:
+            return False
+        _write_text(path, get_plotlyjs())
+        self.manifest[PLOTLYJS_NAME] = plotly.__version__
+        return True
+
+    # Output paths of a figure for every format: 'chart.html' -> chart.html, chart.json
+    def _paths(self, filename):
+        stem = filename[:-5] if filename.endswith('.html') else filename
+        return {fmt: os.path.join(self.output_dir, f'{stem}.{fmt}') for fmt in self.formats}
+
+    def _render(self, fig, spec, paths):
+        for fmt, path in paths.items():
+            if fmt == 'html':
+                _write_text(path, pio.to_html(fig, include_plotlyjs=PLOTLYJS_NAME, full_html=True))
+            else:
+                _write_text(path, spec)
+
+    # Write the figures of {filename: figure} whose content changed; returns the filenames written
+    def write(self, figures):
+        os.makedirs(self.output_dir, exist_ok=True)
+        if 'html' in self.formats:
+            self.write_plotlyjs()
+
+        jobs = []
+        for filename, fig in figures.items():
+            spec = fig.to_json()
+            digest = figure_hash(spec + repr(self.formats))
+            paths = self._paths(filename)
+            if self.manifest.get(filename) == digest and all(os.path.exists(path) for path in paths.values()):
+                continue
+            jobs.append((filename, fig, spec, paths, digest))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(lambda job: self._render(job[1], job[2], job[3]), jobs))
+        for filename, _, _, _, digest in jobs:
+            self.manifest[filename] = digest
+        _write_text(self.manifest_path, json.dumps(self.manifest, indent=1, sort_keys=True))
+        return [job[0] for job in jobs]
+
+
+# Write {filename: figure} into output_dir, skipping the ones that did not change
+def write_figures(figures, output_dir='.', workers=None, formats=('html',)):
+    return FigureRenderer(output_dir, workers, formats).write(figures)
@@ -0,0 +1,270 @@
+import argparse
+import os
+import pickle
+from collections import Counter
+
+import pandas as pd
+
+from build_dataframes import TableBuilder, ngram_table_path, table_path
+from columnar_store import write_table
+from corpus_reader import ARTICLES_DIR, DATA_DIR, DATAFRAMES_DIR, list_article_files
+from length_stats import write_length_stats
+from parallel_tokenize import tokenize_files
+
+# Incremental rebuild of the derived dataframes.
+# A build manifest keeps the mtime, size and sha1 of every article plus what
+# that article contributed to the tables (length, title and n-gram counts).
+# On the next run only new, changed or deleted articles are tokenized, and their
+# old contribution is subtracted from / new contribution added to the year and
+# year-month tables instead of recounting the whole corpus.
+# The first run (or --full) does a complete rebuild and writes the manifest.
+#
+# Usage (from the scripts folder):
+#     python incremental_build.py            # patch the tables with today's articles
+#     python incremental_build.py --full     # rebuild everything from scratch
+
+BUILD_DIR = os.path.join(DATA_DIR, 'cache', 'build')
+MANIFEST_PATH = os.path.join(BUILD_DIR, 'manifest.pkl')
+
+TITLE_COLUMNS = ['year', 'month', 'day', 'title', 'length', 'file']
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(manifest, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+# n sizes that already have a year table in data/dataframes
+def existing_ngram_sizes(base_dir=DATAFRAMES_DIR):
+    return tuple(n for n in (1, 2, 3) if os.path.exists(ngram_table_path(n, 'year', base_dir)))
+
+
+# Split the article files into (unchanged, to_check, removed) against the manifest.
+# Files whose mtime and size match are trusted without reading them.
+def diff_articles(entries, manifest):
+    files = manifest['files'] if manifest else {}
+    unchanged = {}
+    to_check = []
+    for filename, path, parsed in entries:
+        stat = os.stat(path)
+        known = files.get(filename)
+        if known and known['mtime'] == stat.st_mtime_ns and known['size'] == stat.st_size:
+            unchanged[filename] = known
+        else:
+            to_check.append((filename, path, parsed))
+    present = {filename for filename, _, _ in entries}
+    removed = [filename for filename in files if filename not in present]
+    return unchanged, to_check, removed
+
+
+def _file_record(path, result):
+    stat = os.stat(path)
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': result.sha1, 'result': result}
+
+
+def title_table(results):
+    rows = []
+    for result in results:
+        year, month, day, _ = result.parsed
+        rows.append((year, month, day, result.title, result.body_length, result.filename))
+    table = pd.DataFrame(rows, columns=TITLE_COLUMNS)
+    return table.sort_values('length', kind='mergesort')
+
+
+# Add up the contribution of the changed articles; sign is +1 for added and -1 for removed.
+# The keys are strings written like the tables: zero padded months in the length
+# tables, plain months in the n-gram tables.
+def _length_delta(changes, keys):
+    rows = []
+    for sign, result in changes:
+        year, month, _, _ = result.parsed
+        rows.append((str(year), f'{month:02d}', sign * result.length, sign))
+    delta = pd.DataFrame(rows, columns=['year', 'month', 'delta-sum', 'delta-n'])
+    return delta.groupby(keys, as_index=False)[['delta-sum', 'delta-n']].sum()
+
+
+def _ngram_delta(changes, n, keys):
+    years, months, grams, sums, docs = [], [], [], [], []
+    for sign, result in changes:
+        year, month, _, _ = result.parsed
+        for gram, count in result.counts[n].items():
+            years.append(str(year))
+            months.append(str(month))
+            grams.append(gram)
+            sums.append(sign * count)
+            docs.append(sign)
+    delta = pd.DataFrame({'year': years, 'month': months, f'{n}-gram': grams,
+                          'delta-sum': sums, 'delta-n': docs})
+    return delta.groupby(keys + [f'{n}-gram'], as_index=False)[['delta-sum', 'delta-n']].sum()
+
+
+# Patch a table with '<prefix>-sum' and '<prefix>-mean' columns in place.
+# The number of articles behind each row is recovered as sum / mean. Key columns
+# stay strings, so zero padded months are written back as they were read.
+def patch_sum_mean_table(path, keys, prefix, delta):
+    sum_col = f'{prefix}-sum'
+    mean_col = f'{prefix}-mean'
+    table = pd.read_csv(path, dtype={key: str for key in keys}, keep_default_na=False)
+    columns = list(table.columns)
+    table['n'] = (table[sum_col] / table[mean_col]).round().fillna(0).astype('int64')
+
+    table = table.merge(delta, on=keys, how='outer')
+    table[['delta-sum', 'delta-n']] = table[['delta-sum', 'delta-n']].fillna(0).astype('int64')
+    table[sum_col] = table[sum_col].fillna(0).astype('int64') + table['delta-sum']
+    table['n'] = table['n'].fillna(0).astype('int64') + table['delta-n']
+    table = table[table['n'] > 0].copy()
+    table[mean_col] = table[sum_col] / table['n']
+
+    table = table.sort_values(sum_col, ascending=False, kind='mergesort')
+    write_table(table[columns], path)
+
+
+# length.csv has no filename column, so a removed article drops one row with its date and length
+def patch_length_table(path, removed, added):
+    table = pd.read_csv(path, dtype=str, keep_default_na=False)
+    to_drop = Counter()
+    for result in removed:
+        year, month, day, _ = result.parsed
+        to_drop[(str(year), f'{month:02d}', f'{day:02d}', str(result.length))] += 1
+
+    keep = []
+    for row in table.itertuples(index=False):
+        key = (row.year, row.month, row.day, row.length)
+        if to_drop[key] > 0:
+            to_drop[key] -= 1
+            keep.append(False)
+        else:
+            keep.append(True)
+    table = table[keep]
+
+    new_rows = []
+    for result in added:
+        year, month, day, _ = result.parsed
+        new_rows.append((str(year), f'{month:02d}', f'{day:02d}', str(result.length)))
+    table = pd.concat([table, pd.DataFrame(new_rows, columns=table.columns)], ignore_index=True)
+    table = table.iloc[table['length'].astype(int).argsort(kind='mergesort')]
+    write_table(table, path)
+
+
+def patch_title_table(path, removed_files, added):
+    table = pd.read_csv(path, keep_default_na=False)
+    table = table[~table['file'].isin(removed_files)]
+    table = pd.concat([table, title_table(added)], ignore_index=True)
+    write_table(table.sort_values('length', kind='mergesort'), path)
+
+
+# Articles that were deleted leave the topic model: drop their rows and lower
+# the Count of their topic. New articles get a topic from `python topic_model.py assign`.
+def patch_topic_table(path, removed_files):
+    if not removed_files or not os.path.exists(path):
+        return
+    table = pd.read_csv(path, keep_default_na=False)
+    gone = table[table['file'].isin(removed_files)]
+    if gone.empty:
+        return
+    lost = gone['Topic'].value_counts()
+    table = table[~table['file'].isin(removed_files)].copy()
+    table['Count'] = table['Count'] - table['Topic'].map(lost).fillna(0).astype('int64')
+    write_table(table, path)
+
+
+def full_rebuild(entries, ngram_sizes, workers=None, base_dir=DATAFRAMES_DIR):
+    builder = TableBuilder(ngram_sizes)
+    files = {}
+    paths = {filename: path for filename, path, _ in entries}
+    results = []
+    for shard_results in tokenize_files(entries, ngram_sizes, workers):
+        builder.add_results(shard_results)
+        for result in shard_results:
+            files[result.filename] = _file_record(paths[result.filename], result)
+            results.append(result)
+    builder.write(base_dir)
+    write_table(title_table(results), table_path('title', 'title.csv', base_dir=base_dir))
+    return {'ngram_sizes': tuple(ngram_sizes), 'files': files}
+
+
+# Bring the tables up to date with data/articles and return a summary of what changed
+def update(folder=ARTICLES_DIR, ngram_sizes=None, workers=None, full=False,
+           base_dir=DATAFRAMES_DIR, manifest_path=MANIFEST_PATH):
+    if ngram_sizes is None:
+        ngram_sizes = existing_ngram_sizes(base_dir) or (1,)
+    ngram_sizes = tuple(ngram_sizes)
+    entries = list_article_files(folder)
+    manifest = None if full else load_manifest(manifest_path)
+
+    if manifest is None or manifest['ngram_sizes'] != ngram_sizes:
+        manifest = full_rebuild(entries, ngram_sizes, workers, base_dir)
+        save_manifest(manifest, manifest_path)
+        return {'rebuilt': len(entries), 'added': 0, 'changed': 0, 'removed': 0}
+
+    unchanged, to_check, removed = diff_articles(entries, manifest)
+    old_files = manifest['files']
+    paths = {filename: path for filename, path, _ in to_check}
+    files = dict(unchanged)
+    changes = []
+    summary = {'rebuilt': 0, 'added': 0, 'changed': 0, 'removed': len(removed)}
+
+    # Only the new or touched files are read; if the content hash is the same
+    # the article is unchanged and only its mtime is refreshed
+    for shard_results in tokenize_files(to_check, ngram_sizes, workers):
+        for result in shard_results:
+            old = old_files.get(result.filename)
+            files[result.filename] = _file_record(paths[result.filename], result)
+            if old and old['sha1'] == result.sha1:
+                continue
+            if old:
+                changes.append((-1, old['result']))
+                summary['changed'] += 1
+            else:
+                summary['added'] += 1
+            changes.append((1, result))
+    for filename in removed:
+        changes.append((-1, old_files[filename]['result']))
+
+    if changes:
+        removed_results = [result for sign, result in changes if sign < 0]
+        added_results = [result for sign, result in changes if sign > 0]
+
+        patch_length_table(table_path('length', 'length.csv', base_dir=base_dir), removed_results, added_results)
+        patch_sum_mean_table(table_path('length', 'length-year.csv', base_dir=base_dir),
+                             ['year'], 'length', _length_delta(changes, ['year']))
+        patch_sum_mean_table(table_path('length', 'length-year-month.csv', base_dir=base_dir),
+                             ['year', 'month'], 'length', _length_delta(changes, ['year', 'month']))
+        # percentiles can't be patched with deltas, but recomputing them from length.csv is cheap
+        write_length_stats(base_dir)
+        for n in ngram_sizes:
+            for level, keys in (('year', ['year']), ('year-month', ['year', 'month'])):
+                path = ngram_table_path(n, level, base_dir)
+                if os.path.exists(path):
+                    patch_sum_mean_table(path, keys + [f'{n}-gram'], 'count', _ngram_delta(changes, n, keys))
+
+        removed_files = [result.filename for result in removed_results]
+        patch_title_table(table_path('title', 'title.csv', base_dir=base_dir), removed_files, added_results)
+        patch_topic_table(table_path('topic-model', 'topic-model.csv', base_dir=base_dir), removed)
+
+    manifest['files'] = files
+    save_manifest(manifest, manifest_path)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update the dataframes with new or changed articles')
+    parser.add_argument('--full', action='store_true', help='rebuild every table from scratch')
+    parser.add_argument('--ngrams', type=int, nargs='+', default=None,
+                        help='n-gram sizes to keep up to date (default: the ones already built)')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all cores)')
+    args = parser.parse_args()
+
+    summary = update(ngram_sizes=args.ngrams, workers=args.workers, full=args.full)
+    for key, value in summary.items():
+        print(f'{key}: {value}')
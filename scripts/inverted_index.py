@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import os
+import pickle
+from collections import namedtuple
+
+import numpy as np
+
+from corpus_reader import ARTICLES_DIR, DATA_DIR, list_article_files
+from parallel_tokenize import TOKEN_PATTERN, tokenize
+
+# Positional inverted index over data/articles for keyword-in-context searches.
+# Articles are tokenized like the n-gram tables (runs of \w in the lower-cased
+# text). For every word the index stores the articles it occurs in and its
+# token positions there. The postings of a word are one stream of integers:
+# the number of articles, the gaps between article numbers, the number of
+# occurrences per article and the gaps between positions inside each article.
+# The stream is stored as varints (7 bits per byte), so a word costs about one
+# byte per occurrence. A phrase is found by intersecting the article lists of
+# its words and then checking that word i sits at position p + i. Only the
+# articles with a hit are opened to cut out the concordance lines.
+#
+# Example:
+#     for line in kwic('west bank', year=2023, month=10, window=8):
+#         print(line.filename, line.left, line.match, line.right)
+#
+# Usage (from the scripts folder):
+#     python inverted_index.py build
+#     python inverted_index.py "west bank" --year 2023 --month 10 --window 8
+
+INDEX_DIR = os.path.join(DATA_DIR, 'cache', 'kwic')
+
+KwicLine = namedtuple('KwicLine', ['filename', 'year', 'month', 'day', 'left', 'match', 'right'])
+
+
+# Varint encoding of an array of non-negative integers, 7 bits per byte with the
+# high bit set on every byte but the last one of a value
+def varint_sizes(values):
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+    return nbytes
+
+
+def encode_varints(values):
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = varint_sizes(values)
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max(initial=0))):
+        has_byte = nbytes > k
+        chunk = (values[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[has_byte] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[has_byte] + k] = (chunk | more).astype(np.uint8)
+    return out
+
+
+def decode_varints(data):
+    data = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    values = np.zeros(len(ends), dtype=np.uint64)
+    lengths = ends - starts + 1
+    for k in range(int(lengths.max(initial=0))):
+        has_byte = lengths > k
+        values[has_byte] |= (data[starts[has_byte] + k] & np.uint8(0x7F)).astype(np.uint64) << np.uint64(7 * k)
+    return values.astype(np.int64)
+
+
+# Stat of every article file, to notice when the index is out of date
+def corpus_signature(entries):
+    digest = hashlib.sha1()
+    for filename, path, _ in entries:
+        stat = os.stat(path)
+        digest.update(f'{filename}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+# Encode the postings of every word. tokens is a list with the token list of every article.
+# Returns (words, offsets, blob): the postings of words[i] are blob[offsets[i]:offsets[i + 1]].
+def encode_postings(tokens):
+    vocabulary = {}
+    term_ids = []
+    for article_tokens in tokens:
+        term_ids.append(np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in article_tokens),
+                                    dtype=np.int32, count=len(article_tokens)))
+    lengths = [len(ids) for ids in term_ids]
+    terms = np.concatenate(term_ids) if term_ids else np.empty(0, dtype=np.int32)
+    docs = np.repeat(np.arange(len(tokens), dtype=np.int64), lengths)
+    positions = np.concatenate([np.arange(length, dtype=np.int64) for length in lengths]) if lengths else docs
+
+    order = np.lexsort((positions, docs, terms))
+    terms, docs, positions = terms[order], docs[order], positions[order]
+    new_term = np.ones(len(terms), dtype=bool)
+    new_term[1:] = terms[1:] != terms[:-1]
+    new_doc = new_term.copy()
+    new_doc[1:] |= docs[1:] != docs[:-1]
+    position_gaps = np.where(new_doc, positions, positions - np.roll(positions, 1))
+
+    doc_rows = np.flatnonzero(new_doc)
+    doc_of_term = terms[doc_rows]
+    doc_gaps = np.where(new_term[doc_rows], docs[doc_rows], docs[doc_rows] - np.roll(docs[doc_rows], 1))
+    freqs = np.diff(np.append(doc_rows, len(terms)))
+
+    # lay the four sections of every word out one after the other with a single sort
+    term_starts = np.flatnonzero(new_term)
+    n_docs = np.diff(np.append(np.searchsorted(doc_of_term, terms[term_starts]), len(doc_rows)))
+    stream_terms = np.concatenate((terms[term_starts], doc_of_term, doc_of_term, terms))
+    sections = np.repeat(np.arange(4), [len(term_starts), len(doc_rows), len(doc_rows), len(terms)])
+    rows = np.concatenate((np.zeros(len(term_starts), dtype=np.int64), np.arange(len(doc_rows)),
+                           np.arange(len(doc_rows)), np.arange(len(terms))))
+    values = np.concatenate((n_docs, doc_gaps, freqs, position_gaps))
+    order = np.lexsort((rows, sections, stream_terms))
+    values = values[order].astype(np.uint64)
+
+    words = sorted(vocabulary, key=vocabulary.get)
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(stream_terms[order], weights=varint_sizes(values), minlength=len(words)))
+    blob = encode_varints(values).tobytes()
+    return words, offsets, blob
+
+
+class InvertedIndex:
+
+    def __init__(self, words, offsets, postings, documents, signature=None):
+        self.ids = {word: i for i, word in enumerate(words)}
+        self.offsets = offsets
+        self.postings = postings
+        # (filename, year, month, day) per article number
+        self.documents = documents
+        self.signature = signature
+        self.years = np.array([doc[1] for doc in documents], dtype=np.int32)
+        self.months = np.array([doc[2] for doc in documents], dtype=np.int32)
+
+    @classmethod
+    def build(cls, folder=ARTICLES_DIR):
+        entries = list_article_files(folder)
+        tokens = []
+        for _, path, _ in entries:
+            with open(path, 'rb') as f:
+                tokens.append(tokenize(f.read().decode('utf-8')))
+        words, offsets, postings = encode_postings(tokens)
+        documents = [(filename, year, month, day) for filename, _, (year, month, day, _) in entries]
+        return cls(words, offsets, postings, documents, corpus_signature(entries))
+
+    def save(self, directory=INDEX_DIR):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'postings.bin'), 'wb') as f:
+            f.write(self.postings)
+        words = sorted(self.ids, key=self.ids.get)
+        state = {'words': words, 'offsets': self.offsets, 'documents': self.documents, 'signature': self.signature}
+        tmp_path = os.path.join(directory, 'index.pkl.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, os.path.join(directory, 'index.pkl'))
+
+    @classmethod
+    def load(cls, directory=INDEX_DIR):
+        with open(os.path.join(directory, 'index.pkl'), 'rb') as f:
+            state = pickle.load(f)
+        with open(os.path.join(directory, 'postings.bin'), 'rb') as f:
+            postings = f.read()
+        return cls(state['words'], state['offsets'], postings, state['documents'], state['signature'])
+
+    # Postings of a word as (article numbers, occurrences per article, positions),
+    # the positions of all articles one after the other; empty arrays if unknown
+    def lookup(self, word):
+        term = self.ids.get(word)
+        if term is None:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        stream = decode_varints(self.postings[self.offsets[term]:self.offsets[term + 1]])
+        n_docs = int(stream[0])
+        docs = np.cumsum(stream[1:1 + n_docs])
+        freqs = stream[1 + n_docs:1 + 2 * n_docs]
+        gaps = stream[1 + 2 * n_docs:]
+        # positions restart in every article: subtract the running total reached before it
+        totals = np.cumsum(gaps)
+        firsts = np.cumsum(freqs) - freqs
+        positions = totals - np.repeat(totals[firsts] - gaps[firsts], freqs)
+        return docs, freqs, positions
+
+    # Every (article number, position of the first word) where the words occur in a row
+    def phrase_hits(self, words, articles=None):
+        postings = [self.lookup(word) for word in words]
+        docs = postings[0][0]
+        for other_docs, _, _ in postings[1:]:
+            docs = np.intersect1d(docs, other_docs, assume_unique=True)
+        if articles is not None:
+            docs = docs[np.isin(docs, articles)]
+
+        # occurrences in the shared articles as (article << 32 | position) keys; word i of
+        # the phrase must have the key of the first word + i
+        starts = None
+        for offset, (word_docs, freqs, positions) in enumerate(postings):
+            occurrence_docs = np.repeat(word_docs, freqs)
+            keep = np.isin(occurrence_docs, docs)
+            keys = (occurrence_docs[keep] << 32) | positions[keep]
+            starts = keys if starts is None else starts[np.isin(starts + offset, keys)]
+        return list(zip((starts >> 32).tolist(), (starts & 0xFFFFFFFF).tolist()))
+
+    # Article numbers published in a year / month (None matches everything)
+    def articles_in(self, year=None, month=None):
+        if year is None and month is None:
+            return None
+        keep = np.ones(len(self.documents), dtype=bool)
+        if year is not None:
+            keep &= self.years == year
+        if month is not None:
+            keep &= self.months == month
+        return np.flatnonzero(keep)
+
+    # Concordance lines for a word or phrase
+    def kwic(self, term_or_phrase, year=None, month=None, window=8, limit=None, folder=ARTICLES_DIR):
+        words = tokenize(term_or_phrase)
+        if not words:
+            return []
+        hits = self.phrase_hits(words, self.articles_in(year, month))
+        if limit is not None:
+            hits = hits[:limit]
+
+        lines = []
+        opened = None
+        for doc, start in hits:
+            filename, doc_year, doc_month, doc_day = self.documents[doc]
+            # hits come grouped by article, so each file is read and tokenized once
+            if opened != doc:
+                with open(os.path.join(folder, filename), 'rb') as f:
+                    text = f.read().decode('utf-8')
+                token_spans = _token_spans(text)
+                opened = doc
+            end = start + len(words) - 1
+            left = token_spans[max(0, start - window):start]
+            right = token_spans[end + 1:end + 1 + window]
+            lines.append(KwicLine(filename, doc_year, doc_month, doc_day,
+                                  _join(text, left), text[token_spans[start][0]:token_spans[end][1]],
+                                  _join(text, right)))
+        return lines
+
+
+# Spans in text of the tokens tokenize() finds in it. Tokens come from the
+# lower-cased text, so the positions match the index, but lower() can change the
+# length (the 'İ' of 'İstanbul' becomes two characters), so their offsets are
+# mapped back to the characters of the original text they came from.
+def _token_spans(text):
+    lowered = text.lower()
+    spans = [match.span() for match in TOKEN_PATTERN.finditer(lowered)]
+    if len(lowered) == len(text):
+        return spans
+    source = [i for i, char in enumerate(text) for _ in char.lower()]
+    return [(source[start], source[end - 1] + 1) for start, end in spans]
+
+
+# Text covered by a run of token spans, with line breaks folded into spaces
+def _join(text, spans):
+    if not spans:
+        return ''
+    return ' '.join(text[spans[0][0]:spans[-1][1]].split())
+
+
+# Load the saved index, building it first when the articles changed
+def load_index(folder=ARTICLES_DIR, directory=INDEX_DIR):
+    if os.path.exists(os.path.join(directory, 'index.pkl')):
+        index = InvertedIndex.load(directory)
+        if index.signature == corpus_signature(list_article_files(folder)):
+            return index
+    index = InvertedIndex.build(folder)
+    index.save(directory)
+    return index
+
+
+_index = None
+
+
+def kwic(term_or_phrase, year=None, month=None, window=8, limit=None):
+    global _index
+    if _index is None:
+        _index = load_index()
+    return _index.kwic(term_or_phrase, year, month, window, limit)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keyword in context search over the articles')
+    parser.add_argument('query', help="a word or phrase, or 'build' to rebuild the index")
+    parser.add_argument('--year', type=int, default=None)
+    parser.add_argument('--month', type=int, default=None)
+    parser.add_argument('--window', type=int, default=8, help='words of context on each side')
+    parser.add_argument('--limit', type=int, default=50, help='maximum number of lines')
+    args = parser.parse_args()
+
+    if args.query == 'build':
+        index = InvertedIndex.build()
+        index.save()
+        print(f'Indexed {len(index.documents)} articles, {len(index.ids)} words, '
+              f'{len(index.postings) / 1e6:.1f} MB of postings')
+    else:
+        lines = kwic(args.query, args.year, args.month, args.window, args.limit)
+        for line in lines:
+            date = f'{line.year}-{line.month:02d}-{line.day:02d}'
+            print(f'{line.filename:22} {date}  {line.left[-70:]:>70} [{line.match}] {line.right[:70]}')
+        print(f'{len(lines)} lines')
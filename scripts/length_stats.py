@@ -0,0 +1,159 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import load_table, write_table
+from corpus_reader import DATAFRAMES_DIR
+
+# Article length statistics per year and per year-month.
+# The lengths of length.csv are loaded once into an int32 array next to an array
+# of period codes (year, or year * 12 + month - 1). One lexsort orders the
+# articles by period and then by length, so every period is a contiguous sorted
+# slice: min and max are its ends, percentiles are read at an index inside it,
+# and sums for the mean and standard deviation come from np.add.reduceat over
+# the slice starts. Histograms use fixed bins of BIN_WIDTH words, the same for
+# every period, counted with a single bincount.
+#
+# The results are written as tables next to length.csv:
+#     length/length-stats-year.csv           year, articles, length-min, length-max, length-mean,
+#     length/length-stats-year-month.csv     length-median, length-p90, length-p99, length-std
+#     length/length-histogram-year.csv       year, bin-start, bin-end, articles
+#     length/length-histogram-year-month.csv
+#
+# Example:
+#     write_length_stats()
+#     df = load_table('length-stats-year', columns=['year', 'length-min', 'length-max'])
+#
+# Usage (from the scripts folder):
+#     python length_stats.py
+
+# Width of the histogram bins in words; bin i holds lengths in [i * BIN_WIDTH, (i + 1) * BIN_WIDTH)
+BIN_WIDTH = 250
+
+PERCENTILES = {'length-median': 50, 'length-p90': 90, 'length-p99': 99}
+
+LEVELS = {'year': ['year'], 'year-month': ['year', 'month']}
+
+
+# years, months and lengths of every article as int32 arrays
+def load_lengths(base_dir=DATAFRAMES_DIR):
+    df = load_table('length', columns=['year', 'month', 'length'], base_dir=base_dir)
+    return tuple(df[column].to_numpy(np.int32) for column in ('year', 'month', 'length'))
+
+
+def period_codes(years, months, level='year'):
+    if level == 'year':
+        return years.astype(np.int32)
+    return years.astype(np.int32) * 12 + months.astype(np.int32) - 1
+
+
+# Key columns of a list of period codes
+def period_columns(codes, level='year'):
+    if level == 'year':
+        return {'year': codes}
+    return {'year': codes // 12, 'month': codes % 12 + 1}
+
+
+# Sort the lengths by (period, length) and return the sorted lengths, the
+# distinct period codes and the start of every period in the sorted array
+def sort_by_period(lengths, codes):
+    order = np.lexsort((lengths, codes))
+    lengths = lengths[order]
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=np.int64)
+    return lengths, codes[starts], starts
+
+
+# Percentile q of every sorted slice, interpolated linearly like np.percentile
+def _sorted_percentile(lengths, starts, counts, q):
+    position = (counts - 1) * (q / 100)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, counts - 1)
+    fraction = position - low
+    low_values = lengths[starts + low].astype(np.float64)
+    high_values = lengths[starts + high].astype(np.float64)
+    return low_values + (high_values - low_values) * fraction
+
+
+# Summary statistics of every period as a dict of arrays keyed by column name.
+# The standard deviation is the population one (ddof=0), so single article
+# periods get 0 instead of a missing value.
+def period_stats(lengths, codes):
+    lengths, periods, starts = sort_by_period(np.asarray(lengths, dtype=np.int32), np.asarray(codes))
+    ends = np.r_[starts[1:], len(lengths)]
+    counts = ends - starts
+    if not len(counts):
+        columns = ['articles', 'length-min', 'length-max', 'length-mean', *PERCENTILES, 'length-std']
+        return periods, {column: np.empty(0) for column in columns}
+
+    means = np.add.reduceat(lengths.astype(np.int64), starts) / counts
+    deviations = lengths - np.repeat(means, counts)
+    stds = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+
+    stats = {
+        'articles': counts,
+        'length-min': lengths[starts],
+        'length-max': lengths[ends - 1],
+        'length-mean': means,
+    }
+    for column, q in PERCENTILES.items():
+        stats[column] = _sorted_percentile(lengths, starts, counts, q)
+    stats['length-std'] = stds
+    return periods, stats
+
+
+# Article counts per fixed length bin for every period: (periods, counts of shape periods x bins).
+# Every period gets the same bins, from 0 to the longest article in the corpus.
+def period_histograms(lengths, codes, bin_width=BIN_WIDTH):
+    lengths = np.asarray(lengths, dtype=np.int32)
+    periods, inverse = np.unique(np.asarray(codes), return_inverse=True)
+    n_bins = int(lengths.max()) // bin_width + 1 if len(lengths) else 0
+    flat = inverse.astype(np.int64) * n_bins + lengths // bin_width
+    counts = np.bincount(flat, minlength=len(periods) * n_bins).reshape(len(periods), n_bins)
+    return periods, counts
+
+
+def stats_table(years, months, lengths, level='year'):
+    periods, stats = period_stats(lengths, period_codes(years, months, level))
+    return pd.DataFrame({**period_columns(periods, level), **stats})
+
+
+def histogram_table(years, months, lengths, level='year', bin_width=BIN_WIDTH):
+    periods, counts = period_histograms(lengths, period_codes(years, months, level), bin_width)
+    n_bins = counts.shape[1]
+    table = pd.DataFrame(period_columns(np.repeat(periods, n_bins), level))
+    table['bin-start'] = np.tile(np.arange(n_bins) * bin_width, len(periods))
+    table['bin-end'] = table['bin-start'] + bin_width
+    table['articles'] = counts.ravel()
+    return table
+
+
+def stats_path(kind, level, base_dir=DATAFRAMES_DIR):
+    return os.path.join(base_dir, 'length', f'length-{kind}-{level}.csv')
+
+
+# Compute every statistics and histogram table from length.csv and write them; returns the paths
+def write_length_stats(base_dir=DATAFRAMES_DIR, bin_width=BIN_WIDTH):
+    years, months, lengths = load_lengths(base_dir)
+    written = []
+    for level in LEVELS:
+        tables = [
+            (stats_table(years, months, lengths, level), stats_path('stats', level, base_dir)),
+            (histogram_table(years, months, lengths, level, bin_width), stats_path('histogram', level, base_dir)),
+        ]
+        for table, path in tables:
+            write_table(table, path)
+            written.append(path)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the length statistics and histogram tables')
+    parser.add_argument('--bin-width', type=int, default=BIN_WIDTH, help='histogram bin width in words')
+    parser.add_argument('--output', default=DATAFRAMES_DIR, help='dataframes folder holding length/length.csv')
+    args = parser.parse_args()
+
+    for path in write_length_stats(args.output, args.bin_width):
+        print('Written', path)
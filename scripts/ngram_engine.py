@@ -0,0 +1,355 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from build_dataframes import ngram_table_path
+from corpus_reader import ARTICLES_DIR, DATA_DIR, DATAFRAMES_DIR, list_article_files
+from parallel_tokenize import count_ngrams, make_shards, tokenize
+
+# Streaming n-gram counter for the n-gram tables in data/dataframes/n-grams:
+# n-gram.csv (one row per n-gram per article), n-gram-year.csv and
+# n-gram-year-month.csv, for n = 1, 2 and 3.
+# Articles are tokenized in worker processes and every n-gram is hashed to a
+# 64-bit id (blake2b), so the counts are plain (hash, article, count) integer
+# arrays. When the buffered counts reach the memory budget they are sorted by
+# hash and spilled to disk as a run, with the text of the n-grams they contain.
+# At the end the runs are merged one hash range at a time: each range is read
+# from every run (the runs are sorted, so that is a binary search and a slice),
+# turned into rows of the three tables, and the year tables are k-way merged
+# from the per-range pieces into one file sorted by count-sum.
+# Nothing ever holds the whole table, so --memory-mb bounds the working memory
+# on top of the interpreter itself (about 100 MB with pandas loaded).
+#
+# Usage (from the scripts folder):
+#     python ngram_engine.py --ngrams 1 2 3 --memory-mb 512 --workers 4
+
+WORK_DIR = os.path.join(DATA_DIR, 'cache', 'ngram-engine')
+
+# One counted n-gram of one article
+ENTRY = np.dtype([('hash', '<u8'), ('article', '<u4'), ('count', '<u4')])
+
+# Rough memory cost used to decide when to spill and how many hash ranges to merge in:
+# a buffered entry, a buffered n-gram string (object + dict slot) and an entry while
+# its rows are built into a DataFrame and written out
+ENTRY_BYTES = 40
+STRING_BYTES = 120
+MERGE_BYTES_PER_ENTRY = 1000
+
+HASH_SPACE = 2 ** 64
+
+
+def ngram_hash(ngram):
+    return int.from_bytes(hashlib.blake2b(ngram.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# Worker: tokenize one shard of (article number, path) and hash the n-grams of each article.
+# Returns (article number, {n: (hashes, counts, n-gram strings)}) per article.
+def _hash_shard(shard, ngram_sizes):
+    results = []
+    for article, path in shard:
+        with open(path, 'rb') as f:
+            tokens = tokenize(f.read().decode('utf-8'))
+        hashed = {}
+        for n in ngram_sizes:
+            counts = count_ngrams(tokens, n)
+            strings = list(counts)
+            hashes = np.fromiter((ngram_hash(s) for s in strings), dtype=np.uint64, count=len(strings))
+            hashed[n] = (hashes, np.fromiter(counts.values(), dtype=np.uint32, count=len(strings)), strings)
+        results.append((article, hashed))
+    return results
+
+
+# Yield the hashed results shard by shard. At most two shards per worker are in
+# flight, so finished results never pile up faster than they are buffered.
+def hash_articles(paths, ngram_sizes, workers=None, shard_size=16):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    shards = make_shards(list(enumerate(paths)), shard_size)
+    if workers <= 1 or len(shards) <= 1:
+        for shard in shards:
+            yield _hash_shard(shard, ngram_sizes)
+        return
+
+    shards = iter(shards)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_hash_shard, shard, ngram_sizes)
+                   for shard in itertools.islice(shards, 2 * workers)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                shard = next(shards, None)
+                if shard is not None:
+                    pending.add(executor.submit(_hash_shard, shard, ngram_sizes))
+
+
+class RunWriter:
+    # Buffers the hashed counts of one n size and spills them as sorted runs.
+    # A run is <prefix>.entries.npy (ENTRY array sorted by hash, article) plus the
+    # n-gram strings: <prefix>.keys.npy (sorted hashes), <prefix>.offsets.npy and
+    # <prefix>.text (the strings, one per line, in key order).
+
+    def __init__(self, n, work_dir):
+        self.n = n
+        self.work_dir = work_dir
+        self.runs = []
+        self.total_entries = 0
+        self._reset()
+
+    def _reset(self):
+        self.hashes = []
+        self.counts = []
+        self.articles = []
+        self.strings = {}
+        self.bytes = 0
+
+    def add(self, article, hashes, counts, strings):
+        self.hashes.append(hashes)
+        self.counts.append(counts)
+        self.articles.append(np.full(len(hashes), article, dtype=np.uint32))
+        self.bytes += len(hashes) * ENTRY_BYTES
+        known = self.strings
+        for key, ngram in zip(hashes.tolist(), strings):
+            seen = known.get(key)
+            if seen is None:
+                known[key] = ngram
+                self.bytes += STRING_BYTES + len(ngram)
+            elif seen != ngram:
+                raise ValueError(f'Hash collision between {seen!r} and {ngram!r}')
+
+    def spill(self):
+        if not self.hashes:
+            return
+        entries = np.empty(sum(len(h) for h in self.hashes), dtype=ENTRY)
+        entries['hash'] = np.concatenate(self.hashes)
+        entries['article'] = np.concatenate(self.articles)
+        entries['count'] = np.concatenate(self.counts)
+        entries = entries[np.lexsort((entries['article'], entries['hash']))]
+
+        keys = np.fromiter(self.strings.keys(), dtype=np.uint64, count=len(self.strings))
+        order = np.argsort(keys)
+        texts = list(self.strings.values())
+        encoded = [(texts[i] + '\n').encode('utf-8') for i in order.tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=offsets[1:])
+
+        prefix = os.path.join(self.work_dir, f'{self.n}-gram-run-{len(self.runs)}')
+        np.save(prefix + '.entries.npy', entries)
+        np.save(prefix + '.keys.npy', keys[order])
+        np.save(prefix + '.offsets.npy', offsets)
+        with open(prefix + '.text', 'wb') as f:
+            f.write(b''.join(encoded))
+        self.runs.append(prefix)
+        self.total_entries += len(entries)
+        self._reset()
+
+
+class Run:
+    # Read side of a spilled run; everything is memory mapped and sliced by hash range
+
+    def __init__(self, prefix):
+        self.entries = np.load(prefix + '.entries.npy', mmap_mode='r')
+        self.keys = np.load(prefix + '.keys.npy', mmap_mode='r')
+        self.offsets = np.load(prefix + '.offsets.npy', mmap_mode='r')
+        self.text_path = prefix + '.text'
+
+    # Entries with lo <= hash < hi (hi is None for the top of the hash space)
+    def entries_between(self, lo, hi):
+        start, end = _hash_range(self.entries['hash'], lo, hi)
+        return np.array(self.entries[start:end])
+
+    # (hashes, strings) of the n-grams with lo <= hash < hi
+    def strings_between(self, lo, hi):
+        start, end = _hash_range(self.keys, lo, hi)
+        if end == start:
+            return np.empty(0, dtype=np.uint64), []
+        with open(self.text_path, 'rb') as f:
+            f.seek(int(self.offsets[start]))
+            blob = f.read(int(self.offsets[end] - self.offsets[start]))
+        return np.array(self.keys[start:end]), blob.decode('utf-8').split('\n')[:-1]
+
+
+def _hash_range(sorted_hashes, lo, hi):
+    start = int(np.searchsorted(sorted_hashes, np.uint64(lo), side='left'))
+    end = len(sorted_hashes) if hi is None else int(np.searchsorted(sorted_hashes, np.uint64(hi), side='left'))
+    return start, end
+
+
+# Split the hash space into equal ranges (hashes are uniform); the last range is open ended
+def hash_ranges(n_ranges):
+    bounds = [HASH_SPACE * i // n_ranges for i in range(n_ranges)]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+# Merge one hash range of every run: entries sorted by (hash, article), the distinct
+# hashes of the range and their n-gram strings
+def merge_range(runs, lo, hi):
+    entries = np.concatenate([run.entries_between(lo, hi) for run in runs])
+    entries = entries[np.lexsort((entries['article'], entries['hash']))]
+    strings = {}
+    for run in runs:
+        keys, texts = run.strings_between(lo, hi)
+        for key, ngram in zip(keys.tolist(), texts):
+            seen = strings.setdefault(key, ngram)
+            if seen != ngram:
+                raise ValueError(f'Hash collision between {seen!r} and {ngram!r}')
+    unique, ngram_ids = np.unique(entries['hash'], return_inverse=True)
+    ngrams = np.array([strings[key] for key in unique.tolist()], dtype=object)
+    return entries, ngram_ids, ngrams
+
+
+# count-sum and count-mean per (n-gram, period) for the entries of one hash range.
+# periods holds the period key of every article; count-mean divides by the number
+# of articles mentioning the n-gram, as in the original tables.
+def period_totals(entries, ngram_ids, periods):
+    period = periods[entries['article']]
+    order = np.lexsort((period, ngram_ids))
+    ngram_ids = ngram_ids[order]
+    period = period[order]
+    change = np.ones(len(order), dtype=bool)
+    change[1:] = (ngram_ids[1:] != ngram_ids[:-1]) | (period[1:] != period[:-1])
+    starts = np.flatnonzero(change)
+    sums = np.add.reduceat(entries['count'][order].astype(np.int64), starts)
+    articles = np.diff(np.append(starts, len(order)))
+    return ngram_ids[starts], period[starts], sums, sums / articles
+
+
+# Write the lines of several csv pieces, each sorted by count-sum descending, into
+# one file with a k-way merge; column is the position of count-sum in a line
+def merge_sorted_pieces(pieces, path, header, column):
+    tmp_path = path + '.tmp'
+    files = [open(piece, encoding='utf-8') for piece in pieces]
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            out.write(header + '\n')
+            # n-grams are words joined by spaces, so a plain split finds the column
+            out.writelines(heapq.merge(*files, key=lambda line: -int(line.split(',')[column])))
+    finally:
+        for f in files:
+            f.close()
+    os.replace(tmp_path, path)
+
+
+class NgramEngine:
+
+    def __init__(self, folder=ARTICLES_DIR, ngram_sizes=(1, 2, 3), memory_mb=512, workers=None,
+                 shard_size=16, base_dir=DATAFRAMES_DIR):
+        self.entries = list_article_files(folder)
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.budget = memory_mb * 2 ** 20
+        self.workers = workers
+        self.shard_size = shard_size
+        self.base_dir = base_dir
+        self.files = np.array([filename for filename, _, _ in self.entries], dtype=object)
+        dates = np.array([parsed[:3] for _, _, parsed in self.entries], dtype=np.int64).reshape(-1, 3)
+        self.years, self.months, self.days = dates.T
+
+    # Stream the articles into sorted runs on disk, spilling when the buffers fill half the budget
+    def count(self, work_dir):
+        writers = {n: RunWriter(n, work_dir) for n in self.ngram_sizes}
+        paths = [path for _, path, _ in self.entries]
+        for results in hash_articles(paths, self.ngram_sizes, self.workers, self.shard_size):
+            for article, hashed in results:
+                for n, (hashes, counts, strings) in hashed.items():
+                    writers[n].add(article, hashes, counts, strings)
+            if sum(writer.bytes for writer in writers.values()) > self.budget // 2:
+                for writer in writers.values():
+                    writer.spill()
+        for writer in writers.values():
+            writer.spill()
+        return writers
+
+    # Merge the runs of one n size into its three tables
+    def write_tables(self, writer, work_dir):
+        n = writer.n
+        runs = [Run(prefix) for prefix in writer.runs]
+        n_ranges = max(1, -(-writer.total_entries * MERGE_BYTES_PER_ENTRY // self.budget))
+        levels = {
+            'year': (['year'], self.years),
+            'year-month': (['year', 'month'], self.years * 12 + self.months - 1),
+        }
+        pieces = {level: [] for level in levels}
+
+        article_path = ngram_table_path(n, 'article', self.base_dir)
+        os.makedirs(os.path.dirname(article_path), exist_ok=True)
+        with open(article_path + '.tmp', 'w', encoding='utf-8', newline='') as article_file:
+            article_file.write(f'year,month,day,file,{n}-gram,count\n')
+            for number, (lo, hi) in enumerate(hash_ranges(n_ranges)):
+                entries, ngram_ids, ngrams = merge_range(runs, lo, hi)
+                if len(entries) == 0:
+                    continue
+                article = entries['article']
+                pd.DataFrame({
+                    'year': self.years[article], 'month': self.months[article], 'day': self.days[article],
+                    'file': self.files[article], f'{n}-gram': ngrams[ngram_ids], 'count': entries['count'],
+                }).to_csv(article_file, header=False, index=False)
+
+                for level, (_, periods) in levels.items():
+                    ids, period, sums, means = period_totals(entries, ngram_ids, periods)
+                    table = pd.DataFrame({f'{n}-gram': ngrams[ids], 'count-sum': sums, 'count-mean': means})
+                    if level == 'year':
+                        table.insert(0, 'year', period)
+                    else:
+                        table.insert(0, 'year', period // 12)
+                        table.insert(1, 'month', period % 12 + 1)
+                    table = table.sort_values('count-sum', ascending=False, kind='mergesort')
+                    piece = os.path.join(work_dir, f'{n}-gram-{level}-{number}.csv')
+                    table.to_csv(piece, header=False, index=False)
+                    pieces[level].append(piece)
+        os.replace(article_path + '.tmp', article_path)
+
+        written = [article_path]
+        for level, (keys, _) in levels.items():
+            path = ngram_table_path(n, level, self.base_dir)
+            header = ','.join(keys + [f'{n}-gram', 'count-sum', 'count-mean'])
+            merge_sorted_pieces(pieces[level], path, header, len(keys) + 1)
+            for piece in pieces[level]:
+                os.remove(piece)
+            written.append(path)
+        return written
+
+    def run(self):
+        os.makedirs(WORK_DIR, exist_ok=True)
+        work_dir = tempfile.mkdtemp(dir=WORK_DIR)
+        try:
+            writers = self.count(work_dir)
+            written = []
+            for n in self.ngram_sizes:
+                written.extend(self.write_tables(writers[n], work_dir))
+            return written
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count 1/2/3-grams into the n-gram tables in bounded memory')
+    parser.add_argument('--ngrams', type=int, nargs='+', default=[1, 2, 3], help='n-gram sizes to count')
+    parser.add_argument('--memory-mb', type=int, default=512, help='memory budget for counting and merging')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all cores)')
+    parser.add_argument('--shard-size', type=int, default=16, help='articles per worker task')
+    parser.add_argument('--output', default=DATAFRAMES_DIR, help='folder to write the tables to')
+    args = parser.parse_args()
+
+    engine = NgramEngine(ngram_sizes=args.ngrams, memory_mb=args.memory_mb, workers=args.workers,
+                         shard_size=args.shard_size, base_dir=args.output)
+    for path in engine.run():
+        print('Written', path)
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f'Peak memory of the main process: {peak:.0f} MB')
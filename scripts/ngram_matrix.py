@@ -0,0 +1,271 @@
+import argparse
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from build_dataframes import ngram_table_path
+from corpus_reader import DATA_DIR, DATAFRAMES_DIR
+from ngram_engine import ngram_hash
+
+# n-gram counts as a term x period matrix on disk.
+# The count-sum column of an n-gram year or year-month table is stored as a
+# dense uint32 numpy.memmap with one row per n-gram and one column per period.
+# The n-grams are kept sorted in a text file with an offsets array, and a hash
+# index (sorted 64-bit n-gram hashes with their row numbers) finds the row of
+# a term with one binary search. Getting the time series of a term is then a
+# single row read from the memory-mapped file: no csv is parsed and the matrix
+# is never loaded as a whole, so the 3-gram year-month matrix works even when
+# it is larger than RAM.
+#
+# Building does not hold the n-gram strings either: the distinct n-grams of each
+# csv chunk are sorted into a run file and the runs are merged into the
+# vocabulary, like the spill files of ngram_engine.py. What the build keeps in
+# memory is one chunk of the csv plus the hash and offset of every n-gram (about
+# 24 bytes per n-gram with the sort of the hashes), so a 3-gram table with 50
+# million distinct n-grams needs a bit over 1 GB.
+#
+# Example:
+#     matrix = load_ngram_matrix(1, 'year')
+#     matrix.series('gaza')                   # count-sum per year
+#     matrix.long_frame(['gaza', 'hamas'])    # year, 1-gram, count-sum rows for plotting
+#
+# Usage (from the scripts folder):
+#     python ngram_matrix.py 1 year gaza hamas
+
+MATRIX_DIR = os.path.join(DATA_DIR, 'cache', 'ngram-matrix')
+
+# Rows of the csv read at a time, and n-grams written at a time, while building
+CHUNK_ROWS = 500_000
+
+
+def matrix_dir(n, level):
+    return os.path.join(MATRIX_DIR, f'{n}-gram-{level}')
+
+
+def _period_keys(level):
+    return ['year'] if level == 'year' else ['year', 'month']
+
+
+def _read_chunks(csv_path, columns):
+    return pd.read_csv(csv_path, usecols=columns, keep_default_na=False, chunksize=CHUNK_ROWS,
+                       dtype={columns[-2]: str})
+
+
+# Hash every n-gram of a list; returns a uint64 array
+def hash_ngrams(ngrams):
+    return np.fromiter((ngram_hash(ngram) for ngram in ngrams), dtype=np.uint64, count=len(ngrams))
+
+
+# Merge sorted run files of n-grams (one per line) into the vocabulary file,
+# dropping duplicates. Returns the offsets of the lines and the hash of every n-gram.
+def merge_vocabulary(runs, path):
+    offsets = [np.zeros(1, dtype=np.int64)]
+    hashes = []
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        encoded = [line.encode('utf-8') for line in batch]
+        out.write(b''.join(encoded))
+        lengths = np.fromiter((len(text) for text in encoded), dtype=np.int64, count=len(encoded))
+        offsets.append(offsets[-1][-1] + np.cumsum(lengths))
+        hashes.append(hash_ngrams([line[:-1] for line in batch]))
+        batch.clear()
+
+    files = [open(run, encoding='utf-8', newline='') for run in runs]
+    try:
+        with open(path, 'wb') as out:
+            previous = None
+            for line in heapq.merge(*files):
+                if line != previous:
+                    batch.append(line)
+                    previous = line
+                    if len(batch) >= CHUNK_ROWS:
+                        flush()
+            flush()
+    finally:
+        for f in files:
+            f.close()
+    return np.concatenate(offsets), np.concatenate(hashes)
+
+
+# Write the matrix files for one table. The csv is read twice in chunks: once to
+# collect the vocabulary and periods and once to fill the memory-mapped counts.
+def build_matrix(n, level='year', base_dir=DATAFRAMES_DIR, out_dir=None):
+    csv_path = ngram_table_path(n, level, base_dir)
+    out_dir = out_dir or matrix_dir(n, level)
+    keys = _period_keys(level)
+    columns = keys + [f'{n}-gram', 'count-sum']
+    os.makedirs(out_dir, exist_ok=True)
+
+    work_dir = tempfile.mkdtemp(dir=out_dir)
+    try:
+        runs = []
+        periods = set()
+        for chunk in _read_chunks(csv_path, columns):
+            run = os.path.join(work_dir, f'vocabulary-run-{len(runs)}.txt')
+            with open(run, 'w', encoding='utf-8', newline='') as f:
+                f.writelines(ngram + '\n' for ngram in sorted(set(chunk[f'{n}-gram'].tolist())))
+            runs.append(run)
+            periods.update(map(tuple, chunk[keys].drop_duplicates().to_numpy().tolist()))
+        periods = sorted(periods)
+        offsets, hashes = merge_vocabulary(runs, os.path.join(out_dir, 'vocabulary.txt'))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    np.save(os.path.join(out_dir, 'offsets.npy'), offsets)
+    del offsets
+
+    order = np.argsort(hashes)
+    if len(hashes) > 1 and (np.diff(hashes[order]) == 0).any():
+        raise ValueError('Two n-grams share a hash')
+    np.save(os.path.join(out_dir, 'hashes.npy'), hashes[order])
+    np.save(os.path.join(out_dir, 'rows.npy'), order.astype(np.int32))
+
+    index = HashIndex(hashes[order], order.astype(np.int32))
+    period_codes = np.array([_period_code(period) for period in periods], dtype=np.int64)
+    shape = (len(hashes), len(periods))
+    counts = np.lib.format.open_memmap(os.path.join(out_dir, 'counts.npy'), mode='w+', dtype=np.uint32, shape=shape)
+    for chunk in _read_chunks(csv_path, columns):
+        rows = index.rows(hash_ngrams(chunk[f'{n}-gram'].tolist()))
+        codes = _period_code(tuple(chunk[key].to_numpy(np.int64) for key in keys))
+        counts[rows, np.searchsorted(period_codes, codes)] = chunk['count-sum'].to_numpy(np.uint32)
+    counts.flush()
+    del counts
+
+    stat = os.stat(csv_path)
+    meta = {'n': n, 'level': level, 'periods': periods, 'shape': shape,
+            'source': (stat.st_mtime_ns, stat.st_size)}
+    with open(os.path.join(out_dir, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return out_dir
+
+
+# (year,) -> year and (year, month) -> year * 12 + month - 1; works on scalars and arrays
+def _period_code(period):
+    if len(period) == 1:
+        return period[0]
+    return period[0] * 12 + period[1] - 1
+
+
+class HashIndex:
+    # Sorted n-gram hashes and the vocabulary row each one belongs to
+
+    def __init__(self, hashes, rows):
+        self.hashes = hashes
+        self.row_ids = rows
+
+    # Rows of an array of hashes, -1 where the hash is not in the index
+    def rows(self, hashes):
+        if len(self.hashes) == 0:
+            return np.full(len(hashes), -1)
+        positions = np.searchsorted(self.hashes, hashes)
+        positions = np.minimum(positions, len(self.hashes) - 1)
+        found = self.hashes[positions] == hashes
+        return np.where(found, self.row_ids[positions], -1)
+
+
+class NgramMatrix:
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.pkl'), 'rb') as f:
+            self.meta = pickle.load(f)
+        self.n = self.meta['n']
+        self.level = self.meta['level']
+        self.periods = self.meta['periods']
+        self.counts = np.load(os.path.join(directory, 'counts.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode='r')
+        self.index = HashIndex(np.load(os.path.join(directory, 'hashes.npy'), mmap_mode='r'),
+                               np.load(os.path.join(directory, 'rows.npy'), mmap_mode='r'))
+        self.vocabulary = np.memmap(os.path.join(directory, 'vocabulary.txt'), dtype=np.uint8, mode='r')
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    # Period labels: years, or 'YYYY-MM' for the year-month matrix
+    def labels(self):
+        if self.level == 'year':
+            return [year for year, in self.periods]
+        return [f'{year}-{month:02d}' for year, month in self.periods]
+
+    # The n-gram stored in a row
+    def term(self, row):
+        return self.vocabulary[self.offsets[row]:self.offsets[row + 1] - 1].tobytes().decode('utf-8')
+
+    # Row of a term, or None when it never occurs
+    def row(self, term):
+        row = int(self.index.rows(np.array([ngram_hash(term)], dtype=np.uint64))[0])
+        if row < 0 or self.term(row) != term:
+            return None
+        return row
+
+    # Count-sum of a term for every period
+    def series(self, term):
+        row = self.row(term)
+        values = np.zeros(len(self.periods), dtype=np.uint32) if row is None else np.asarray(self.counts[row])
+        return pd.Series(values, index=self.labels(), name=term)
+
+    # Terms x periods DataFrame for several terms
+    def frame(self, terms):
+        return pd.DataFrame({term: self.series(term) for term in terms}).T
+
+    # Long format rows (period columns, n-gram, count-sum) like the csv table, skipping
+    # the periods where a term does not occur
+    def long_frame(self, terms):
+        keys = _period_keys(self.level)
+        rows = []
+        for term in terms:
+            row = self.row(term)
+            if row is None:
+                continue
+            values = np.asarray(self.counts[row])
+            for period, count in zip(self.periods, values.tolist()):
+                if count:
+                    rows.append(period + (term, count))
+        return pd.DataFrame(rows, columns=keys + [f'{self.n}-gram', 'count-sum'])
+
+    # Top k terms by total count over all periods, as a Series indexed by n-gram.
+    # Reads the matrix in blocks of rows so it also works when it does not fit in RAM.
+    def top(self, k=10, block_rows=1_000_000):
+        totals = np.empty(len(self), dtype=np.int64)
+        for start in range(0, len(self), block_rows):
+            totals[start:start + block_rows] = self.counts[start:start + block_rows].sum(axis=1, dtype=np.int64)
+        k = min(k, len(totals))
+        best = np.argpartition(totals, -k)[-k:] if k else np.empty(0, dtype=np.int64)
+        best = best[np.lexsort((best, -totals[best]))]
+        return pd.Series(totals[best], index=pd.Index([self.term(row) for row in best], name=f'{self.n}-gram'),
+                         name='count-sum')
+
+
+def is_stale(n, level='year', base_dir=DATAFRAMES_DIR):
+    meta_path = os.path.join(matrix_dir(n, level), 'meta.pkl')
+    if not os.path.exists(meta_path):
+        return True
+    with open(meta_path, 'rb') as f:
+        meta = pickle.load(f)
+    stat = os.stat(ngram_table_path(n, level, base_dir))
+    return meta['source'] != (stat.st_mtime_ns, stat.st_size)
+
+
+# Open the matrix of an n-gram table, building it first when the table changed
+def load_ngram_matrix(n, level='year', base_dir=DATAFRAMES_DIR):
+    if is_stale(n, level, base_dir):
+        build_matrix(n, level, base_dir)
+    return NgramMatrix(matrix_dir(n, level))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time series of n-grams from the memory-mapped count matrix')
+    parser.add_argument('n', type=int, choices=[1, 2, 3])
+    parser.add_argument('level', choices=['year', 'year-month'])
+    parser.add_argument('terms', nargs='*', help='n-grams to print (default: the top 10)')
+    args = parser.parse_args()
+
+    matrix = load_ngram_matrix(args.n, args.level)
+    terms = args.terms or list(matrix.top(10).index)
+    print(matrix.frame(terms).to_string())
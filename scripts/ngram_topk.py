@@ -0,0 +1,171 @@
+import argparse
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import find_tables
+from corpus_reader import DATA_DIR, DATAFRAMES_DIR
+from stopwords import load_ngram_table
+
+# Pre-aggregated top n-grams.
+# For every n-gram table that exists (n = 1..3) the cache keeps the TOP_K most
+# frequent n-grams that are not made only of stop words, for all years
+# together, for every year and for every year-month. A "top 10" chart then reads
+# a few hundred bytes from memory instead of loading and grouping the table.
+# The cache remembers the size and modification time of the csv files it was
+# built from and rebuilds the entries of an n size when one of them changes.
+#
+# Example:
+#     top_ngrams(1, k=10)                        # all years
+#     top_ngrams(2, 2023, k=10)                  # one year
+#     top_ngrams(3, (2023, 10), k=10, exclude={'the gaza strip'})
+#
+# Usage (from the scripts folder):
+#     python ngram_topk.py                # build or refresh the cache
+#     python ngram_topk.py 1 --period 2023-10 -k 10
+
+CACHE_PATH = os.path.join(DATA_DIR, 'cache', 'topk', 'ngram-topk.pkl')
+
+TOP_K = 1000
+
+ALL_YEARS = 'all'
+
+
+# Stat of the tables an n size is built from, used to notice when they change
+def source_stats(n, base_dir=DATAFRAMES_DIR):
+    tables = find_tables(base_dir)
+    stats = {}
+    for name in (f'{n}-gram-year', f'{n}-gram-year-month'):
+        if name in tables:
+            stat = os.stat(tables[name])
+            stats[name] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+
+# (n-grams, counts) of the top_k rows by count, ties broken alphabetically
+def _top(ngrams, counts, top_k):
+    order = np.lexsort((ngrams, -counts))[:top_k]
+    return ngrams[order], counts[order]
+
+
+# Top n-grams of every period in a table with a period key column
+def _top_per_period(df, column, keys, top_k):
+    entries = {}
+    for period, group in df.groupby(keys, sort=True):
+        period = tuple(int(value) for value in period) if len(keys) > 1 else int(period[0])
+        entries[period] = _top(group[column].to_numpy(dtype=object), group['count-sum'].to_numpy(np.int64), top_k)
+    return entries
+
+
+# Build the cache entries of one n size: {period: (n-grams, counts)}
+def build_entries(n, top_k=TOP_K, base_dir=DATAFRAMES_DIR):
+    column = f'{n}-gram'
+    stats = source_stats(n, base_dir)
+    entries = {}
+    if f'{n}-gram-year' in stats:
+        df = load_ngram_table(f'{n}-gram-year', columns=['year', column, 'count-sum'], base_dir=base_dir)
+        df[column] = df[column].astype(str)
+        totals = df.groupby(column)['count-sum'].sum()
+        entries[ALL_YEARS] = _top(totals.index.to_numpy(dtype=object), totals.to_numpy(np.int64), top_k)
+        entries.update(_top_per_period(df, column, ['year'], top_k))
+    if f'{n}-gram-year-month' in stats:
+        df = load_ngram_table(f'{n}-gram-year-month', columns=['year', 'month', column, 'count-sum'],
+                              base_dir=base_dir)
+        df[column] = df[column].astype(str)
+        entries.update(_top_per_period(df, column, ['year', 'month'], top_k))
+    return {'stats': stats, 'top_k': top_k, 'entries': entries}
+
+
+class TopNgramCache:
+
+    def __init__(self, path=CACHE_PATH, base_dir=DATAFRAMES_DIR):
+        self.path = path
+        self.base_dir = base_dir
+        self.sizes = {}
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.sizes = pickle.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.sizes, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    # Rebuild the n sizes whose tables changed since they were cached; returns the rebuilt sizes
+    def refresh(self, ngram_sizes=(1, 2, 3)):
+        rebuilt = []
+        for n in ngram_sizes:
+            cached = self.sizes.get(n)
+            if cached is None or cached['stats'] != source_stats(n, self.base_dir):
+                self.sizes[n] = build_entries(n, base_dir=self.base_dir)
+                rebuilt.append(n)
+        if rebuilt:
+            self.save()
+        return rebuilt
+
+    # Top k n-grams of a period as a Series of count-sum indexed by n-gram.
+    # period is 'all', a year, a (year, month) tuple or 'YYYY-MM'; exclude is
+    # a collection of n-grams to leave out on top of the stop words.
+    def top(self, n, period=ALL_YEARS, k=10, exclude=()):
+        cached = self.sizes.get(n)
+        period = parse_period(period)
+        table = f'{n}-gram-year-month' if isinstance(period, tuple) else f'{n}-gram-year'
+        if cached is None or table not in cached['stats']:
+            raise KeyError(f'There is no {table} table in {self.base_dir}; regenerate the n-gram tables '
+                           f'with `python ngram_engine.py --ngrams {n}` in the scripts folder')
+        if period not in cached['entries']:
+            raise KeyError(f'No {n}-gram counts for {period!r} in {table}')
+        if k > cached['top_k']:
+            raise ValueError(f"Only the top {cached['top_k']} n-grams are cached")
+        ngrams, counts = cached['entries'][period]
+        if exclude:
+            keep = [i for i, ngram in enumerate(ngrams[:k + len(exclude)]) if ngram not in exclude][:k]
+            ngrams, counts = ngrams[keep], counts[keep]
+        return pd.Series(counts[:k], index=pd.Index(ngrams[:k], name=f'{n}-gram'), name='count-sum')
+
+    # Periods cached for an n size
+    def periods(self, n):
+        return list(self.sizes.get(n, {'entries': {}})['entries'])
+
+
+def parse_period(period):
+    if isinstance(period, str) and period != ALL_YEARS:
+        parts = [int(part) for part in period.split('-')]
+        return parts[0] if len(parts) == 1 else tuple(parts)
+    if isinstance(period, (tuple, list)):
+        return tuple(int(part) for part in period)
+    return period if period == ALL_YEARS else int(period)
+
+
+_cache = None
+
+
+# Cache shared by top_ngrams(); checked against the tables once per process
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = TopNgramCache()
+        _cache.refresh()
+    return _cache
+
+
+def top_ngrams(n, period=ALL_YEARS, k=10, exclude=()):
+    return get_cache().top(n, period, k, exclude)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the top n-gram cache or print a top list from it')
+    parser.add_argument('n', type=int, nargs='?', help='n-gram size to print')
+    parser.add_argument('--period', default=ALL_YEARS, help="'all', a year or YYYY-MM")
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    cache = TopNgramCache()
+    rebuilt = cache.refresh()
+    print(f'Rebuilt n sizes: {rebuilt}' if rebuilt else 'Cache is up to date')
+    if args.n is not None:
+        print(cache.top(args.n, args.period, args.k).to_string())
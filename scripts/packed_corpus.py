@@ -0,0 +1,188 @@
+import argparse
+import mmap
+import os
+
+import numpy as np
+
+from corpus_reader import ARTICLES_DIR, DATA_DIR, list_article_files, make_article
+
+# The article folder packed into one file.
+# data/articles stays the source of truth, but reading thousands of small files
+# costs an open() and read() per article. The packer copies the bytes of every
+# article, in filename order, into one UTF-8 file (articles.bin) and writes an
+# index next to it (index.npz) with the filename, byte offset and size of every
+# article and the mtime of the file it came from. The reader maps articles.bin
+# into memory with mmap: an article is a zero-copy memoryview slice of the map,
+# decoded to a string only when its text is asked for.
+#
+# A view can be kept after the corpus is closed: the map then stays open until
+# the last view of it is garbage-collected.
+#
+# The index remembers the (mtime, size) of every source file, so the packed copy
+# is known to be current after a stat of each file; when something was added,
+# removed or changed, the folder is packed again.
+#
+# Example:
+#     with load_packed_corpus() as corpus:
+#         corpus['2023-10-20_2976.txt']               # text of one article
+#         first = corpus.view(0)                      # memoryview of the first article's bytes
+#         for article in corpus.iter_articles():      # Article records, as corpus_reader.iter_articles
+#             ...
+#
+# Usage (from the scripts folder):
+#     python packed_corpus.py             # pack data/articles if it changed
+#     python packed_corpus.py --force
+
+PACKED_DIR = os.path.join(DATA_DIR, 'cache', 'packed')
+
+BLOB_NAME = 'articles.bin'
+
+INDEX_NAME = 'index.npz'
+
+
+# filename, mtime_ns and size of every article file, in filename order
+def file_stats(entries):
+    stats = [os.stat(path) for _, path, _ in entries]
+    return (np.array([filename for filename, _, _ in entries], dtype=str),
+            np.array([stat.st_mtime_ns for stat in stats], dtype=np.int64),
+            np.array([stat.st_size for stat in stats], dtype=np.int64))
+
+
+# Pack the article files of the folder into directory; returns the number of articles
+def pack_articles(folder=ARTICLES_DIR, directory=PACKED_DIR):
+    entries = list_article_files(folder)
+    filenames, mtimes, _ = file_stats(entries)
+    offsets = np.zeros(len(entries), dtype=np.int64)
+    sizes = np.zeros(len(entries), dtype=np.int64)
+
+    os.makedirs(directory, exist_ok=True)
+    blob_path = os.path.join(directory, BLOB_NAME)
+    with open(blob_path + '.tmp', 'wb') as out:
+        position = 0
+        for i, (_, path, _) in enumerate(entries):
+            with open(path, 'rb') as f:
+                data = f.read()
+            out.write(data)
+            offsets[i], sizes[i] = position, len(data)
+            position += len(data)
+    os.replace(blob_path + '.tmp', blob_path)
+
+    # written after the blob: the blob size in the index shows they belong together
+    index_path = os.path.join(directory, INDEX_NAME)
+    np.savez(index_path + '.tmp.npz', filenames=filenames, offsets=offsets, sizes=sizes, mtimes=mtimes,
+             parsed=np.array([entry[2] for entry in entries], dtype=np.int64).reshape(-1, 4),
+             folder=np.array(os.path.abspath(folder)), blob_size=np.array(position))
+    os.replace(index_path + '.tmp.npz', index_path)
+    return len(entries)
+
+
+class PackedCorpus:
+
+    def __init__(self, directory=PACKED_DIR):
+        self.directory = directory
+        with np.load(os.path.join(directory, INDEX_NAME)) as index:
+            self.filenames = index['filenames'].astype(object)
+            self.offsets = index['offsets']
+            self.sizes = index['sizes']
+            self.mtimes = index['mtimes']
+            self.parsed = index['parsed']
+            self.folder = str(index['folder'])
+            self.blob_size = int(index['blob_size'])
+        self.positions = {filename: i for i, filename in enumerate(self.filenames)}
+
+        self._file = open(os.path.join(directory, BLOB_NAME), 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size != self.blob_size:
+            self._file.close()
+            raise ValueError(f'{BLOB_NAME} has {size} bytes, the index expects {self.blob_size}')
+        # mmap cannot map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._view = memoryview(self._map)
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __contains__(self, filename):
+        return filename in self.positions
+
+    def __getitem__(self, filename):
+        return self.text(self.positions[filename])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Close the file and the map; views still referenced keep the map open until
+    # they are garbage-collected. The corpus cannot be read after this.
+    def close(self):
+        self._view.release()
+        if isinstance(self._map, mmap.mmap):
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+        self._map = b''
+        self._file.close()
+
+    # True when the index matches the (mtime, size) of the files in the folder
+    def is_current(self, folder=ARTICLES_DIR, entries=None):
+        entries = list_article_files(folder) if entries is None else entries
+        if os.path.abspath(folder) != self.folder or len(entries) != len(self):
+            return False
+        filenames, mtimes, sizes = file_stats(entries)
+        return (np.array_equal(filenames, self.filenames.astype(str)) and np.array_equal(mtimes, self.mtimes)
+                and np.array_equal(sizes, self.sizes))
+
+    # size bytes from offset in articles.bin, without copying
+    def slice(self, offset, size):
+        return self._view[int(offset):int(offset) + int(size)]
+
+    # Bytes of the article at a position, without copying
+    def view(self, position):
+        return self.slice(self.offsets[position], self.sizes[position])
+
+    # Text of the article at a position
+    def text(self, position):
+        return str(self.view(position), 'utf-8')
+
+    def article(self, position):
+        return make_article(self.filenames[position], self.text(position), tuple(self.parsed[position].tolist()))
+
+    # Article records in filename order, like corpus_reader.iter_articles
+    def iter_articles(self):
+        for position in range(len(self)):
+            yield self.article(position)
+
+
+# Open the packed copy of the folder, packing it first when it is missing or out of date
+def load_packed_corpus(folder=ARTICLES_DIR, directory=PACKED_DIR):
+    if os.path.exists(os.path.join(directory, INDEX_NAME)):
+        try:
+            corpus = PackedCorpus(directory)
+        except (OSError, ValueError):
+            corpus = None
+        if corpus is not None:
+            if corpus.is_current(folder):
+                return corpus
+            corpus.close()
+    pack_articles(folder, directory)
+    return PackedCorpus(directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack the article files into one memory-mapped file')
+    parser.add_argument('--folder', default=ARTICLES_DIR)
+    parser.add_argument('--force', action='store_true', help='pack again even when nothing changed')
+    args = parser.parse_args()
+
+    if args.force:
+        pack_articles(args.folder)
+    with load_packed_corpus(args.folder) as corpus:
+        print(f'{len(corpus)} articles, {corpus.blob_size / 1e6:.1f} MB in {os.path.join(PACKED_DIR, BLOB_NAME)}')
+        # the example at the top: a view of the first article, kept after the corpus is closed
+        first = corpus.view(0) if len(corpus) else memoryview(b'')
+        first_text = corpus.text(0) if len(corpus) else ''
+    if str(first, 'utf-8') != first_text:
+        raise SystemExit('The view of the first article does not match its text')
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+# Monthly aggregation of the tfidf pair tables for the similarity heatmaps.
+# Every pair gets an integer month index for each side (months since January of
+# start_year), the two indexes are combined into one cell number and
+# np.bincount adds up the values and the number of pairs per cell. The result
+# is a dense month x month grid with month labels that can go straight into
+# px.imshow, without building label strings row by row.
+#
+# Example:
+#     heatmap_data = monthly_pair_matrix(df, 2021, 2024)
+#     fig = px.imshow(heatmap_data, ...)
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+# 'Jan 2021', 'Feb 2021', ... for every month from start_year to end_year
+def month_labels(start_year, end_year):
+    return [f'{month} {year}' for year in range(start_year, end_year + 1) for month in MONTHS]
+
+
+# Months since January of start_year, computed as year * 12 + month on whole columns
+def month_index(years, months, start_year):
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    return (years * 12 + months - 1) - start_year * 12
+
+
+# Aggregate value per (month of article 1, month of article 2) cell.
+# agg is 'mean', 'sum' or 'count'; empty cells are NaN for 'mean' and 0 otherwise.
+# Rows are the month of article 1 and columns the month of article 2, as in the
+# groupby(['period1', 'period2']).unstack() tables the heatmaps used before.
+def monthly_pair_matrix(df, start_year, end_year, value='similarity', agg='mean'):
+    if agg not in ('mean', 'sum', 'count'):
+        raise ValueError(f"Unknown aggregation {agg!r}, expected 'mean', 'sum' or 'count'")
+    n_months = (end_year - start_year + 1) * 12
+    first = month_index(df['year-1'], df['month-1'], start_year)
+    second = month_index(df['year-2'], df['month-2'], start_year)
+    inside = (first >= 0) & (first < n_months) & (second >= 0) & (second < n_months)
+    cells = first[inside] * n_months + second[inside]
+
+    counts = np.bincount(cells, minlength=n_months * n_months)
+    if agg == 'count':
+        grid = counts.astype(np.float64)
+    else:
+        values = np.asarray(df[value], dtype=np.float64)[inside]
+        grid = np.bincount(cells, weights=values, minlength=n_months * n_months)
+        if agg == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                grid = np.where(counts > 0, grid / counts, np.nan)
+
+    labels = month_labels(start_year, end_year)
+    return pd.DataFrame(grid.reshape(n_months, n_months), index=labels, columns=labels)
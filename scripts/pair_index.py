@@ -0,0 +1,152 @@
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import load_table, table_csv_path
+from corpus_reader import DATA_DIR, DATAFRAMES_DIR, parse_filename
+
+# Indexed lookups on the tfidf pair tables.
+# The edge lists are compiled into a CSR adjacency structure: articles get
+# integer ids in filename order (which is date order), indptr[a]:indptr[a + 1]
+# is the slice of neighbours of article a in `indices`/`similarity`, sorted by
+# neighbour id. Because ids follow the calendar, every (year, month) is a
+# contiguous id range, so "pairs between Oct 2023 and Jan 2024" only looks at
+# the rows of October articles and binary-searches the January id range in each.
+#
+# Example:
+#     index = load_pair_index('tfidf-over-0.3-len200')
+#     index.neighbours('2023-10-20_2976.txt')
+#     index.period_pairs((2023, 10), (2024, 1))
+#
+# Usage (from the scripts folder):
+#     python pair_index.py neighbours 2023-10-20_2976.txt
+#     python pair_index.py period 2023-10 2024-01
+
+INDEX_DIR = os.path.join(DATA_DIR, 'cache', 'pairs')
+
+
+class PairIndex:
+
+    def __init__(self, filenames, indptr, indices, similarity):
+        self.filenames = np.asarray(filenames, dtype=object)
+        self.ids = {filename: i for i, filename in enumerate(self.filenames)}
+        self.indptr = indptr
+        self.indices = indices
+        self.similarity = similarity
+
+        # month code (year * 12 + month - 1) of every article; non-decreasing because of the id order
+        dates = [parse_filename(filename) for filename in self.filenames]
+        self.month_codes = np.array([year * 12 + month - 1 for year, month, _, _ in dates], dtype=np.int32)
+
+    # Compile an edge list with filename-1, filename-2 and similarity columns
+    @classmethod
+    def from_table(cls, df):
+        left = df['filename-1'].astype(str).to_numpy()
+        right = df['filename-2'].astype(str).to_numpy()
+        filenames, codes = np.unique(np.concatenate([left, right]), return_inverse=True)
+        n_pairs = len(left)
+        first, second = codes[:n_pairs], codes[n_pairs:]
+        sims = df['similarity'].to_numpy(dtype=np.float32)
+
+        # store both directions so every article sees all its neighbours
+        source = np.concatenate([first, second]).astype(np.int32)
+        target = np.concatenate([second, first]).astype(np.int32)
+        weight = np.concatenate([sims, sims])
+        order = np.lexsort((target, source))
+        indptr = np.zeros(len(filenames) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=len(filenames)), out=indptr[1:])
+        return cls(filenames, indptr, target[order], weight[order])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, filenames=self.filenames.astype(str), indptr=self.indptr,
+                 indices=self.indices, similarity=self.similarity)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['filenames'], data['indptr'], data['indices'], data['similarity'])
+
+    # First and last+1 article id published in a (year, month)
+    def month_range(self, year, month):
+        code = year * 12 + month - 1
+        return (int(np.searchsorted(self.month_codes, code, side='left')),
+                int(np.searchsorted(self.month_codes, code, side='right')))
+
+    def degree(self, filename):
+        article = self.ids[filename]
+        return int(self.indptr[article + 1] - self.indptr[article])
+
+    # All neighbours of an article as a DataFrame (filename, similarity), most similar first
+    def neighbours(self, filename):
+        article = self.ids.get(filename)
+        if article is None:
+            return pd.DataFrame({'filename': [], 'similarity': []})
+        start, end = self.indptr[article], self.indptr[article + 1]
+        result = pd.DataFrame({'filename': self.filenames[self.indices[start:end]],
+                               'similarity': self.similarity[start:end]})
+        return result.sort_values('similarity', ascending=False, ignore_index=True)
+
+    # Pairs with one article from period_a and the other from period_b, where a period
+    # is a (year, month) tuple. Returns a DataFrame with filename-1, filename-2, similarity.
+    def period_pairs(self, period_a, period_b):
+        start_a, end_a = self.month_range(*period_a)
+        start_b, end_b = self.month_range(*period_b)
+        same_period = (start_a, end_a) == (start_b, end_b)
+        firsts, seconds, sims = [], [], []
+        for article in range(start_a, end_a):
+            row_start, row_end = self.indptr[article], self.indptr[article + 1]
+            row = self.indices[row_start:row_end]
+            # neighbours are sorted by id, so the other period is one slice of the row
+            low = start_b if not same_period else max(start_b, article + 1)
+            lo = row_start + np.searchsorted(row, low, side='left')
+            hi = row_start + np.searchsorted(row, end_b, side='left')
+            if hi > lo:
+                firsts.append(np.full(hi - lo, article, dtype=np.int32))
+                seconds.append(self.indices[lo:hi])
+                sims.append(self.similarity[lo:hi])
+        if not firsts:
+            return pd.DataFrame({'filename-1': [], 'filename-2': [], 'similarity': []})
+        first = np.concatenate(firsts)
+        second = np.concatenate(seconds)
+        return pd.DataFrame({'filename-1': self.filenames[first], 'filename-2': self.filenames[second],
+                             'similarity': np.concatenate(sims)})
+
+
+# Load the compiled index for a pair table, compiling it again when the csv is newer.
+# Tables from another base_dir get their own index file.
+def load_pair_index(table='tfidf-over-0.3-len200', base_dir=DATAFRAMES_DIR):
+    csv_path = table_csv_path(table, base_dir)
+    name = table
+    if os.path.abspath(base_dir) != os.path.abspath(DATAFRAMES_DIR):
+        name += '-' + hashlib.sha1(os.path.abspath(csv_path).encode('utf-8')).hexdigest()[:10]
+    path = os.path.join(INDEX_DIR, name + '.npz')
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path):
+        return PairIndex.load(path)
+    index = PairIndex.from_table(load_table(table, columns=['filename-1', 'filename-2', 'similarity'],
+                                            base_dir=base_dir))
+    index.save(path)
+    return index
+
+
+def _period(text):
+    year, month = text.split('-')
+    return int(year), int(month)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Neighbour and period lookups on a tfidf pair table')
+    parser.add_argument('command', choices=['neighbours', 'period'])
+    parser.add_argument('args', nargs='+', help='a filename, or two periods written as YYYY-MM')
+    parser.add_argument('--table', default='tfidf-over-0.3-len200')
+    args = parser.parse_args()
+
+    index = load_pair_index(args.table)
+    if args.command == 'neighbours':
+        print(index.neighbours(args.args[0]).to_string())
+    else:
+        pairs = index.period_pairs(_period(args.args[0]), _period(args.args[1]))
+        print(pairs.sort_values('similarity', ascending=False).to_string())
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from corpus_reader import ARTICLES_DIR, TITLE_SEPARATOR, list_article_files
+
+# Tokenization stage for the derived dataframes.
+# Articles are split into shards of filenames and each shard is tokenized in a
+# separate process. Workers only send back small per-file results (length and
+# n-gram Counters), never the article text, and the caller merges them shard by
+# shard as they finish, so building the tables scales with the number of cores.
+
+# Words are runs of letters/digits in the lower-cased text; this is the
+# tokenization the n-gram tables in data/dataframes were built with
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# What a worker sends back for one file: sha1 of the raw bytes, the length used
+# in length.csv, the title and body length used in title.csv and the n-gram counts
+TokenizedArticle = namedtuple('TokenizedArticle', ['filename', 'parsed', 'sha1', 'length',
+                                                   'title', 'body_length', 'counts'])
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# Count the n-grams of a token list, joined with single spaces like in the csv files
+def count_ngrams(tokens, n):
+    if n == 1:
+        return Counter(tokens)
+    return Counter(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+# Length (whitespace tokens, as in length.csv) and n-gram Counters of one text
+def analyse_text(text, ngram_sizes=(1,)):
+    tokens = tokenize(text)
+    counts = {n: count_ngrams(tokens, n) for n in ngram_sizes}
+    return len(text.split()), counts
+
+
+# Worker: tokenize one shard of files and return a TokenizedArticle for each
+def _analyse_shard(shard, ngram_sizes):
+    results = []
+    for filename, path, parsed in shard:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        text = raw.decode('utf-8')
+        length, counts = analyse_text(text, ngram_sizes)
+        title, _, body = text.partition(TITLE_SEPARATOR)
+        results.append(TokenizedArticle(filename, parsed, hashlib.sha1(raw).hexdigest(), length,
+                                        title.strip(), len(body.split()), counts))
+    return results
+
+
+# Split a list into shards of at most shard_size items
+def make_shards(items, shard_size):
+    return [items[i:i + shard_size] for i in range(0, len(items), shard_size)]
+
+
+# Tokenize the given files (entries from corpus_reader.list_article_files) and
+# yield one list of per-file results for every finished shard
+def tokenize_files(entries, ngram_sizes=(1,), workers=None, shard_size=64):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    shards = make_shards(list(entries), shard_size)
+
+    # no point starting processes for a single worker or a handful of files
+    if workers <= 1 or len(shards) <= 1:
+        for shard in shards:
+            yield _analyse_shard(shard, ngram_sizes)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_analyse_shard, shard, ngram_sizes) for shard in shards]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# Same as tokenize_files, for every article in the folder
+def tokenize_corpus(folder=ARTICLES_DIR, ngram_sizes=(1,), workers=None, shard_size=64):
+    return tokenize_files(list_article_files(folder), ngram_sizes, workers, shard_size)
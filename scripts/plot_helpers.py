@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Plotly charts whose size does not grow with the number of rows.
+# px.histogram and px.density_heatmap put every raw value into the figure and
+# let the browser do the binning, so the html of a pair table chart grows with
+# the table. Here the values are binned with NumPy first and the figure only
+# holds the bin counts: 40 bars are 40 bars whether they count 8 thousand or
+# 8 million pairs.
+#
+# Scatter plots above WEBGL_ROWS points are drawn with scattergl (WebGL) instead
+# of SVG, and long series for line charts are cut down to MAX_POINTS points with
+# Largest-Triangle-Three-Buckets (LTTB), which keeps the peaks and dips a plain
+# every-nth-row sample would lose.
+#
+# Example:
+#     fig = histogram(df['similarity'], nbins=40, range=(0.2, 1.0), labels={'x': 'Similarity'})
+#     fig = density_heatmap(df['similarity'], df['length-1'], nbins=(40, 50))
+#     fig = line(df, x='date', y='count', max_points=2000)
+#     fig = scatter(df, x='similarity', y='length-1')
+
+# Above this many points scatter traces use WebGL
+WEBGL_ROWS = 1000
+
+# Points kept by LTTB for a line chart
+MAX_POINTS = 2000
+
+
+# Bin edges and counts of values; values outside range are not counted
+def histogram_counts(values, nbins=40, range=None):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if range is None:
+        range = (values.min(), values.max()) if len(values) else (0.0, 1.0)
+    counts, edges = np.histogram(values, bins=nbins, range=range)
+    return counts, edges
+
+
+# Bar chart of pre-binned values, drawn like px.histogram
+def histogram(values, nbins=40, range=None, title=None, labels=None, color=None, opacity=None):
+    counts, edges = histogram_counts(values, nbins, range)
+    labels = labels or {}
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate='%{customdata[0]:.3g} - %{customdata[1]:.3g}<br>%{y}<extra></extra>',
+        marker_color=color,
+        opacity=opacity,
+    ))
+    fig.update_layout(title=title, xaxis_title=labels.get('x'), yaxis_title=labels.get('y', 'count'),
+                      bargap=0)
+    return fig
+
+
+# Counts of (x, y) pairs on an nbins grid: (counts[y bin, x bin], x edges, y edges)
+def density_counts(x, y, nbins=(50, 50), range=None):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    counts, x_edges, y_edges = np.histogram2d(x[keep], y[keep], bins=nbins, range=range)
+    return counts.T.astype(np.int64), x_edges, y_edges
+
+
+# Heatmap of pre-binned (x, y) pairs, drawn like px.density_heatmap.
+# Empty cells are left blank.
+def density_heatmap(x, y, nbins=(50, 50), range=None, title=None, labels=None,
+                    color_continuous_scale='Viridis'):
+    counts, x_edges, y_edges = density_counts(x, y, nbins, range)
+    labels = labels or {}
+    fig = go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=np.where(counts > 0, counts, np.nan),
+        colorscale=color_continuous_scale,
+        colorbar_title=labels.get('color', 'count'),
+        hovertemplate='x %{x:.3g}<br>y %{y:.3g}<br>%{z}<extra></extra>',
+    ))
+    fig.update_layout(title=title, xaxis_title=labels.get('x'), yaxis_title=labels.get('y'))
+    return fig
+
+
+# x values as floats for LTTB: numbers as they are, dates as nanoseconds and
+# anything else (labels like 'Jan 2021') by position
+def _numeric(x):
+    x = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.to_numpy('datetime64[ns]').astype(np.int64).astype(np.float64)
+    if pd.api.types.is_numeric_dtype(x):
+        return x.to_numpy(np.float64)
+    return np.arange(len(x), dtype=np.float64)
+
+
+# Positions of the n_out points LTTB keeps of a series sorted by x.
+# The first and last points are always kept; every bucket in between keeps the
+# point making the largest triangle with the point kept before it and the mean
+# of the next bucket.
+def lttb_indices(x, y, n_out=MAX_POINTS):
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = _numeric(x)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x = x[end:edges[bucket + 2]].mean()
+            next_y = y[end:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(area.argmax())
+        kept[bucket + 1] = previous
+    return kept
+
+
+# Rows of df kept by LTTB on the y column, per color group when one is given
+def downsample(df, x, y, max_points=MAX_POINTS, color=None):
+    if color is None:
+        return df.iloc[lttb_indices(df[x], df[y], max_points)]
+    parts = [group.iloc[lttb_indices(group[x], group[y], max_points)]
+             for _, group in df.groupby(color, sort=False, observed=True)]
+    return pd.concat(parts) if parts else df
+
+
+# 'webgl' above WEBGL_ROWS points, 'svg' below
+def render_mode(n_points, threshold=WEBGL_ROWS):
+    return 'webgl' if n_points > threshold else 'svg'
+
+
+# px.line on a df sorted by x, downsampled to max_points per line
+def line(df, x, y, max_points=MAX_POINTS, **kwargs):
+    df = downsample(df, x, y, max_points, kwargs.get('color'))
+    return px.line(df, x=x, y=y, render_mode=render_mode(len(df)), **kwargs)
+
+
+# px.scatter drawn with WebGL above threshold points
+def scatter(df, x, y, threshold=WEBGL_ROWS, **kwargs):
+    return px.scatter(df, x=x, y=y, render_mode=render_mode(len(df), threshold), **kwargs)
+
+
+# go.Scattergl above threshold points, go.Scatter below
+def scatter_trace(x, y, threshold=WEBGL_ROWS, **kwargs):
+    trace = go.Scattergl if len(x) > threshold else go.Scatter
+    return trace(x=x, y=y, **kwargs)
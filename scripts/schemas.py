@@ -0,0 +1,101 @@
+import re
+
+import pandas as pd
+
+# Column types for the tables described in data/dataframes/README.md.
+# Strings that repeat on many rows (filenames, titles in the pair tables, topic
+# keywords, n-grams) become categories, date parts become small integers and
+# similarity scores and means become float32. load_table() in columnar_store.py
+# applies these when a table is loaded, so joins and groupbys run on integer
+# codes and the tables take a fraction of the memory.
+#
+# Tables are matched by name; n-gram tables use the placeholder {n}.
+
+DATE_TYPES = {'year': 'int16', 'month': 'int8', 'day': 'int8'}
+
+PAIR_TYPES = {
+    'filename-1': 'category', 'filename-2': 'category',
+    'similarity': 'float32',
+    'title-1': 'category', 'title-2': 'category',
+    'year-1': 'int16', 'month-1': 'int8', 'day-1': 'int8',
+    'year-2': 'int16', 'month-2': 'int8', 'day-2': 'int8',
+}
+
+LENGTH_STATS_TYPES = {
+    'articles': 'int32', 'length-min': 'int32', 'length-max': 'int32', 'length-mean': 'float32',
+    'length-median': 'float32', 'length-p90': 'float32', 'length-p99': 'float32', 'length-std': 'float32',
+}
+
+HISTOGRAM_TYPES = {'bin-start': 'int32', 'bin-end': 'int32', 'articles': 'int32'}
+
+SCHEMAS = {
+    # length
+    'length': {**DATE_TYPES, 'length': 'int32'},
+    'length-year': {'year': 'int16', 'length-sum': 'int64', 'length-mean': 'float32'},
+    'length-year-month': {'year': 'int16', 'month': 'int8', 'length-sum': 'int64', 'length-mean': 'float32'},
+    'length-stats-year': {'year': 'int16', **LENGTH_STATS_TYPES},
+    'length-stats-year-month': {'year': 'int16', 'month': 'int8', **LENGTH_STATS_TYPES},
+    'length-histogram-year': {'year': 'int16', **HISTOGRAM_TYPES},
+    'length-histogram-year-month': {'year': 'int16', 'month': 'int8', **HISTOGRAM_TYPES},
+
+    # n-grams
+    '{n}-gram': {**DATE_TYPES, 'file': 'category', '{n}-gram': 'category', 'count': 'int32'},
+    '{n}-gram-year': {'year': 'int16', '{n}-gram': 'category', 'count-sum': 'int32', 'count-mean': 'float32'},
+    '{n}-gram-year-month': {'year': 'int16', 'month': 'int8', '{n}-gram': 'category',
+                            'count-sum': 'int32', 'count-mean': 'float32'},
+
+    # tfidf (all three filtering levels share one layout)
+    'tfidf-over-0.3': PAIR_TYPES,
+    'tfidf-over-0.3-len100': PAIR_TYPES,
+    'tfidf-over-0.3-len200': PAIR_TYPES,
+
+    # title and topic model: one row per article, so title and file stay plain strings
+    'title': {**DATE_TYPES, 'title': 'string', 'length': 'int32', 'file': 'string'},
+    'topic-model': {**DATE_TYPES, 'title': 'string', 'file': 'string', 'Topic': 'int16', 'Count': 'int32',
+                    'topic_1': 'category', 'topic_2': 'category', 'topic_3': 'category', 'topic_4': 'category'},
+}
+
+NGRAM_NAME = re.compile(r'^([123])-gram(-year|-year-month)?$')
+
+
+# Column types for a table name, or None if the table is not in the registry
+def schema_for(name):
+    match = NGRAM_NAME.match(name)
+    if match:
+        n = match.group(1)
+        template = SCHEMAS['{n}-gram' + (match.group(2) or '')]
+        return {column.replace('{n}', n): dtype for column, dtype in template.items()}
+    return SCHEMAS.get(name)
+
+
+# Columns of a table that are stored as categories
+def category_columns(name):
+    schema = schema_for(name) or {}
+    return [column for column, dtype in schema.items() if dtype == 'category']
+
+
+# Cast the columns of df that appear in the schema of the table
+def apply_schema(df, name):
+    schema = schema_for(name)
+    if schema is None:
+        return df
+    types = {}
+    for column, dtype in schema.items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        # zero padded dates such as '05' may come in as text
+        if dtype.startswith(('int', 'float')) and not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column])
+        types[column] = dtype
+    return df.astype(types) if types else df
+
+
+if __name__ == '__main__':
+    # Show how much memory each table takes before and after applying its schema
+    from columnar_store import find_tables, read_csv
+
+    for name, path in sorted(find_tables().items()):
+        df = read_csv(path)
+        before = df.memory_usage(deep=True).sum() / 1e6
+        after = apply_schema(df, name).memory_usage(deep=True).sum() / 1e6
+        print(f'{name:28} {before:8.1f} MB -> {after:6.1f} MB')
@@ -0,0 +1,216 @@
+import argparse
+import heapq
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from build_dataframes import table_path
+from columnar_store import write_table
+from corpus_reader import CorpusScanner, DATA_DIR, DATAFRAMES_DIR
+
+# Sparse TF-IDF similarity engine.
+# The TF-IDF matrix stays sparse and the cosine similarities are computed one
+# block of rows at a time (rows are L2 normalised, so a dot product is the
+# cosine). Each block only keeps the pairs above a threshold, or the k best
+# neighbours of each row, so memory is bounded by the block size instead of
+# growing with the square of the number of articles.
+#
+# The output has the same columns as data/dataframes/tfidf/tfidf-over-0.3*.csv.
+# The scores do not exactly reproduce the shipped tables, so new tables are
+# written to data/cache/similarity/tfidf unless --write is given.
+#
+# Usage (from the scripts folder):
+#     python similarity.py                       # write the three tfidf-over-0.3 tables to data/cache/similarity
+#     python similarity.py --out some/folder     # ... to some/folder/tfidf
+#     python similarity.py --write               # overwrite the shipped tables in data/dataframes
+#     python similarity.py --top-k 10            # tfidf-top10 tables with the 10 best neighbours per article
+#     python similarity.py --top-k 5 --print     # print the 5 most similar pairs
+
+PAIR_COLUMNS = ['filename-1', 'filename-2', 'similarity',
+                'title-1', 'year-1', 'month-1', 'day-1',
+                'title-2', 'year-2', 'month-2', 'day-2']
+
+# Same settings as the TF-IDF exploration scripts; pass other TfidfVectorizer
+# options to tfidf_matrix() to change them
+VECTORIZER_OPTIONS = {'stop_words': 'english'}
+
+# Where new pair tables go unless the shipped ones are to be replaced
+SCRATCH_DIR = os.path.join(DATA_DIR, 'cache', 'similarity')
+
+# Upper bound on the number of dense cells used for one block when finding top-k neighbours
+DENSE_BLOCK_CELLS = 4_000_000
+
+
+# Fit a TfidfVectorizer and return the L2 normalised float32 matrix with the vectorizer
+def tfidf_matrix(documents, **vectorizer_options):
+    options = dict(VECTORIZER_OPTIONS, **vectorizer_options)
+    vectorizer = TfidfVectorizer(dtype=np.float32, **options)
+    matrix = vectorizer.fit_transform(documents).tocsr()
+    return matrix, vectorizer
+
+
+def _row_blocks(n_rows, block_size):
+    for start in range(0, n_rows, block_size):
+        yield start, min(start + block_size, n_rows)
+
+
+# All pairs (i < j) with a similarity above threshold, as arrays (i, j, similarity)
+def pairs_above(matrix, threshold=0.3, block_size=1024):
+    matrix_t = matrix.T.tocsc()
+    rows, cols, sims = [], [], []
+    for start, end in _row_blocks(matrix.shape[0], block_size):
+        block = (matrix[start:end] @ matrix_t).tocoo()
+        i = block.row + start
+        keep = (block.col > i) & (block.data > threshold)
+        rows.append(i[keep])
+        cols.append(block.col[keep])
+        sims.append(block.data[keep])
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+
+
+# The k most similar other rows for every row, as arrays (i, j, similarity).
+# Pairs found from both sides are only returned once, with i < j.
+def top_k_neighbours(matrix, k=10, block_size=None):
+    n_rows = matrix.shape[0]
+    k = min(k, n_rows - 1)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    if block_size is None:
+        block_size = max(1, DENSE_BLOCK_CELLS // max(n_rows, 1))
+    matrix_t = matrix.T.tocsc()
+    rows, cols, sims = [], [], []
+    for start, end in _row_blocks(n_rows, block_size):
+        block = (matrix[start:end] @ matrix_t).toarray()
+        block[np.arange(end - start), np.arange(start, end)] = -1  # ignore self-similarity
+        best = np.argpartition(block, -k, axis=1)[:, -k:]
+        rows.append(np.repeat(np.arange(start, end), k))
+        cols.append(best.ravel())
+        sims.append(np.take_along_axis(block, best, axis=1).ravel())
+
+    i = np.concatenate(rows)
+    j = np.concatenate(cols)
+    sim = np.concatenate(sims)
+    first, second = np.minimum(i, j), np.maximum(i, j)
+    _, unique = np.unique(first.astype(np.int64) * n_rows + second, return_index=True)
+    return first[unique], second[unique], sim[unique]
+
+
+# The k most similar pairs in the whole matrix, best first
+def top_pairs(matrix, k=5, block_size=None):
+    i, j, sim = top_k_neighbours(matrix, k, block_size)
+    best = heapq.nlargest(k, range(len(sim)), key=sim.__getitem__)
+    return [(int(i[b]), int(j[b]), float(sim[b])) for b in best]
+
+
+# Mean similarity between runs of consecutive rows, for an overview heatmap.
+# The rows are cut into n_groups runs of about equal size and cell (a, b) is the
+# mean cosine of the pairs with one row in run a and the other in run b, leaving
+# out each row's similarity with itself. The sum of the pair similarities of two
+# runs is the dot product of their row sums, so no n x n matrix is built.
+# Returns the n_groups x n_groups means and the run of every row.
+def grouped_mean_similarity(matrix, n_groups=200):
+    n_rows = matrix.shape[0]
+    n_groups = max(1, min(n_groups, n_rows))
+    groups = np.arange(n_rows) * n_groups // n_rows
+    membership = sparse.csr_matrix((np.ones(n_rows), (groups, np.arange(n_rows))), shape=(n_groups, n_rows))
+    sums = membership @ matrix
+    totals = (sums @ sums.T).toarray()
+    sizes = np.bincount(groups, minlength=n_groups).astype(np.float64)
+    counts = np.outer(sizes, sizes)
+    diagonal = np.diag_indices(n_groups)
+    totals[diagonal] -= np.bincount(groups, weights=np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel(),
+                                    minlength=n_groups)
+    counts[diagonal] -= sizes
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, totals / counts, np.nan), groups
+
+
+# Turn pair arrays into a table with the same layout as the tfidf csv files.
+# articles is a DataFrame indexed like the matrix rows with filename, title, year, month, day.
+def pair_table(articles, i, j, sim):
+    left = articles.iloc[i].reset_index(drop=True)
+    right = articles.iloc[j].reset_index(drop=True)
+    table = pd.DataFrame({
+        'filename-1': left['filename'], 'filename-2': right['filename'], 'similarity': sim.astype(np.float64),
+        'title-1': left['title'], 'year-1': left['year'],
+        'month-1': left['month'].map('{:02d}'.format), 'day-1': left['day'].map('{:02d}'.format),
+        'title-2': right['title'], 'year-2': right['year'],
+        'month-2': right['month'].map('{:02d}'.format), 'day-2': right['day'].map('{:02d}'.format),
+    }, columns=PAIR_COLUMNS)
+    return table.sort_values('similarity', ascending=False, kind='mergesort').reset_index(drop=True)
+
+
+# Read the corpus once: the texts for TF-IDF and the metadata for the pair tables
+def read_corpus():
+    documents = []
+    rows = []
+
+    def collect(article):
+        documents.append(article.text)
+        rows.append((article.filename, article.title, article.year, article.month, article.day, article.length))
+
+    scanner = CorpusScanner(packed=True)
+    scanner.add_consumer(collect)
+    scanner.run()
+    articles = pd.DataFrame(rows, columns=['filename', 'title', 'year', 'month', 'day', 'length'])
+    return documents, articles
+
+
+# Build tfidf-over-<threshold>.csv plus the -len100/-len200 versions, which only keep
+# pairs where both articles are longer than that many tokens. With top_k the
+# tables keep the top_k best neighbours of every article instead and are named
+# tfidf-top<top_k>*.csv. The tables go to base_dir/tfidf; pass
+# base_dir=DATAFRAMES_DIR to replace the shipped ones.
+def build_pair_tables(threshold=0.3, min_lengths=(100, 200), block_size=1024, base_dir=SCRATCH_DIR,
+                      top_k=None):
+    documents, articles = read_corpus()
+    matrix, _ = tfidf_matrix(documents)
+    if top_k is None:
+        i, j, sim = pairs_above(matrix, threshold, block_size)
+        name = f'tfidf-over-{threshold}'
+    else:
+        i, j, sim = top_k_neighbours(matrix, top_k)
+        name = f'tfidf-top{top_k}'
+    table = pair_table(articles, i, j, sim)
+
+    lengths = articles.set_index('filename')['length']
+    written = []
+    for min_length in (None,) + tuple(min_lengths):
+        suffix = '' if min_length is None else f'-len{min_length}'
+        subset = table
+        if min_length is not None:
+            keep = (table['filename-1'].map(lengths) > min_length) & (table['filename-2'].map(lengths) > min_length)
+            subset = table[keep]
+        path = table_path('tfidf', f'{name}{suffix}.csv', base_dir=base_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_table(subset, path)
+        written.append(path)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the tfidf pair tables with sparse blocked similarity')
+    parser.add_argument('--threshold', type=float, default=0.3, help='keep pairs above this similarity')
+    parser.add_argument('--top-k', type=int, default=None, help='keep the k best neighbours per article instead of a threshold')
+    parser.add_argument('--block-size', type=int, default=1024, help='rows per block')
+    parser.add_argument('--print', action='store_true', help='print the pairs instead of writing the tables')
+    parser.add_argument('--out', default=SCRATCH_DIR, help='folder to write the tables to (in a tfidf subfolder)')
+    parser.add_argument('--write', action='store_true', help='overwrite the shipped tables in data/dataframes')
+    args = parser.parse_args()
+
+    if not args.print:
+        base_dir = DATAFRAMES_DIR if args.write else args.out
+        for path in build_pair_tables(args.threshold, block_size=args.block_size, base_dir=base_dir,
+                                      top_k=args.top_k):
+            print('Written', path)
+    else:
+        documents, articles = read_corpus()
+        matrix, _ = tfidf_matrix(documents)
+        if args.top_k is not None:
+            i, j, sim = top_k_neighbours(matrix, args.top_k)
+        else:
+            i, j, sim = pairs_above(matrix, args.threshold, args.block_size)
+        print(pair_table(articles, i, j, sim).head(20).to_string())
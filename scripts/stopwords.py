@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from columnar_store import encode_ngrams, load_table, load_vocabulary, table_columns, word_columns
+from corpus_reader import DATAFRAMES_DIR
+from schemas import NGRAM_NAME
+
+# Shared stop words and vectorized stop-word filters for the n-gram tables.
+# The Parquet copy of every n-gram table stores each n-gram as a tuple of word
+# ids (columns word-1 ... word-n, see columnar_store.py) together with the
+# vocabulary the ids point into. Filtering out the n-grams that only contain
+# stop words is then a lookup in a boolean "is stop" array over the vocabulary,
+# indexed with the integer id columns, without splitting any strings.
+#
+# Example:
+#     df = load_ngram_table('2-gram-year', columns=['year', '2-gram', 'count-sum'])
+#     df = df[~all_stopwords_mask(other_df['2-gram'])]    # for any other n-gram column
+
+# Stop words from https://gist.github.com/sebleier/554280
+SEBLEIER_STOP_WORDS = frozenset([
+    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself", "yourselves",
+    "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself", "they", "them", "their",
+    "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "these", "those", "am", "is", "are",
+    "was", "were", "be", "been", "being", "have", "has", "had", "having", "do", "does", "did", "doing", "a", "an",
+    "the", "and", "but", "if", "or", "because", "as", "until", "while", "of", "at", "by", "for", "with", "about",
+    "against", "between", "into", "through", "during", "before", "after", "above", "below", "to", "from", "up",
+    "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once", "here", "there", "when",
+    "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no",
+    "nor", "not", "only", "own", "same", "so", "than", "too", "very", "s", "t", "can", "will", "just", "don",
+    "should", "now",
+])
+
+# Stop words for the n-gram charts: the list above + "people" and "said"
+STOP_WORDS = SEBLEIER_STOP_WORDS | {"people", "said"}
+
+# Stop words for the topic keywords: the list above + filler words that show up as topic keywords
+TOPIC_STOP_WORDS = SEBLEIER_STOP_WORDS | {
+    'al', 'said', 'one', 'get', 'got', 'say', 'says', 'made', 'make', 'thing', 'things', 'like',
+    'see', 'still', 'also', 'new', 'news', 'use', 'used', 'using', 'every', 'many',
+    'much', 'back', 'even', 'really', 'another', 'year', 'years',
+}
+
+
+# Boolean array over a vocabulary, True for the stop words
+def stop_mask(vocabulary, stop_words=STOP_WORDS):
+    return pd.Index(vocabulary).isin(stop_words)
+
+
+# Boolean mask over rows of word ids, True where every word is a stop word
+def all_stop_ids(ids, vocabulary, stop_words=STOP_WORDS):
+    return stop_mask(vocabulary, stop_words)[ids].all(axis=1)
+
+
+# Boolean mask over the rows of an n-gram column, True where every word is a stop word.
+# Only the distinct n-grams are encoded; category columns already list them.
+def all_stopwords_mask(column, stop_words=STOP_WORDS):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, ngrams = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, ngrams = pd.factorize(column)
+    if len(ngrams) == 0:
+        return np.zeros(len(column), dtype=bool)
+    n = int(pd.Series(ngrams).astype(str).str.count(' ').max()) + 1
+    vocabulary, ids = encode_ngrams(ngrams, n)
+    return all_stop_ids(ids, vocabulary, stop_words)[codes]
+
+
+# Boolean mask over the rows of df, True where the words in all the given columns are stop words
+# (case-insensitive), e.g. topic keyword columns with one word each
+def all_columns_stopwords_mask(df, columns, stop_words=STOP_WORDS):
+    codes, words = pd.factorize(df[columns].astype(str).to_numpy().ravel())
+    is_stop = pd.Index(words).str.lower().isin(stop_words)
+    return is_stop[codes].reshape(len(df), len(columns)).all(axis=1)
+
+
+# Load an n-gram table (e.g. '3-gram-year') without the n-grams made only of stop words.
+# Uses the stored word id columns; without pyarrow the n-grams are encoded after loading.
+def load_ngram_table(name, columns=None, filters=None, stop_words=STOP_WORDS, base_dir=DATAFRAMES_DIR):
+    n = int(NGRAM_NAME.match(name).group(1))
+    columns = list(columns) if columns is not None else table_columns(name, base_dir)
+    vocabulary = load_vocabulary(name, base_dir)
+    if vocabulary is None:
+        df = load_table(name, columns=list(dict.fromkeys(columns + [f'{n}-gram'])), filters=filters, base_dir=base_dir)
+        return df[~all_stopwords_mask(df[f'{n}-gram'], stop_words)][columns]
+    df = load_table(name, columns=columns + word_columns(n), filters=filters, base_dir=base_dir)
+    mask = all_stop_ids(df[word_columns(n)].to_numpy(), vocabulary, stop_words)
+    return df[~mask].drop(columns=word_columns(n))
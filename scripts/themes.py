@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from columnar_store import load_table
+from stopwords import TOPIC_STOP_WORDS, all_columns_stopwords_mask
+
+# Themes for the topics of the topic model.
+# Every article of a topic has the same four keywords, so the theme is worked
+# out once per topic and then given to the articles by indexing with their
+# topic: a few hundred keyword lookups instead of one Python call per article.
+#
+# The rules are an ordered list of (theme, keywords). A topic gets the first
+# theme that has one of its keywords (compared in lower case), or OTHER when no
+# rule matches. The keyword -> theme lookup is built once from the rules.
+#
+# Example:
+#     df = df[~df['Topic'].isin(filler_topics(df))]
+#     df['Theme'] = assign_themes(df)                 # categorical column
+#     df['Theme'] = assign_themes(df, rules=[('War', ['war', 'missile']), ('Aid', ['aid'])])
+#
+# Usage (from the scripts folder):
+#     python themes.py          # theme of every topic in topic-model.csv
+
+KEYWORD_COLUMNS = ['topic_1', 'topic_2', 'topic_3', 'topic_4']
+
+OTHER = 'Other'
+
+THEME_RULES = [
+    ('Security & Conflict', [
+        'hamas', 'missile', 'force', 'military', 'attack', 'war', 'terror', 'defense',
+        'hezbollah', 'houthi', 'houthis', 'lebanon', 'lebanese', 'gaza', 'west', 'bank',
+        'israeli', 'palestinian', 'border', 'iran', 'iranian', 'syria', 'sea', 'killed',
+    ]),
+    ('Diplomacy & Politics', [
+        'peace', 'negotiation', 'netanyahu', 'biden', 'un', 'treaty', 'diplomacy', 'resolution',
+        'us', 'government', 'engagement',
+    ]),
+    ('Civilian Toll, Crisis & Aid', [
+        'child', 'hospital', 'civilian', 'aid', 'refugee', 'death', 'victim', 'humanitarian',
+        'patients', 'medical', 'hospitals', 'hostages', 'captives', 'akleh',
+    ]),
+]
+
+
+# Theme names (in rule order, OTHER last) and a keyword -> rule number lookup.
+# A keyword listed under several themes belongs to the first one.
+def compile_rules(rules=THEME_RULES):
+    themes = [theme for theme, _ in rules]
+    lookup = {}
+    for rank, (_, keywords) in enumerate(rules):
+        for keyword in keywords:
+            lookup.setdefault(keyword.lower(), rank)
+    return themes + [OTHER], lookup
+
+
+# One row per topic with its keyword columns, indexed by Topic
+def topic_keywords(df, columns=KEYWORD_COLUMNS):
+    return df.drop_duplicates('Topic').set_index('Topic')[columns]
+
+
+# Theme of every topic as a categorical Series indexed by Topic
+def classify_topics(topics, rules=THEME_RULES, columns=KEYWORD_COLUMNS):
+    themes, lookup = compile_rules(rules)
+    keywords = pd.Series(topics[columns].to_numpy(dtype=object).ravel()).astype(str).str.lower()
+    ranks = keywords.map(lookup).fillna(len(themes) - 1).to_numpy(np.int8).reshape(-1, len(columns))
+    return pd.Series(pd.Categorical.from_codes(ranks.min(axis=1), themes), index=topics.index, name='Theme')
+
+
+# Theme of every article of a topic-model table, as a categorical Series aligned with df
+def assign_themes(df, rules=THEME_RULES, columns=KEYWORD_COLUMNS):
+    topic_themes = classify_topics(topic_keywords(df, columns), rules, columns)
+    positions = topic_themes.index.get_indexer(df['Topic'])
+    codes = topic_themes.cat.codes.to_numpy()[positions]
+    return pd.Series(pd.Categorical.from_codes(codes, topic_themes.cat.categories), index=df.index, name='Theme')
+
+
+# Topics whose keywords are all stop words
+def filler_topics(df, stop_words=TOPIC_STOP_WORDS, columns=KEYWORD_COLUMNS):
+    topics = topic_keywords(df, columns)
+    return topics.index[all_columns_stopwords_mask(topics, columns, stop_words)]
+
+
+if __name__ == '__main__':
+    df = load_table('topic-model', columns=['Topic', 'Count'] + KEYWORD_COLUMNS)
+    topics = df.drop_duplicates('Topic').set_index('Topic').sort_index()
+    topics['Theme'] = classify_topics(topics)
+    topics['filler'] = topics.index.isin(filler_topics(df))
+    print(topics.to_string())
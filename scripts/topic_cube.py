@@ -0,0 +1,224 @@
+import argparse
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import load_table, table_csv_path
+from corpus_reader import DATA_DIR, DATAFRAMES_DIR
+from themes import KEYWORD_COLUMNS, OTHER, classify_topics, filler_topics, topic_keywords
+
+# Topic x month article counts for the topic model charts.
+# topic-model.csv is turned into a dense int32 array with one row per topic and
+# one column per month (every month from the first to the last article, so the
+# columns are evenly spaced). Each topic also keeps its keywords, its theme
+# (themes.py) and whether its keywords are all stop words. Top topics, monthly
+# theme bars and per-topic sparklines are then sums and slices of the array.
+#
+# The cube remembers which topic and month every article was counted in. When
+# topic-model.csv changes, only the articles that were added, removed or moved to
+# another topic are subtracted from / added to their cells.
+#
+# Example:
+#     cube = load_topic_cube()
+#     cube.top(5)                 # article count of the 5 largest topics
+#     cube.sparkline(3)           # articles per month of topic 3
+#     cube.theme_counts()         # Month, Theme, Count rows for a stacked bar chart
+#
+# Usage (from the scripts folder):
+#     python topic_cube.py        # build or update the cube and print the top topics
+
+CUBE_DIR = os.path.join(DATA_DIR, 'cache', 'topic-cube')
+
+OUTLIER_TOPIC = -1
+
+
+def _month_code(years, months):
+    return np.asarray(years, dtype=np.int32) * 12 + np.asarray(months, dtype=np.int32) - 1
+
+
+def _source_stat(base_dir=DATAFRAMES_DIR):
+    stat = os.stat(table_csv_path('topic-model', base_dir))
+    return stat.st_mtime_ns, stat.st_size
+
+
+# file, Topic and month code of every article plus the per-topic keywords
+def read_assignments(base_dir=DATAFRAMES_DIR):
+    df = load_table('topic-model', columns=['file', 'year', 'month', 'Topic'] + KEYWORD_COLUMNS, base_dir=base_dir)
+    assignments = pd.DataFrame({
+        'topic': df['Topic'].to_numpy(np.int32),
+        'month': _month_code(df['year'], df['month']),
+    }, index=pd.Index(df['file'].astype(str), name='file'))
+    return assignments, df
+
+
+# Cells (row, column) of a set of assignments in a cube with the given axes
+def _cells(assignments, topics, months):
+    return np.searchsorted(topics, assignments['topic'].to_numpy()), assignments['month'].to_numpy() - months[0]
+
+
+# Build the counts from scratch, or update old_counts by the difference between
+# old and new assignments. Returns the counts and the topic and month axes.
+def update_counts(new, old=None, old_counts=None, old_topics=None, old_months=None):
+    topic_values = [new['topic'].to_numpy()] + ([old_topics] if old is not None else [])
+    topics = np.unique(np.concatenate(topic_values)).astype(np.int32)
+    month_values = np.concatenate([new['month'].to_numpy()] + ([old_months] if old is not None else []))
+    if len(month_values):
+        months = np.arange(month_values.min(), month_values.max() + 1, dtype=np.int32)
+    else:
+        months = np.empty(0, dtype=np.int32)
+    counts = np.zeros((len(topics), len(months)), dtype=np.int32)
+
+    if old is None:
+        added = new
+    else:
+        # put the old counts on the new axes, then apply only the articles that differ
+        rows = np.searchsorted(topics, old_topics)
+        columns = old_months - months[0]
+        counts[np.ix_(rows, columns)] = old_counts
+        joined = old.join(new, how='outer', lsuffix='-old', rsuffix='-new')
+        changed = ((joined['topic-old'] != joined['topic-new']) | (joined['month-old'] != joined['month-new']))
+        removed = joined.loc[changed & joined['topic-old'].notna(), ['topic-old', 'month-old']]
+        added = joined.loc[changed & joined['topic-new'].notna(), ['topic-new', 'month-new']]
+        removed = removed.set_axis(['topic', 'month'], axis=1).astype(np.int32)
+        added = added.set_axis(['topic', 'month'], axis=1).astype(np.int32)
+        np.subtract.at(counts, _cells(removed, topics, months), 1)
+    np.add.at(counts, _cells(added, topics, months), 1)
+
+    # topics that lost all their articles leave the cube, and so do empty months at either end
+    keep = counts.sum(axis=1) > 0
+    used = np.flatnonzero(counts.sum(axis=0))
+    first, last = (used[0], used[-1] + 1) if len(used) else (0, 0)
+    return counts[keep, first:last], topics[keep], months[first:last]
+
+
+class TopicCube:
+
+    def __init__(self, counts, topics, months, keywords, themes, filler, assignments=None, source=None):
+        self.counts = counts
+        self.topics = topics
+        self.months = months
+        self.keywords = keywords
+        self.themes = themes
+        self.filler = filler
+        self.assignments = assignments
+        self.source = source
+
+    # Row of a topic in the cube
+    def row(self, topic):
+        position = int(np.searchsorted(self.topics, topic))
+        if position == len(self.topics) or self.topics[position] != topic:
+            raise KeyError(f'No topic {topic} in the cube')
+        return position
+
+    # 'YYYY-MM' for every month column
+    def labels(self):
+        return [f'{code // 12}-{code % 12 + 1:02d}' for code in self.months.tolist()]
+
+    # 'Topic 3: hospital, patients, medical'
+    def label(self, topic, n_keywords=3):
+        return f'Topic {topic}: ' + ', '.join(self.keywords[self.row(topic)][:n_keywords])
+
+    # Articles per topic
+    def totals(self):
+        return pd.Series(self.counts.sum(axis=1), index=pd.Index(self.topics, name='Topic'), name='Count')
+
+    # The n largest topics by article count (ties by topic number), without the outlier topic
+    def top(self, n=5, include_outliers=False):
+        totals = self.totals()
+        if not include_outliers:
+            totals = totals[totals.index != OUTLIER_TOPIC]
+        order = np.lexsort((totals.index.to_numpy(), -totals.to_numpy()))[:n]
+        return totals.iloc[order]
+
+    # Articles per month of one topic
+    def sparkline(self, topic):
+        return pd.Series(self.counts[self.row(topic)], index=self.labels(), name=topic)
+
+    # Months x topics article counts for a list of topics (default all)
+    def monthly(self, topics=None):
+        topics = self.topics if topics is None else np.asarray(topics)
+        rows = [self.row(topic) for topic in topics]
+        return pd.DataFrame(self.counts[rows].T, index=self.labels(), columns=topics)
+
+    # Theme x month counts: the topic rows summed per theme. The outlier topic and
+    # the topics whose keywords are all stop words are left out.
+    def theme_matrix(self):
+        keep = ~self.filler & (self.topics != OUTLIER_TOPIC)
+        codes = self.themes.cat.codes.to_numpy()[keep]
+        categories = self.themes.cat.categories
+        rollup = np.zeros((len(categories), len(self.months)), dtype=np.int64)
+        np.add.at(rollup, codes, self.counts[keep])
+        return pd.DataFrame(rollup, index=categories, columns=self.labels())
+
+    # Month, Theme, Count rows for the months where a theme has articles, like
+    # df.groupby(['Month', 'Theme']).size() on the articles
+    def theme_counts(self, exclude=(OTHER,)):
+        matrix = self.theme_matrix().drop(index=list(exclude), errors='ignore')
+        long = matrix.T.stack().rename('Count').rename_axis(['Month', 'Theme']).reset_index()
+        return long[long['Count'] > 0].reset_index(drop=True)
+
+    def save(self, directory=CUBE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, 'counts.npy.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.counts)
+        os.replace(tmp_path, os.path.join(directory, 'counts.npy'))
+        meta = {'topics': self.topics, 'months': self.months, 'keywords': self.keywords, 'themes': self.themes,
+                'filler': self.filler, 'assignments': self.assignments, 'source': self.source}
+        tmp_path = os.path.join(directory, 'meta.pkl.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, os.path.join(directory, 'meta.pkl'))
+
+    @classmethod
+    def load(cls, directory=CUBE_DIR):
+        with open(os.path.join(directory, 'meta.pkl'), 'rb') as f:
+            meta = pickle.load(f)
+        return cls(np.load(os.path.join(directory, 'counts.npy')), **meta)
+
+
+# Build the cube from topic-model.csv, reusing the counts of old when given
+def build_cube(old=None, base_dir=DATAFRAMES_DIR):
+    source = _source_stat(base_dir)
+    assignments, df = read_assignments(base_dir)
+    if old is None:
+        counts, topics, months = update_counts(assignments)
+    else:
+        counts, topics, months = update_counts(assignments, old.assignments, old.counts, old.topics, old.months)
+
+    # keywords and themes are per topic, so they are cheap to redo
+    per_topic = topic_keywords(df).reindex(topics)
+    keywords = [tuple(str(word) for word in words) for words in per_topic.to_numpy(dtype=object).tolist()]
+    themes = classify_topics(per_topic)
+    filler = np.asarray(pd.Index(topics).isin(filler_topics(df)))
+    return TopicCube(counts, topics, months, keywords, themes, filler, assignments, source)
+
+
+# Open the cube, updating it first when topic-model.csv changed since it was saved
+def load_topic_cube(directory=CUBE_DIR, base_dir=DATAFRAMES_DIR):
+    old = None
+    if os.path.exists(os.path.join(directory, 'meta.pkl')):
+        old = TopicCube.load(directory)
+        if old.source == _source_stat(base_dir):
+            return old
+    cube = build_cube(old, base_dir)
+    cube.save(directory)
+    return cube
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or update the topic x month cube')
+    parser.add_argument('--full', action='store_true', help='rebuild from scratch instead of updating')
+    parser.add_argument('-n', type=int, default=10, help='number of top topics to print')
+    args = parser.parse_args()
+
+    if args.full:
+        cube = build_cube()
+        cube.save()
+    else:
+        cube = load_topic_cube()
+    print(f'{len(cube.topics)} topics x {len(cube.months)} months')
+    for topic, count in cube.top(args.n).items():
+        print(f'{count:6d}  {cube.label(topic)}  [{cube.themes.loc[topic]}]')
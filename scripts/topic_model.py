@@ -0,0 +1,220 @@
+import argparse
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from build_dataframes import table_path
+from columnar_store import write_table
+from corpus_reader import ARTICLES_DIR, DATA_DIR, DATAFRAMES_DIR, iter_articles, list_article_files, make_article
+from embedding_cache import EmbeddingCache, embedding_text
+
+# Refit of the BERTopic topic model behind topic-model.csv.
+# The article embeddings come from the embedding cache (embedding_cache.py), so
+# a refit only embeds the articles that are new or changed and the rest of the
+# time goes to BERTopic's own steps (UMAP, HDBSCAN and the c-TF-IDF keywords).
+# The settings match the ones described in data/dataframes/README.md:
+# all-MiniLM-L6-v2 embeddings with a sequence length of 512 and 15 nearest
+# neighbours. BERTopic and umap-learn are only needed for the refit.
+#
+# New articles can also be given a topic without a refit. The fitted topics are
+# kept on disk as their centroids (the normalised mean embedding of their
+# articles) with their keywords and c-TF-IDF weights. A new article goes to the
+# topic whose centroid is nearest by cosine distance, or to the outlier topic -1
+# when even that one is further than the threshold. Its row is appended to
+# topic-model.csv and the Count of its topic goes up on every row of that topic.
+# The default threshold is the distance within which 95% of the fitted articles
+# lie from their own centroid.
+#
+# Usage (from the scripts folder):
+#     python topic_model.py refit
+#     python topic_model.py assign                   # topics for articles not in topic-model.csv yet
+#     python topic_model.py assign --threshold 0.6
+#     python topic_model.py state                    # rebuild the centroids from topic-model.csv
+
+N_NEIGHBORS = 15
+
+KEYWORDS_PER_TOPIC = 4
+
+OUTLIER_TOPIC = -1
+
+# Share of the fitted articles that lie within the default threshold of their centroid
+THRESHOLD_PERCENTILE = 95
+
+STATE_PATH = os.path.join(DATA_DIR, 'cache', 'topic-model', 'online.pkl')
+
+TOPIC_COLUMNS = ['year', 'month', 'day', 'title', 'file', 'Topic', 'Count',
+                 'topic_1', 'topic_2', 'topic_3', 'topic_4']
+
+
+def topic_model_path(base_dir=DATAFRAMES_DIR):
+    return table_path('topic-model', 'topic-model.csv', base_dir=base_dir)
+
+
+# Rows of topic-model.csv: one per article with its topic, the number of articles
+# in that topic and the topic's first keywords, sorted by topic and file
+def topic_table(articles, topics, keywords):
+    df = pd.DataFrame({
+        'year': [article.year for article in articles],
+        'month': [article.month for article in articles],
+        'day': [article.day for article in articles],
+        'title': [article.title for article in articles],
+        'file': [article.filename for article in articles],
+        'Topic': topics,
+    })
+    df['Count'] = df.groupby('Topic')['Topic'].transform('size')
+    for i in range(KEYWORDS_PER_TOPIC):
+        df[f'topic_{i + 1}'] = df['Topic'].map({topic: words[i] if i < len(words) else ''
+                                                for topic, words in keywords.items()})
+    return df.sort_values(['Topic', 'file'], kind='mergesort')[TOPIC_COLUMNS]
+
+
+# Fit BERTopic on the cached embeddings of every article and write topic-model.csv.
+# Returns the fitted model.
+def refit(folder=ARTICLES_DIR, embed=None, cache=None, n_neighbors=N_NEIGHBORS, seed=None,
+          base_dir=DATAFRAMES_DIR):
+    from bertopic import BERTopic
+    from umap import UMAP
+
+    cache = EmbeddingCache() if cache is None else cache
+    cache.update(folder, embed=embed)
+    articles = list(iter_articles(folder))
+    _, embeddings = cache.vectors([article.filename for article in articles])
+    documents = [embedding_text(article) for article in articles]
+
+    umap_model = UMAP(n_neighbors=n_neighbors, n_components=5, min_dist=0.0, metric='cosine', random_state=seed)
+    model = BERTopic(umap_model=umap_model)
+    topics, _ = model.fit_transform(documents, embeddings=embeddings)
+
+    weights = {topic: model.get_topic(topic) for topic in set(topics)}
+    keywords = {topic: [word for word, _ in words] for topic, words in weights.items()}
+    path = topic_model_path(base_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_table(topic_table(articles, topics, keywords), path)
+    save_state(build_state(embeddings, np.asarray(topics), weights))
+    return model
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+# Centroids of the topics (without -1) and the default distance threshold.
+# weights maps every topic (with -1) to its [(keyword, c-TF-IDF weight), ...];
+# the weight is None when only the keywords are known.
+def build_state(embeddings, topics, weights):
+    vectors = normalize(embeddings)
+    fitted = np.unique(topics[topics != OUTLIER_TOPIC])
+    positions = np.searchsorted(fitted, topics)
+    inside = topics != OUTLIER_TOPIC
+    sums = np.zeros((len(fitted), vectors.shape[1]), dtype=np.float64)
+    np.add.at(sums, positions[inside], vectors[inside])
+    centroids = normalize(sums)
+
+    distances = 1 - np.einsum('ij,ij->i', vectors[inside], centroids[positions[inside]])
+    threshold = float(np.percentile(distances, THRESHOLD_PERCENTILE)) if len(distances) else 1.0
+    return {'topics': fitted, 'centroids': centroids, 'keywords': weights, 'threshold': threshold}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_state(path=STATE_PATH):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+# Centroids of the topics in topic-model.csv, for a table written before the
+# state was kept. The c-TF-IDF weights are not in the table, only the keywords.
+def state_from_table(folder=ARTICLES_DIR, embed=None, cache=None, base_dir=DATAFRAMES_DIR):
+    table = pd.read_csv(topic_model_path(base_dir), keep_default_na=False)
+    cache = EmbeddingCache() if cache is None else cache
+    cache.update(folder, embed=embed)
+    table = table[table['file'].isin(cache.index['files'])]
+    _, embeddings = cache.vectors(table['file'])
+    keyword_columns = [f'topic_{i + 1}' for i in range(KEYWORDS_PER_TOPIC)]
+    per_topic = table.drop_duplicates('Topic').set_index('Topic')[keyword_columns]
+    weights = {topic: [(word, None) for word in words if word != '']
+               for topic, words in zip(per_topic.index.tolist(), per_topic.to_numpy().tolist())}
+    return build_state(embeddings, table['Topic'].to_numpy(), weights)
+
+
+# Nearest topic and its cosine distance for every vector; -1 when the distance is over the threshold
+def assign(embeddings, state, threshold=None):
+    threshold = state['threshold'] if threshold is None else threshold
+    similarities = normalize(embeddings) @ state['centroids'].T
+    best = similarities.argmax(axis=1)
+    distances = 1 - similarities[np.arange(len(best)), best]
+    topics = np.where(distances <= threshold, state['topics'][best], OUTLIER_TOPIC)
+    return topics, distances
+
+
+# Give every article of the folder that is not in topic-model.csv yet a topic and
+# append its row. Only the new articles are read and embedded. Returns the new rows.
+def assign_new_articles(folder=ARTICLES_DIR, embed=None, threshold=None, cache=None, state_path=STATE_PATH,
+                        base_dir=DATAFRAMES_DIR):
+    path = topic_model_path(base_dir)
+    table = pd.read_csv(path, keep_default_na=False)
+    known = set(table['file'])
+    entries = [entry for entry in list_article_files(folder) if entry[0] not in known]
+    if not entries:
+        return table.iloc[:0]
+
+    cache = EmbeddingCache() if cache is None else cache
+    if os.path.exists(state_path):
+        state = load_state(state_path)
+        cache.update(folder, embed=embed)
+    else:
+        state = state_from_table(folder, embed, cache, base_dir)
+        save_state(state, state_path)
+    _, embeddings = cache.vectors([filename for filename, _, _ in entries])
+    topics, _ = assign(embeddings, state, threshold)
+
+    articles = []
+    for filename, article_path, parsed in entries:
+        with open(article_path, 'r', encoding='utf-8') as f:
+            articles.append(make_article(filename, f.read(), parsed))
+    keywords = {topic: [word for word, _ in words] for topic, words in state['keywords'].items()}
+    rows = topic_table(articles, topics, keywords)
+
+    # Count is the size of the topic after the new rows are added
+    added = rows['Topic'].value_counts()
+    table['Count'] = table['Count'] + table['Topic'].map(added).fillna(0).astype('int64')
+    topic_counts = table.drop_duplicates('Topic').set_index('Topic')['Count']
+    rows['Count'] = rows['Topic'].map(topic_counts).fillna(rows['Count']).astype('int64')
+    write_table(pd.concat([table, rows], ignore_index=True), path)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refit the topic model on the cached article embeddings')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    refit_parser = subparsers.add_parser('refit', help='fit BERTopic again and rewrite topic-model.csv')
+    refit_parser.add_argument('--neighbors', type=int, default=N_NEIGHBORS, help='UMAP nearest neighbours')
+    refit_parser.add_argument('--seed', type=int, default=None, help='UMAP random state')
+    assign_parser = subparsers.add_parser('assign', help='give new articles a topic without a refit')
+    assign_parser.add_argument('--threshold', type=float, default=None,
+                               help='largest cosine distance to a topic centroid (default: from the fit)')
+    subparsers.add_parser('state', help='rebuild the topic centroids from topic-model.csv')
+    args = parser.parse_args()
+
+    if args.command == 'refit':
+        model = refit(n_neighbors=args.neighbors, seed=args.seed)
+        print(f'{len(model.get_topic_info())} topics written to {topic_model_path()}')
+    elif args.command == 'assign':
+        rows = assign_new_articles(threshold=args.threshold)
+        print(f'{len(rows)} new articles assigned')
+        if len(rows):
+            print(rows['Topic'].value_counts().to_string())
+    else:
+        state = state_from_table()
+        save_state(state)
+        print(f"{len(state['topics'])} topic centroids saved, threshold {state['threshold']:.3f}")